@@ -0,0 +1,74 @@
+"""
+Cancellation of request processing when the HTTP client disconnects.
+
+E.g. the user closed the tab or the Vue client aborted the fetch. The
+in-flight LLM call is cancelled instead of waiting for its completion;
+calls shared with other requests continue for them (SingleFlight).
+"""
+
+import asyncio
+import threading
+from collections.abc import AsyncIterator, Awaitable
+from typing import TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+# seconds between checks of the connection
+DISCONNECT_POLL_INTERVAL = 0.5
+
+_stats = {"requests": 0, "batches": 0, "streams": 0}
+_stats_lock = threading.Lock()
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client disconnected before the response was ready."""
+
+
+def count_aborted(kind: str) -> None:
+    """Count a request aborted by its client: requests, batches or streams."""
+    with _stats_lock:
+        _stats[kind] += 1
+
+
+def get_aborted_stats() -> dict[str, int]:
+    """Return the number of aborted requests per endpoint kind."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+async def await_unless_disconnected(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Await the awaitable, checking the connection of the client meanwhile.
+
+    Raises ClientDisconnectedError if it disconnects, the awaitable is cancelled.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnectedError
+    finally:
+        if not task.done():
+            task.cancel()
+            # let the cancellation run, e.g. close upstream streams
+            await asyncio.wait({task})
+
+
+async def iterate_unless_disconnected(
+    request: Request, iterator: AsyncIterator[T]
+) -> AsyncIterator[T]:
+    """Yield the items of the iterator, see await_unless_disconnected()."""
+    try:
+        while True:
+            try:
+                item = await await_unless_disconnected(request, anext(iterator))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await iterator.aclose()  # type: ignore[attr-defined]
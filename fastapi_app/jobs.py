@@ -0,0 +1,250 @@
+"""
+Background processing of the persistent job queue.
+
+Each worker of the app runs a JobWorker, which claims queued jobs from the
+job table and processes them with bounded concurrency. The result of each
+chunk is stored as soon as it is done and the lease of the job is renewed
+while it runs. If a worker dies or is recycled, another one takes over the
+job after its lease expired and resumes its unfinished chunks. The database
+calls run in threads, off the event loop.
+"""
+
+import asyncio
+import logging
+import time
+
+from fastapi import HTTPException
+
+from fastapi_app.routers.text import process_text
+from fastapi_app.schemas import (
+    BatchItemResult,
+    BatchTextRequest,
+    BatchTextResponse,
+    TextRequest,
+    TextResponse,
+    UserInfoInternal,
+)
+from shared.config import (
+    LLM_CHUNK_CONCURRENCY,
+    LLM_CHUNK_MAX_CHARS,
+    LLM_JOB_CONCURRENCY,
+    LLM_JOB_LEASE,
+    LLM_JOB_POLL_INTERVAL,
+    LLM_JOB_RETENTION,
+)
+from shared.helper_db import (
+    db_claim_job,
+    db_delete_jobs_before,
+    db_extend_job_lease,
+    db_insert_job_chunk,
+    db_insert_usage,
+    db_select_job_chunks,
+    db_update_job_progress,
+    db_update_job_status,
+)
+from shared.llm_chunking import split_text, stitch
+from shared.mode_configs import MODE_CONFIGS
+
+logger = logging.getLogger(__name__)
+
+
+def split_items(request: BatchTextRequest) -> list[list[str]]:
+    """Return the chunks of each item, long texts of chunkable modes are split."""
+    return [
+        split_text(item.text, LLM_CHUNK_MAX_CHARS)
+        if MODE_CONFIGS[item.mode].chunkable and not item.document_id
+        else [item.text]
+        for item in request.items
+    ]
+
+
+def _merge_item(
+    item: TextRequest, chunks: list[str], results: dict[int, BatchItemResult]
+) -> BatchItemResult:
+    """Merge the results of the chunks of an item, blank chunks have none."""
+    responses: dict[int, TextResponse] = {}
+    for c, result in results.items():
+        if result.response is None:
+            return result
+        responses[c] = result.response
+    if len(chunks) == 1:
+        return results[0]
+    first = next(iter(responses.values()))
+    return BatchItemResult(
+        status_code=200,
+        response=first.model_copy(
+            update={
+                "text_original": item.text,
+                "text_ai": "".join(
+                    stitch(chunk, responses[c].text_ai) if c in responses else chunk
+                    for c, chunk in enumerate(chunks)
+                ),
+                "tokens_used": sum(r.tokens_used for r in responses.values()),
+                "cached": all(r.cached for r in responses.values()),
+                "tokens_estimated": sum(r.tokens_estimated for r in responses.values()),
+            }
+        ),
+    )
+
+
+async def run_job(job: dict) -> BatchTextResponse:
+    """
+    Process the chunks of a claimed job not done yet and return its result.
+
+    Chunks are processed concurrently, each via the text endpoint logic
+    (routing, fallback, caching), and stored one by one as progress.
+    """
+    job_id = job["id"]
+    request = BatchTextRequest.model_validate_json(job["request"])
+    user = UserInfoInternal(user_id=job["user_id"], user_name=job["user_name"])
+    items_chunks = split_items(request)
+    pending = [
+        (i, c)
+        for i, chunks in enumerate(items_chunks)
+        for c, chunk in enumerate(chunks)
+        # a blank item is processed, to get its error
+        if chunk.strip() or (c == 0 and not "".join(chunks).strip())
+    ]
+    stored = {
+        key: BatchItemResult.model_validate_json(result)
+        for key, result in (
+            await asyncio.to_thread(db_select_job_chunks, job_id)
+        ).items()
+    }
+    chunks_total = len(pending)
+    logger.info("Job %s: %d of %d chunks done", job_id, len(stored), chunks_total)
+    await asyncio.to_thread(
+        db_update_job_progress, job_id, LLM_JOB_LEASE, chunks_total, len(stored)
+    )
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+    progress = asyncio.Lock()
+
+    async def process(i: int, c: int) -> None:
+        item = request.items[i]
+        async with semaphore:
+            try:
+                response = await process_text(
+                    item.model_copy(update={"text": items_chunks[i][c].strip()}), user
+                )
+                result = BatchItemResult(status_code=200, response=response)
+            except HTTPException as e:
+                result = BatchItemResult(status_code=e.status_code, error=e.detail)
+        await asyncio.to_thread(
+            db_insert_job_chunk, job_id, i, c, result.model_dump_json()
+        )
+        stored[(i, c)] = result
+        # in order, a slower thread must not overwrite a later count
+        async with progress:
+            await asyncio.to_thread(
+                db_update_job_progress, job_id, LLM_JOB_LEASE, chunks_total, len(stored)
+            )
+
+    await asyncio.gather(*(process(i, c) for i, c in pending if (i, c) not in stored))
+
+    results = [
+        _merge_item(
+            item,
+            items_chunks[i],
+            {c: result for (j, c), result in stored.items() if j == i},
+        )
+        for i, item in enumerate(request.items)
+    ]
+    processed = [
+        result.response
+        for result, item in zip(results, request.items, strict=True)
+        if result.response is not None and not item.dry_run
+    ]
+    tokens_used = sum(response.tokens_used for response in processed)
+    if processed:
+        try:
+            await asyncio.to_thread(
+                db_insert_usage,
+                user_id=user.user_id,
+                tokens=tokens_used,
+                requests=len(processed),
+            )
+        except Exception:
+            logger.exception("Failed to log usage:")
+    return BatchTextResponse(
+        results=results,
+        tokens_used=tokens_used,
+        failed=sum(result.response is None for result in results),
+    )
+
+
+class JobWorker:
+    """Claims and processes jobs in the background of a worker."""
+
+    def __init__(self, concurrency: int = LLM_JOB_CONCURRENCY) -> None:
+        """Init the worker, processing up to concurrency jobs at a time."""
+        self.concurrency = concurrency
+        self._task: asyncio.Task | None = None
+        self._running: dict[str, asyncio.Task] = {}
+
+    def start(self) -> None:
+        """Start polling for jobs, in the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        """Stop polling and hand the running jobs back to the queue."""
+        tasks = list(self._running.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _poll(self) -> None:
+        """Claim jobs while there is capacity, else wait."""
+        while True:
+            job = None
+            if len(self._running) < self.concurrency:
+                try:
+                    job = await asyncio.to_thread(db_claim_job, LLM_JOB_LEASE)
+                except Exception:
+                    logger.exception("Failed to claim job")
+            if job is None:
+                await asyncio.sleep(LLM_JOB_POLL_INTERVAL)
+                continue
+            logger.info("Claimed job %s of user %s", job["id"], job["user_name"])
+            self._running[job["id"]] = asyncio.create_task(self._process(job))
+
+    async def _process(self, job: dict) -> None:
+        """Run the job, renew its lease meanwhile, and store the outcome."""
+        job_id = job["id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await run_job(job)
+        except asyncio.CancelledError:
+            # shutdown: another worker resumes the job
+            await asyncio.to_thread(db_update_job_status, job_id, "queued")
+            raise
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            await asyncio.to_thread(
+                db_update_job_status, job_id, "failed", error=str(e)
+            )
+        else:
+            await asyncio.to_thread(
+                db_update_job_status, job_id, "done", result=result.model_dump_json()
+            )
+            await asyncio.to_thread(
+                db_delete_jobs_before, time.time() - LLM_JOB_RETENTION
+            )
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """Renew the lease of the job, also while a chunk takes long."""
+        while True:
+            await asyncio.sleep(LLM_JOB_LEASE / 3)
+            try:
+                await asyncio.to_thread(db_extend_job_lease, job_id, LLM_JOB_LEASE)
+            except Exception:
+                logger.exception("Failed to renew the lease of job %s", job_id)
+
+
+JOB_WORKER = JobWorker()
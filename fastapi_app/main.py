@@ -1,6 +1,9 @@
 """FastAPI application main file."""
 
+import asyncio
 import logging
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,8 +11,12 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-from fastapi_app.routers import auth, config, stats, text
+from fastapi_app.jobs import JOB_WORKER
+from fastapi_app.routers import auth, config, jobs, metrics, stats, text
+from shared.config import LLM_PROVIDERS
 from shared.helper import init_logging, where_am_i
+from shared.llm_clients import aclose_clients
+from shared.llm_provider import awarm_up_providers
 
 ENV = where_am_i()
 
@@ -21,6 +28,23 @@ logger = logging.getLogger(__name__)
 # Create rate limiter (disabled during testing)
 limiter = Limiter(key_func=get_remote_address, enabled=(ENV == "PROD"))
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
+    """
+    Run the job worker, close pooled LLM clients when the worker shuts down.
+
+    Local models are loaded in the background, not delaying the start.
+    Running jobs are handed back to the queue on shutdown.
+    """
+    warm_up = asyncio.create_task(awarm_up_providers(LLM_PROVIDERS))
+    JOB_WORKER.start()
+    yield
+    warm_up.cancel()
+    await JOB_WORKER.stop()
+    await aclose_clients()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="KI Korrekturleser API",
@@ -28,6 +52,7 @@ app = FastAPI(
     version="0.1.0",
     # same root for prod and def to make debugging easier
     root_path="/be/korrekturleser-fastapi",
+    lifespan=lifespan,
 )
 
 # Add rate limiter to app state
@@ -55,7 +80,9 @@ app.add_middleware(
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(config.router, prefix="/api/config", tags=["Configuration"])
 app.include_router(text.router, prefix="/api/text", tags=["Text Operations"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
 app.include_router(stats.router, prefix="/api/stats", tags=["Statistics"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["Metrics"])
 
 
 @app.get("/")
@@ -3,19 +3,27 @@
 import logging
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 
 from fastapi_app.helper_fastapi import get_current_user
 from fastapi_app.schemas import ConfigResponse, UserInfoInternal
 from shared.config import LLM_PROVIDER_DEFAULT, LLM_PROVIDERS
-from shared.llm_provider import get_llm_provider
+from shared.llm_catalog import LLM_CATALOG, get_llm_models
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# precomputed from the static catalog, no provider SDK is imported
+CONFIG_RESPONSES = {
+    name: ConfigResponse(
+        provider=name, models=get_llm_models(name), providers=LLM_PROVIDERS
+    )
+    for name in LLM_CATALOG
+}
+
 
-@router.get("/")
+@router.get("/", responses={400: {"description": "Unknown provider"}})
 async def get_config(
     _: Annotated[UserInfoInternal, Depends(get_current_user)],
     provider: str | None = None,
@@ -31,9 +39,9 @@ async def get_config(
 
     """
     selected_provider = provider or LLM_PROVIDER_DEFAULT
-    llm_provider = get_llm_provider(selected_provider)
-    return ConfigResponse(
-        provider=selected_provider,
-        models=llm_provider.get_models(),
-        providers=LLM_PROVIDERS,
-    )
+    config_response = CONFIG_RESPONSES.get(selected_provider)
+    if config_response is None:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown provider: {selected_provider}"
+        )
+    return config_response
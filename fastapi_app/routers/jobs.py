@@ -0,0 +1,109 @@
+"""Job router: submit long-running text jobs and poll for their result."""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from fastapi_app.helper_fastapi import get_current_user
+from fastapi_app.schemas import (
+    BatchTextRequest,
+    BatchTextResponse,
+    JobResponse,
+    UserInfoInternal,
+)
+from shared.config import LLM_JOB_MAX_WAIT, LLM_JOB_POLL_INTERVAL
+from shared.helper_db import db_insert_job, db_select_job
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+FINISHED = ("done", "failed")
+
+
+def _job_response(job: dict) -> JobResponse:
+    """Convert a job row to the response."""
+    return JobResponse(
+        id=job["id"],
+        status=job["status"],
+        chunks_total=job["chunks_total"],
+        chunks_done=job["chunks_done"],
+        result=(
+            BatchTextResponse.model_validate_json(job["result"])
+            if job["result"]
+            else None
+        ),
+        error=job["error"],
+    )
+
+
+@router.post("/", status_code=202)
+async def submit_job(
+    request: BatchTextRequest,
+    current_user: Annotated[UserInfoInternal, Depends(get_current_user)],
+) -> JobResponse:
+    """
+    Submit texts for background processing, e.g. long documents or big batches.
+
+    The job is stored in the database and processed by the workers,
+    surviving worker restarts. Poll GET /api/jobs/{id} for its result.
+
+    Args:
+        request: Texts to process, as for POST /api/text/batch
+        current_user: Authenticated user (injected by dependency)
+
+    Returns:
+        JobResponse: The queued job
+
+    """
+    job_id = uuid.uuid4().hex
+    await asyncio.to_thread(
+        db_insert_job,
+        job_id,
+        user_id=current_user.user_id,
+        user_name=current_user.user_name,
+        request=request.model_dump_json(),
+    )
+    logger.info(
+        "User: %s | job %s of %d items",
+        current_user.user_name,
+        job_id,
+        len(request.items),
+    )
+    return JobResponse(id=job_id, status="queued", chunks_total=0, chunks_done=0)
+
+
+@router.get("/{job_id}", responses={404: {"description": "Job not found"}})
+async def get_job(
+    job_id: str,
+    current_user: Annotated[UserInfoInternal, Depends(get_current_user)],
+    wait: Annotated[float, Query(ge=0, le=LLM_JOB_MAX_WAIT)] = 0,
+) -> JobResponse:
+    """
+    Get status, progress and, once done, result of a job of the user.
+
+    Args:
+        job_id: ID returned on submit
+        current_user: Authenticated user (injected by dependency)
+        wait: Long-poll: seconds to wait for the job to finish
+
+    Returns:
+        JobResponse: Current state of the job
+
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        job = await asyncio.to_thread(
+            db_select_job, job_id, user_id=current_user.user_id
+        )
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] in FINISHED or time.monotonic() >= deadline:
+            return _job_response(job)
+        await asyncio.sleep(
+            min(LLM_JOB_POLL_INTERVAL, max(deadline - time.monotonic(), 0))
+        )
@@ -0,0 +1,76 @@
+"""Metrics router for internal performance counters."""
+
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from fastapi_app.disconnect import get_aborted_stats
+from fastapi_app.helper_fastapi import get_current_user
+from fastapi_app.schemas import MetricsResponse, UserInfoInternal
+from shared.llm_auto_model import MODEL_STATS, get_decisions
+from shared.llm_cache import LLM_CACHE
+from shared.llm_cascade import CASCADE_STATS
+from shared.llm_clients import get_client_stats
+from shared.llm_map_reduce import MAP_REDUCE_STATS
+from shared.llm_output_cap import get_output_cap_stats
+from shared.llm_prompt_cache import PROMPT_CACHE_STATS
+from shared.llm_provider import LLM_SINGLE_FLIGHT, get_llm_provider_instances
+from shared.llm_rate_limit import RATE_GOVERNOR
+from shared.llm_resilience import get_circuit_breaker_stats
+from shared.llm_routing import LATENCY, get_routing_stats
+from shared.llm_sentence_memo import SENTENCE_MEMO
+from shared.llm_tokens import TOKEN_ESTIMATOR
+from shared.llm_translation_memory import TRANSLATION_MEMORY
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get(
+    "/",
+    responses={403: {"description": "Metrics are only available for the admin"}},
+)
+async def get_metrics(
+    current_user: Annotated[UserInfoInternal, Depends(get_current_user)],
+) -> MetricsResponse:
+    """
+    Get performance metrics of the worker serving this request.
+
+    Counters are per gunicorn worker and reset on worker restart.
+
+    Args:
+        current_user: Authenticated user (injected by dependency)
+
+    Returns:
+        MetricsResponse: Current counters
+
+    """
+    # only admin (user_id=1), as for the stats of all users
+    if current_user.user_id != 1:
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    return MetricsResponse(
+        clients=get_client_stats(),
+        providers={
+            name: provider.get_stats()
+            for name, provider in get_llm_provider_instances().items()
+        },
+        cache=LLM_CACHE.get_stats(),
+        single_flight=LLM_SINGLE_FLIGHT.get_stats(),
+        circuit_breakers=get_circuit_breaker_stats(),
+        routing=get_routing_stats(),
+        latency=LATENCY.get_stats(),
+        model_stats=MODEL_STATS.get_stats(),
+        auto_model_decisions=get_decisions(),
+        token_estimator=TOKEN_ESTIMATOR.get_stats(),
+        aborted=get_aborted_stats(),
+        prompt_cache=PROMPT_CACHE_STATS.get_stats(),
+        rate_limits=RATE_GOVERNOR.get_stats(),
+        map_reduce=MAP_REDUCE_STATS.get_stats(),
+        sentence_memo=SENTENCE_MEMO.get_stats(),
+        translation_memory=TRANSLATION_MEMORY.get_stats(),
+        cascade=CASCADE_STATS.get_stats(),
+        output_caps=get_output_cap_stats(),
+    )
@@ -1,43 +1,102 @@
 """Text improvement router for AI-powered text operations."""
 
+import asyncio
+import dataclasses
+import json
 import logging
-from typing import Annotated
+import math
+import weakref
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from functools import partial
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
+from fastapi_app.disconnect import (
+    ClientDisconnectedError,
+    await_unless_disconnected,
+    count_aborted,
+    iterate_unless_disconnected,
+)
 from fastapi_app.helper_fastapi import get_current_user
 from fastapi_app.schemas import (
+    BatchItemResult,
+    BatchTextRequest,
+    BatchTextResponse,
     TextRequest,
     TextResponse,
     UserInfoInternal,
 )
-from shared.config import LLM_PROVIDER_DEFAULT
+from shared.config import (
+    LLM_BATCH_CONCURRENCY,
+    LLM_BATCH_USER_CONCURRENCY,
+    LLM_CHUNK_MAX_CHARS,
+    LLM_CIRCUIT_RESET_TIMEOUT,
+    LLM_DEADLINE_MAX,
+    LLM_PROVIDER_DEFAULT,
+)
 from shared.helper_db import db_insert_usage
-from shared.llm_provider import get_llm_provider
-from shared.mode_configs import MODE_CONFIGS
+from shared.llm_auto_model import AUTO_MODEL, select_model
+from shared.llm_cache import LLM_CACHE, acall_cached, astream_upstream, cache_key
+from shared.llm_cascade import acall_cascade
+from shared.llm_catalog import LLM_CATALOG, get_llm_models
+from shared.llm_chunking import DOCUMENT_MEMORY, acall_chunked, acall_incremental
+from shared.llm_deadline import (
+    DeadlineExceededError,
+    await_with_deadline,
+    request_deadline,
+)
+from shared.llm_map_reduce import acall_map_reduce
+from shared.llm_output_cap import OutputLimitError, output_guard
+from shared.llm_provider import LLMProvider, get_llm_provider
+from shared.llm_rate_limit import RateLimitError
+from shared.llm_resilience import CircuitOpenError
+from shared.llm_routing import Route, astream_routed, get_routes
+from shared.llm_sentence_memo import acall_sentence_memo
+from shared.llm_tokens import (
+    TOKEN_ESTIMATOR,
+    TokenBudget,
+    TokenBudgetError,
+    check_budget,
+)
+from shared.llm_translation_memory import acall_translation_memory
+from shared.mode_configs import MODE_CONFIGS, ModeConfig
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-
-@router.post(
-    "/",
-    responses={
-        400: {
-            "description": (
-                "Invalid request: empty text, unknown mode, or missing "
-                "custom_instruction"
-            )
-        },
-        500: {"description": "LLM service not configured or processing failed"},
+RESPONSES: dict[int | str, dict[str, Any]] = {
+    400: {
+        "description": (
+            "Invalid request: empty text, unknown mode, or missing custom_instruction"
+        )
     },
-)
-async def improve_text(
-    request: TextRequest,
-    current_user: Annotated[UserInfoInternal, Depends(get_current_user)],
-) -> TextResponse:
-    """Improve text using AI based on the selected mode."""
+    413: {"description": "Text exceeds the context or output budget of the model"},
+    429: {"description": "Upstream rate limit of the LLM provider reached"},
+    500: {"description": "LLM service not configured or processing failed"},
+    503: {"description": "LLM provider temporarily unavailable (circuit open)"},
+    504: {"description": "No LLM response before the deadline of the request"},
+}
+
+# non-standard status of nginx, logged for requests aborted by the client
+STATUS_CLIENT_CLOSED_REQUEST = 499
+
+# paragraph memory of an incremental call in the details of _acall_route(),
+# not a field of the TextResponse
+DOCUMENT_MEMORY_FIELD = "_document_memory"
+
+# seconds until the request ends with a 504, default: timeout of the mode
+RequestTimeout = Annotated[
+    float | None,
+    Header(gt=0, description=f"Deadline in seconds, at most {LLM_DEADLINE_MAX:g}"),
+]
+
+
+def _get_instruction(request: TextRequest) -> str:
+    """Validate the request and return the LLM instruction for its mode."""
     # Validate input
     if not request.text or not request.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
@@ -57,53 +116,212 @@ async def improve_text(
         instruction = instruction.replace(
             "<CUSTOM_INSTRUCTION>", request.custom_instruction.strip()
         )
+    return instruction
 
-    logger.info(
-        "User: %s | mode: %s | length %d",
-        current_user.user_name,
-        request.mode,
-        len(request.text),
+
+def _get_provider_and_model(request: TextRequest) -> tuple[str, str, LLMProvider]:
+    """Return provider name, model and LLM provider for the request."""
+    try:
+        # Use provider from request, or default to default provider
+        selected_provider = request.provider or LLM_PROVIDER_DEFAULT
+        models = get_llm_models(selected_provider)
+        llm_provider = get_llm_provider(selected_provider)
+        # Use model from request, or default to first available
+        if request.model == AUTO_MODEL:
+            model = select_model(llm_provider, request.mode, request.text)
+        elif request.model and request.model in models:
+            model = request.model
+        else:
+            model = models[0]
+    except (ValueError, ImportError) as e:
+        msg = "Failed to get LLM provider:"
+        logger.exception(msg)
+        raise HTTPException(
+            status_code=500, detail="LLM service is not properly configured"
+        ) from e
+    return selected_provider, model, llm_provider
+
+
+def _get_budget(
+    provider_name: str, instruction: str, text: str, mode_config: ModeConfig
+) -> TokenBudget:
+    """Return the estimated token budget of the text for the provider."""
+    return check_budget(
+        get_llm_provider(provider_name).provider,
+        LLM_CATALOG[provider_name],
+        instruction,
+        text,
+        mode_config=mode_config,
     )
 
+
+def _log_usage(user_id: int, tokens: int, requests: int = 1) -> None:
+    """Log usage to DB, a failure does not break the response."""
     try:
-        # Get LLM provider with explicit error handling
-        try:
-            # Use provider from request, or default to default provider
-            selected_provider = request.provider or LLM_PROVIDER_DEFAULT
-            llm_provider = get_llm_provider(selected_provider)
-            models = llm_provider.get_models()
-            # Use model from request, or default to first available
-            model = (
-                request.model
-                if request.model and request.model in models
-                else models[0]
-            )
-        except (ValueError, ImportError) as e:
-            msg = "Failed to get LLM provider:"
-            logger.exception(msg)
-            raise HTTPException(
-                status_code=500, detail="LLM service is not properly configured"
-            ) from e
+        db_insert_usage(user_id=user_id, tokens=tokens, requests=requests)
+    except Exception:
+        logger.exception("Failed to log usage:")
 
-        # Call LLM with timeout protection (if using async)
-        improved_text, tokens_used = llm_provider.call(
-            model=model, instruction=instruction, prompt=request.text
+
+async def _acall_route(
+    route: Route,
+    request: TextRequest,
+    current_user: UserInfoInternal,
+    instruction: str,
+) -> tuple[str, int, bool, dict[str, Any]]:
+    """
+    Call the LLM of the route for the request, as fits its mode.
+
+    Returns text, tokens, cached and further fields of the TextResponse.
+    """
+    mode_config = MODE_CONFIGS[request.mode]
+    llm_provider = get_llm_provider(route.provider)
+    # fallback routes may have a smaller context than the requested one
+    route_budget = _get_budget(route.provider, instruction, request.text, mode_config)
+    chunk_chars = route_budget.max_chars and min(
+        route_budget.max_chars, LLM_CHUNK_MAX_CHARS
+    )
+    if request.document_id and mode_config.incremental:
+        # only the paragraphs changed since the last request are sent, in chunks;
+        # the memory is kept by process_text() once the answer is accepted
+        memory = await DOCUMENT_MEMORY.aget(current_user.user_id, request.document_id)
+        text, tokens, cached, reused = await acall_incremental(
+            llm_provider,
+            model=route.model,
+            instruction=instruction,
+            prompt=request.text,
+            memory=memory,
+            use_cache=mode_config.cacheable,
+            max_chars=chunk_chars,
+        )
+        return (
+            text,
+            tokens,
+            cached,
+            {"paragraphs_reused": reused, DOCUMENT_MEMORY_FIELD: memory},
+        )
+    if mode_config.map_instruction:
+        # long texts are processed per section, then combined
+        text, tokens, cached, stage_tokens = await acall_map_reduce(
+            llm_provider,
+            model=route.model,
+            instruction=instruction,
+            prompt=request.text,
+            map_instruction=mode_config.map_instruction,
+            use_cache=mode_config.cacheable,
+            max_chars=route_budget.max_chars,
+        )
+        return text, tokens, cached, {"tokens_by_stage": stage_tokens}
+    if mode_config.sentence_memo:
+        # sentences corrected before are served locally, the others are sent
+        # in concurrent chunks
+        text, tokens, cached, reused = await acall_sentence_memo(
+            llm_provider,
+            model=route.model,
+            instruction=instruction,
+            prompt=request.text,
+            use_cache=mode_config.cacheable,
+            max_chars=chunk_chars,
         )
+        return text, tokens, cached, {"sentences_reused": reused}
+    if mode_config.translation_memory:
+        # paragraphs the user translated before are served from the translation
+        # memory, the others are sent with the translations of similar ones
+        text, tokens, cached, reused = await acall_translation_memory(
+            llm_provider,
+            model=route.model,
+            instruction=instruction,
+            prompt=request.text,
+            user_id=current_user.user_id,
+            use_cache=mode_config.cacheable,
+            max_chars=chunk_chars,
+        )
+        return text, tokens, cached, {"segments_reused": reused}
+    # long texts of chunkable modes are processed in concurrent chunks,
+    # small enough for the model
+    llm_call = (
+        partial(acall_chunked, max_chars=chunk_chars)
+        if mode_config.chunkable
+        else acall_cached
+    )
+    text, tokens, cached = await llm_call(
+        llm_provider,
+        model=route.model,
+        instruction=instruction,
+        prompt=request.text,
+        use_cache=mode_config.cacheable,
+    )
+    return text, tokens, cached, {}
+
+
+async def process_text(
+    request: TextRequest,
+    current_user: UserInfoInternal,
+    request_timeout: float | None = None,
+) -> TextResponse:
+    """
+    Process a text request, the usage is logged by the caller.
+
+    The LLM calls end at the deadline in request_timeout seconds, default
+    of the mode.
+    Raises HTTPException for invalid requests and failures.
+    """
+    instruction = _get_instruction(request)
+
+    try:
+        selected_provider, model, _ = _get_provider_and_model(request)
+        mode_config = MODE_CONFIGS[request.mode]
+        # pre-flight: texts exceeding the model fail before any upstream call
+        budget = _get_budget(selected_provider, instruction, request.text, mode_config)
+        if request.dry_run:
+            return TextResponse(
+                text_original=request.text,
+                text_ai="",
+                mode=request.mode,
+                tokens_used=0,
+                model=model,
+                provider=selected_provider,
+                tokens_estimated=budget.total_tokens,
+            )
+
+        # Await the async provider call, so the worker keeps serving other requests
+        # fallback/hedging/cascade: the route that answered is reported and accounted
+        with (
+            request_deadline(request_timeout or mode_config.timeout),
+            output_guard(mode_config.output_ratio) as guard,
+        ):
+            (
+                (improved_text, tokens_used, cached, details),
+                route,
+                cascade_tier,
+            ) = await await_with_deadline(
+                acall_cascade(
+                    get_routes(selected_provider, model),
+                    lambda route: _acall_route(
+                        route, request, current_user, instruction
+                    ),
+                    text=request.text,
+                    # the selected model is the only tier, unless requested
+                    check=mode_config.cascade if request.cascade else None,
+                )
+            )
+        selected_provider, model = route.provider, route.model
+        # only the paragraphs of the accepted answer, not of a rejected cheap one
+        if (memory := details.pop(DOCUMENT_MEMORY_FIELD, None)) is not None:
+            await DOCUMENT_MEMORY.aput(
+                current_user.user_id, request.document_id, memory
+            )
 
         # Validate response
         if not improved_text:
             msg = "LLM returned empty response"
             raise ValueError(msg)  # noqa: TRY301
 
-        try:
-            db_insert_usage(user_id=current_user.user_id, tokens=tokens_used)
-        except Exception:
-            logger.exception("Failed to log usage:")
-
         logger.debug(
-            "Successfully improved text for %s, used %d tokens",
+            "Successfully improved text for %s, used %d tokens of %s",
             current_user.user_name,
             tokens_used,
+            route,
         )
 
         return TextResponse(
@@ -113,13 +331,382 @@ async def improve_text(
             tokens_used=tokens_used,
             model=model,
             provider=selected_provider,
+            cached=cached,
+            tokens_estimated=budget.total_tokens,
+            cascade_tier=cascade_tier,
+            truncated=guard.truncated > 0,
+            **details,
         )
 
     except HTTPException:
         raise
+    except (
+        TokenBudgetError,
+        RateLimitError,
+        CircuitOpenError,
+        DeadlineExceededError,
+    ) as e:
+        logger.warning("Rejected request of user %s: %s", current_user.user_name, e)
+        raise _rejected(e) from e
     except Exception as e:
         logger.exception("Error improving text for user %s", current_user.user_name)
         raise HTTPException(
             status_code=500,
             detail="Failed to process text. Please try again.",
         ) from e
+
+
+def _rejected(
+    e: TokenBudgetError | RateLimitError | CircuitOpenError | DeadlineExceededError,
+) -> HTTPException:
+    """Return the HTTPException of a request rejected before or by the LLM call."""
+    if isinstance(e, TokenBudgetError):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, RateLimitError):
+        return HTTPException(
+            status_code=429,
+            detail="LLM rate limit reached. Please try again later.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail="LLM service temporarily unavailable. Please try again later.",
+            headers={"Retry-After": str(round(LLM_CIRCUIT_RESET_TIMEOUT))},
+        )
+    return HTTPException(
+        status_code=504, detail="LLM request timed out. Please try again."
+    )
+
+
+def _client_closed(current_user: UserInfoInternal, kind: str) -> HTTPException:
+    """Count the aborted request, return the exception ending it."""
+    logger.info("User: %s | %s aborted by the client", current_user.user_name, kind)
+    count_aborted(kind)
+    return HTTPException(
+        status_code=STATUS_CLIENT_CLOSED_REQUEST, detail="Client closed request"
+    )
+
+
+@router.post("/", responses=RESPONSES)
+async def improve_text(
+    request: TextRequest,
+    current_user: Annotated[UserInfoInternal, Depends(get_current_user)],
+    http_request: Request,
+    x_request_timeout: RequestTimeout = None,
+) -> TextResponse:
+    """
+    Improve text using AI based on the selected mode.
+
+    If the client disconnects meanwhile, the LLM call is cancelled. The
+    provider reports no usage for cancelled calls, so none is logged.
+    The request ends with a 504 at its deadline, see X-Request-Timeout.
+    """
+    logger.info(
+        "User: %s | mode: %s | length %d",
+        current_user.user_name,
+        request.mode,
+        len(request.text),
+    )
+    try:
+        response = await await_unless_disconnected(
+            http_request, process_text(request, current_user, x_request_timeout)
+        )
+    except ClientDisconnectedError as e:
+        raise _client_closed(current_user, "requests") from e
+    if not request.dry_run:
+        _log_usage(user_id=current_user.user_id, tokens=response.tokens_used)
+    return response
+
+
+# per-user concurrency caps of the batches, per event loop (i.e. per worker)
+_user_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[int, asyncio.Semaphore]
+] = weakref.WeakKeyDictionary()
+
+
+def _get_user_semaphore(user_id: int) -> asyncio.Semaphore:
+    """Return the semaphore limiting the concurrent batch items of the user."""
+    semaphores = _user_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if user_id not in semaphores:
+        semaphores[user_id] = asyncio.Semaphore(LLM_BATCH_USER_CONCURRENCY)
+    return semaphores[user_id]
+
+
+@router.post("/batch")
+async def improve_text_batch(
+    request: BatchTextRequest,
+    current_user: Annotated[UserInfoInternal, Depends(get_current_user)],
+    http_request: Request,
+    x_request_timeout: RequestTimeout = None,
+) -> BatchTextResponse:
+    """
+    Improve a batch of texts concurrently, with one usage record per batch.
+
+    Items are processed in parallel, limited per batch and per user.
+    A failed item does not fail the batch, its error is returned instead.
+    If the client disconnects, the pending items are cancelled and only the
+    usage of the processed ones is logged. Items not done at the deadline of
+    the batch fail with 504.
+
+    Args:
+        request: Batch of text requests
+        current_user: Authenticated user (injected by dependency)
+        http_request: HTTP request, to detect a disconnect of the client
+        x_request_timeout: Deadline of the batch and of each item in seconds,
+            default: LLM_DEADLINE_MAX for the batch, the mode timeout per item
+
+    Returns:
+        BatchTextResponse: Results in the order of the requests
+
+    """
+    logger.info(
+        "User: %s | batch of %d items", current_user.user_name, len(request.items)
+    )
+    batch_semaphore = asyncio.Semaphore(LLM_BATCH_CONCURRENCY)
+    user_semaphore = _get_user_semaphore(current_user.user_id)
+
+    processed: list[TextResponse] = []
+
+    async def process(item: TextRequest) -> BatchItemResult:
+        async with batch_semaphore, user_semaphore:
+            try:
+                response = await process_text(item, current_user, x_request_timeout)
+            except HTTPException as e:
+                return BatchItemResult(status_code=e.status_code, error=e.detail)
+        if not item.dry_run:
+            processed.append(response)
+        return BatchItemResult(status_code=200, response=response)
+
+    try:
+        # the items inherit the deadline of the batch
+        with request_deadline(x_request_timeout or LLM_DEADLINE_MAX):
+            results = await await_unless_disconnected(
+                http_request,
+                asyncio.gather(*(process(item) for item in request.items)),
+            )
+    except ClientDisconnectedError as e:
+        if processed:
+            _log_usage(
+                user_id=current_user.user_id,
+                tokens=sum(response.tokens_used for response in processed),
+                requests=len(processed),
+            )
+        raise _client_closed(current_user, "batches") from e
+
+    tokens_used = sum(response.tokens_used for response in processed)
+    if processed:
+        # one aggregated write instead of one per item
+        _log_usage(
+            user_id=current_user.user_id, tokens=tokens_used, requests=len(processed)
+        )
+    return BatchTextResponse(
+        results=list(results),
+        tokens_used=tokens_used,
+        failed=sum(result.response is None for result in results),
+    )
+
+
+async def _astream_text(
+    http_request: Request,
+    current_user: UserInfoInternal,
+    routes: list[Route],
+    instruction: str,
+    text: str,
+) -> AsyncIterator[tuple[Route, str, int]]:
+    """
+    Stream the text via the routes, until the client disconnects.
+
+    On disconnect the upstream stream is closed and the tokens consumed so far
+    are logged: as reported, else estimated from the prompt and streamed text.
+    Raises ValueError if the LLM returned no text.
+    """
+    parts: list[str] = []
+    tokens_used = 0
+    route = routes[0]
+    try:
+        async for route, delta, tokens in iterate_unless_disconnected(
+            http_request,
+            astream_routed(
+                routes,
+                lambda r: astream_upstream(
+                    get_llm_provider(r.provider), r.model, instruction, text
+                ),
+            ),
+        ):
+            tokens_used += tokens
+            parts.append(delta)
+            yield route, delta, tokens
+        if not "".join(parts):
+            msg = "LLM returned empty response"
+            raise ValueError(msg)
+    # disconnect detected by polling, or the server closed the response stream
+    except (ClientDisconnectedError, asyncio.CancelledError, GeneratorExit):
+        _client_closed(current_user, "streams")
+        if not tokens_used and "".join(parts):
+            provider_name = get_llm_provider(route.provider).provider
+            tokens_used = TOKEN_ESTIMATOR.estimate(
+                provider_name, instruction + text
+            ) + TOKEN_ESTIMATOR.estimate(provider_name, "".join(parts))
+        _log_usage(user_id=current_user.user_id, tokens=tokens_used)
+        raise
+
+
+def _sse_event(event: str, data: dict[str, Any]) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_error_detail(e: Exception) -> str:
+    """Return the detail of the 'error' event ending a stream."""
+    if isinstance(e, DeadlineExceededError):
+        return _rejected(e).detail
+    if isinstance(e, OutputLimitError):
+        return "The response exceeds the expected length. Please try again."
+    return "Failed to process text. Please try again."
+
+
+@router.post(
+    "/stream",
+    response_class=StreamingResponse,
+    responses={
+        **RESPONSES,
+        200: {
+            "description": (
+                "Server-Sent Events: 'delta' events with the text parts, "
+                "then a 'done' event with the TextResponse or an 'error' event"
+            ),
+            "content": {"text/event-stream": {}},
+        },
+    },
+)
+async def improve_text_stream(
+    request: TextRequest,
+    current_user: Annotated[UserInfoInternal, Depends(get_current_user)],
+    http_request: Request,
+    x_request_timeout: RequestTimeout = None,
+) -> StreamingResponse:
+    """
+    Improve text using AI, streaming the response as Server-Sent Events.
+
+    If the client disconnects, the upstream stream is closed. The tokens
+    consumed until then are logged, as reported or else estimated.
+    A stream not opened before the deadline ends with an 'error' event.
+    """
+    instruction = _get_instruction(request)
+    selected_provider, model, llm_provider = _get_provider_and_model(request)
+
+    logger.info(
+        "User: %s | mode: %s | length %d | streaming",
+        current_user.user_name,
+        request.mode,
+        len(request.text),
+    )
+
+    mode_config = MODE_CONFIGS[request.mode]
+    try:
+        # streamed responses are not chunked or map-reduced
+        budget = _get_budget(
+            selected_provider,
+            instruction,
+            request.text,
+            dataclasses.replace(mode_config, chunkable=False, map_instruction=None),
+        )
+    except TokenBudgetError as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+
+    use_cache = mode_config.cacheable
+    key = cache_key(llm_provider.provider, model, instruction, request.text)
+
+    async def event_stream() -> AsyncIterator[str]:
+        if request.dry_run:
+            response = TextResponse(
+                text_original=request.text,
+                text_ai="",
+                mode=request.mode,
+                tokens_used=0,
+                model=model,
+                provider=selected_provider,
+                tokens_estimated=budget.total_tokens,
+            )
+            yield _sse_event("done", response.model_dump())
+            return
+
+        if use_cache and (cached := await LLM_CACHE.aget(key)):
+            yield _sse_event("delta", {"text": cached[0]})
+            _log_usage(user_id=current_user.user_id, tokens=0)
+            response = TextResponse(
+                text_original=request.text,
+                text_ai=cached[0],
+                mode=request.mode,
+                tokens_used=0,
+                model=model,
+                provider=selected_provider,
+                cached=True,
+            )
+            yield _sse_event("done", response.model_dump())
+            return
+
+        parts: list[str] = []
+        tokens_used = 0
+        route = Route(selected_provider, model)
+        try:
+            # the stream has to open before the deadline, the SDKs read with
+            # the time left then as timeout
+            # the output guard aborts runaway streams, see astream_upstream()
+            with (
+                request_deadline(x_request_timeout or mode_config.timeout),
+                output_guard(mode_config.output_ratio) as guard,
+            ):
+                async with aclosing(
+                    _astream_text(
+                        http_request,
+                        current_user,
+                        get_routes(selected_provider, model),
+                        instruction,
+                        request.text,
+                    )
+                ) as stream:
+                    async for route, delta, tokens in stream:  # noqa: B007
+                        tokens_used += tokens
+                        if delta:
+                            parts.append(delta)
+                            yield _sse_event("delta", {"text": delta})
+        except ClientDisconnectedError:
+            return
+        except Exception as e:
+            logger.exception("Error streaming text for user %s", current_user.user_name)
+            yield _sse_event("error", {"detail": _stream_error_detail(e)})
+            return
+
+        _log_usage(user_id=current_user.user_id, tokens=tokens_used)
+        truncated = guard.truncated > 0
+        if use_cache and not truncated:
+            await LLM_CACHE.aput(
+                cache_key(
+                    get_llm_provider(route.provider).provider,
+                    route.model,
+                    instruction,
+                    request.text,
+                ),
+                "".join(parts),
+                tokens_used,
+            )
+
+        response = TextResponse(
+            text_original=request.text,
+            text_ai="".join(parts),
+            mode=request.mode,
+            tokens_used=tokens_used,
+            model=route.model,
+            provider=route.provider,
+            truncated=truncated,
+        )
+        yield _sse_event("done", response.model_dump())
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # disable proxy buffering, so the events reach the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
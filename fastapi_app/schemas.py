@@ -1,9 +1,11 @@
 """Pydantic schemas for request and response validation."""
 
 import datetime as dt
+from typing import Literal
 
 from pydantic import BaseModel, Field
 
+from shared.config import LLM_BATCH_MAX_ITEMS
 from shared.mode_configs import TextMode
 
 
@@ -51,7 +53,30 @@ class TextRequest(BaseModel):
         None, description="LLM provider to use (optional, defaults to default provider)"
     )
     model: str | None = Field(
-        None, description="LLM model to use (optional, defaults to first available)"
+        None,
+        description=(
+            "LLM model to use (optional, defaults to first available). "
+            "'auto' selects the model by text length, mode and observed latency"
+        ),
+    )
+    document_id: str | None = Field(
+        None,
+        max_length=64,
+        description=(
+            "Client chosen ID of the edited document (optional). "
+            "Re-submissions in 'correct' mode only send the changed paragraphs"
+        ),
+    )
+    dry_run: bool = Field(
+        default=False,
+        description="Only estimate the tokens of the request, without calling the LLM",
+    )
+    cascade: bool = Field(
+        default=False,
+        description=(
+            "'correct'/'improve' mode: try the cheapest model first, the selected "
+            "one only if its answer fails the local checks"
+        ),
     )
 
 
@@ -64,6 +89,69 @@ class TextResponse(BaseModel):
     tokens_used: int
     model: str
     provider: str
+    cached: bool = Field(
+        default=False, description="Served from the LLM response cache, no tokens"
+    )
+    paragraphs_reused: int = Field(
+        default=0, description="Paragraphs reused from the previous document version"
+    )
+    tokens_estimated: int = Field(
+        default=0, description="Locally estimated tokens of the request and response"
+    )
+    sentences_reused: int = Field(
+        default=0, description="Sentences served from the sentence memo (correct)"
+    )
+    segments_reused: int = Field(
+        default=0,
+        description="Paragraphs served from the translation memory (translate)",
+    )
+    tokens_by_stage: dict[str, int] = Field(
+        default_factory=dict,
+        description="Tokens per stage of multi-stage processing, e.g. map and reduce",
+    )
+    cascade_tier: str | None = Field(
+        default=None,
+        description="Tier of the cheap-first cascade that answered: cheap or escalated",
+    )
+    truncated: bool = Field(
+        default=False,
+        description="Whether a response was cut off at its output cap",
+    )
+
+
+class BatchTextRequest(BaseModel):
+    """Batch of text improvement requests."""
+
+    items: list[TextRequest] = Field(
+        ..., min_length=1, max_length=LLM_BATCH_MAX_ITEMS, description="Requests"
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Result of a request of a batch: the response or the error."""
+
+    status_code: int = Field(..., description="HTTP status code of the item")
+    response: TextResponse | None = None
+    error: str | None = None
+
+
+class BatchTextResponse(BaseModel):
+    """Batch response, results in the order of the requests."""
+
+    results: list[BatchItemResult]
+    tokens_used: int
+    failed: int = Field(..., description="Number of items with an error")
+
+
+class JobResponse(BaseModel):
+    """Status and, once done, result of a job."""
+
+    id: str
+    status: Literal["queued", "running", "done", "failed"]
+    chunks_total: int = Field(..., description="Chunks of all items, 0 until started")
+    chunks_done: int
+    result: BatchTextResponse | None = None
+    error: str | None = None
 
 
 # Statistics schemas
@@ -89,3 +177,66 @@ class UsageStatsResponse(BaseModel):
 
     daily: list[DailyUsage]
     total: list[TotalUsage]
+
+
+# Metrics schemas
+class MetricsResponse(BaseModel):
+    """Internal performance metrics of this worker (admin only)."""
+
+    clients: dict[str, int] = Field(
+        ..., description="Pooled LLM client registry: hits, misses, open clients"
+    )
+    providers: dict[str, dict[str, float]] = Field(
+        ..., description="Provider specific statistics, e.g. Azure AD token cache"
+    )
+    cache: dict[str, int] = Field(
+        ..., description="LLM response cache: hits, misses, evictions"
+    )
+    single_flight: dict[str, int] = Field(
+        ..., description="Upstream LLM calls and identical calls coalesced into them"
+    )
+    circuit_breakers: dict[str, dict[str, str | float]] = Field(
+        ..., description="Per provider: circuit state, calls, retries, failures"
+    )
+    routing: dict[str, int] = Field(
+        ..., description="Requests, hedged requests and fallbacks to the next route"
+    )
+    latency: dict[str, dict[str, float]] = Field(
+        ..., description="Per provider/model: latency samples, p50 and p95 seconds"
+    )
+    model_stats: dict[str, dict[str, float]] = Field(
+        ..., description="Per provider/model: EWMA of latency, throughput and offset"
+    )
+    auto_model_decisions: list[dict[str, str | float]] = Field(
+        ..., description="Latest selections of model 'auto', most recent last"
+    )
+    token_estimator: dict[str, dict[str, float]] = Field(
+        ..., description="Per provider: calibrated tokens per word piece"
+    )
+    aborted: dict[str, int] = Field(
+        ..., description="Requests, batches and streams aborted by the client"
+    )
+    prompt_cache: dict[str, dict[str, float]] = Field(
+        ..., description="Per provider/model: prompt tokens served from its cache"
+    )
+    rate_limits: dict[str, dict[str, float]] = Field(
+        ...,
+        description=(
+            "Per provider/model: bucket levels of the host, waits of this worker"
+        ),
+    )
+    map_reduce: dict[str, int] = Field(
+        ..., description="Map-reduce calls: sections and tokens per stage"
+    )
+    sentence_memo: dict[str, float] = Field(
+        ..., description="Sentence memo of the correct mode: hits and hit ratio"
+    )
+    translation_memory: dict[str, float] = Field(
+        ..., description="Translation memory: exact and fuzzy matches, lookup time"
+    )
+    cascade: dict[str, float] = Field(
+        ..., description="Cheap-first cascade: answers per tier, escalation rate"
+    )
+    output_caps: dict[str, int] = Field(
+        ..., description="Output caps: capped calls, truncated and aborted responses"
+    )
@@ -4,7 +4,7 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
-from .helper import my_get_env
+from .helper import my_get_env, my_get_env_or_default
 
 # Load environment variables from .env file in project root
 load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env")
@@ -23,3 +23,119 @@ LLM_PROVIDER_DEFAULT = LLM_PROVIDERS[0]
 FASTAPI_JWT_SECRET_KEY = my_get_env("FASTAPI_JWT_SECRET_KEY")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_HOURS = 24
+
+# LLM SDK HTTP connection pool (one pool per provider and worker)
+LLM_HTTP_MAX_CONNECTIONS = int(my_get_env_or_default("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(my_get_env_or_default("LLM_HTTP_MAX_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(
+    my_get_env_or_default("LLM_HTTP_KEEPALIVE_EXPIRY", "60")
+)
+# HTTP/2 requires the optional h2 package: uv add h2
+LLM_HTTP2 = my_get_env_or_default("LLM_HTTP2", "0") == "1"
+
+# LLM response cache: in-process LRU + SQLite file shared by all workers
+LLM_CACHE_ENABLED = my_get_env_or_default("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(my_get_env_or_default("LLM_CACHE_MAX_ENTRIES", "500"))
+LLM_CACHE_TTL = int(my_get_env_or_default("LLM_CACHE_TTL", "86400"))  # seconds
+LLM_CACHE_SQLITE = my_get_env_or_default("LLM_CACHE_SQLITE", "1") == "1"
+LLM_CACHE_SQLITE_MAX_ENTRIES = int(
+    my_get_env_or_default("LLM_CACHE_SQLITE_MAX_ENTRIES", "100000")
+)
+
+# retries of failed LLM calls and per-provider circuit breaker
+LLM_RETRY_MAX_ATTEMPTS = int(my_get_env_or_default("LLM_RETRY_MAX_ATTEMPTS", "3"))
+LLM_RETRY_INITIAL_WAIT = float(my_get_env_or_default("LLM_RETRY_INITIAL_WAIT", "1"))
+# longer waits, e.g. requested via Retry-After, are not waited for
+LLM_RETRY_MAX_WAIT = float(my_get_env_or_default("LLM_RETRY_MAX_WAIT", "20"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(
+    my_get_env_or_default("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")
+)
+LLM_CIRCUIT_RESET_TIMEOUT = float(
+    my_get_env_or_default("LLM_CIRCUIT_RESET_TIMEOUT", "30")
+)
+
+# ordered fallback chain, e.g. "OpenAI/gpt-5-nano, Mistral", empty: no fallback
+LLM_FALLBACK_CHAIN = my_get_env_or_default("LLM_FALLBACK_CHAIN", "")
+# hedge to the next route of the chain if no answer within this percentile
+# of the observed latency, 0: no hedging
+LLM_HEDGE_PERCENTILE = float(my_get_env_or_default("LLM_HEDGE_PERCENTILE", "0"))
+# hedge delay (seconds) before enough latencies are observed, and its minimum
+LLM_HEDGE_DEFAULT_DELAY = float(my_get_env_or_default("LLM_HEDGE_DEFAULT_DELAY", "15"))
+LLM_HEDGE_MIN_DELAY = float(my_get_env_or_default("LLM_HEDGE_MIN_DELAY", "2"))
+
+# cheap-first cascade (correct, improve) of the requests opting in via cascade,
+# 0: not even for those; route of the cheap tier, e.g. "Ollama/llama3.2",
+# empty: the first model of the requested provider
+LLM_CASCADE_ENABLED = my_get_env_or_default("LLM_CASCADE_ENABLED", "1") == "1"
+LLM_CASCADE_ROUTE = my_get_env_or_default("LLM_CASCADE_ROUTE", "")
+
+# max. seconds of a request deadline (default per mode, or requested by the
+# client), below the gunicorn worker timeout, so a hung call ends with a 504
+LLM_DEADLINE_MAX = float(my_get_env_or_default("LLM_DEADLINE_MAX", "110"))
+
+# output caps: max. tokens of a response = estimated input tokens x output_ratio
+# of the mode x factor + min. tokens (short texts), factor 0: no caps
+LLM_OUTPUT_CAP_FACTOR = float(my_get_env_or_default("LLM_OUTPUT_CAP_FACTOR", "2"))
+LLM_OUTPUT_CAP_MIN_TOKENS = int(
+    my_get_env_or_default("LLM_OUTPUT_CAP_MIN_TOKENS", "1024")
+)
+# added to the caps of reasoning models (OpenAI, Azure, Gemini), whose max. tokens
+# include the hidden reasoning tokens
+LLM_OUTPUT_CAP_REASONING_TOKENS = int(
+    my_get_env_or_default("LLM_OUTPUT_CAP_REASONING_TOKENS", "8192")
+)
+
+# upstream rate limits per provider[/model]=requests_per_minute:tokens_per_minute,
+# shared by the workers of the host, and max. seconds a request waits for them
+LLM_RATE_LIMITS = my_get_env_or_default("LLM_RATE_LIMITS", "")
+LLM_RATE_MAX_WAIT = float(my_get_env_or_default("LLM_RATE_MAX_WAIT", "10"))
+
+# Ollama (local): how long models stay loaded after a request (e.g. "30m",
+# "-1m": forever), models loaded at worker start (empty: the default model)
+# and parallel requests per model, as OLLAMA_NUM_PARALLEL of the daemon
+LLM_OLLAMA_KEEP_ALIVE = my_get_env_or_default("LLM_OLLAMA_KEEP_ALIVE", "30m")
+LLM_OLLAMA_PRELOAD = my_get_env_or_default("LLM_OLLAMA_PRELOAD", "")
+LLM_OLLAMA_NUM_PARALLEL = int(my_get_env_or_default("LLM_OLLAMA_NUM_PARALLEL", "1"))
+
+# auto model selection: weight of a new observation in the latency EWMA
+LLM_AUTO_MODEL_ALPHA = float(my_get_env_or_default("LLM_AUTO_MODEL_ALPHA", "0.2"))
+
+# chunked processing of long texts: max. chunk size and parallel LLM calls
+LLM_CHUNK_MAX_CHARS = int(my_get_env_or_default("LLM_CHUNK_MAX_CHARS", "4000"))
+LLM_CHUNK_CONCURRENCY = int(my_get_env_or_default("LLM_CHUNK_CONCURRENCY", "4"))
+# map-reduce of long texts (summarize): min. text length and section size
+LLM_MAP_REDUCE_MIN_CHARS = int(
+    my_get_env_or_default("LLM_MAP_REDUCE_MIN_CHARS", "12000")
+)
+LLM_MAP_REDUCE_SECTION_CHARS = int(
+    my_get_env_or_default("LLM_MAP_REDUCE_SECTION_CHARS", "8000")
+)
+# incremental processing: number of documents to remember the paragraphs of,
+# shared by the workers with the SQLite tier of the LLM cache, else per worker
+LLM_DOCUMENT_MEMORY_MAX = int(my_get_env_or_default("LLM_DOCUMENT_MEMORY_MAX", "200"))
+# sentence memo (correct mode): number of corrected sentences to remember
+LLM_SENTENCE_MEMO_MAX = int(my_get_env_or_default("LLM_SENTENCE_MEMO_MAX", "20000"))
+# translation memory (translate modes): max. segments, min. similarity of references
+LLM_TRANSLATION_MEMORY_MAX = int(
+    my_get_env_or_default("LLM_TRANSLATION_MEMORY_MAX", "100000")
+)
+LLM_TRANSLATION_MEMORY_MIN_SIMILARITY = float(
+    my_get_env_or_default("LLM_TRANSLATION_MEMORY_MIN_SIMILARITY", "0.6")
+)
+
+# batch endpoint: max. items, items processed in parallel per batch and per user;
+# the user limit spans the concurrent batches of a user in a worker, so it is
+# at most the batch limit, else it does not bound a single batch
+LLM_BATCH_MAX_ITEMS = int(my_get_env_or_default("LLM_BATCH_MAX_ITEMS", "500"))
+LLM_BATCH_CONCURRENCY = int(my_get_env_or_default("LLM_BATCH_CONCURRENCY", "8"))
+LLM_BATCH_USER_CONCURRENCY = int(
+    my_get_env_or_default("LLM_BATCH_USER_CONCURRENCY", "8")
+)
+
+# job queue: jobs processed in parallel per worker, lease of a running job,
+# poll interval of the workers, max. long-poll wait and retention in seconds
+LLM_JOB_CONCURRENCY = int(my_get_env_or_default("LLM_JOB_CONCURRENCY", "2"))
+LLM_JOB_LEASE = float(my_get_env_or_default("LLM_JOB_LEASE", "60"))
+LLM_JOB_POLL_INTERVAL = float(my_get_env_or_default("LLM_JOB_POLL_INTERVAL", "2"))
+LLM_JOB_MAX_WAIT = float(my_get_env_or_default("LLM_JOB_MAX_WAIT", "60"))
+LLM_JOB_RETENTION = int(my_get_env_or_default("LLM_JOB_RETENTION", "86400"))
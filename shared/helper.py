@@ -47,6 +47,11 @@ def my_get_env(key: str) -> str:
     return value
 
 
+def my_get_env_or_default(key: str, default: str) -> str:
+    """Get optional environment variable, fall back to default if not set."""
+    return os.getenv(key) or default
+
+
 def verify_geheimnis(geheimnis: str, hashed_geheimnis: str) -> bool:
     """Verify a plain text secret against a hashed secret."""
     return bcrypt.checkpw(geheimnis.encode("utf-8"), hashed_geheimnis.encode("utf-8"))
@@ -3,6 +3,7 @@
 import datetime as dt
 import logging
 import sqlite3
+import time
 from collections.abc import Generator
 from contextlib import contextmanager
 from functools import lru_cache
@@ -224,8 +225,8 @@ def db_select_user_from_geheimnis(geheimnis: str) -> tuple[int, str]:
 # update AI usage
 
 
-def db_insert_usage(user_id: int, tokens: int) -> None:
-    """Insert/update usage stats in table history."""
+def db_insert_usage(user_id: int, tokens: int, requests: int = 1) -> None:
+    """Insert/update usage stats in table history, requests aggregated in one write."""
     # Skip DB insert when using mocked LLM provider
     if LLM_PROVIDER_DEFAULT == "Mocked":
         logger.debug("Mocked LLM: Skipping usage insert")
@@ -243,12 +244,12 @@ def db_insert_usage(user_id: int, tokens: int) -> None:
                 cursor.execute(
                     """
                     INSERT INTO history (date, user_id, cnt_requests, cnt_tokens)
-                    VALUES (?, ?, 1, ?)
+                    VALUES (?, ?, ?, ?)
                     ON CONFLICT(date, user_id) DO UPDATE SET
-                        cnt_requests = cnt_requests + 1,
+                        cnt_requests = cnt_requests + ?,
                         cnt_tokens = cnt_tokens + ?
                     """,
-                    (today.isoformat(), user_id, tokens, tokens),
+                    (today.isoformat(), user_id, requests, tokens, requests, tokens),
                 )
                 con.commit()
         except sqlite3.Error:
@@ -260,14 +261,14 @@ def db_insert_usage(user_id: int, tokens: int) -> None:
     # Note: This requires a UNIQUE constraint on (date, user_id)
     query = """
 INSERT INTO history (date, user_id, cnt_requests, cnt_tokens)
-VALUES (%s, %s, 1, %s)
+VALUES (%s, %s, %s, %s)
 ON DUPLICATE KEY UPDATE
-  cnt_requests = cnt_requests + 1,
+  cnt_requests = cnt_requests + %s,
   cnt_tokens = cnt_tokens + %s
 """
     try:
         with db_connection() as con, con.cursor(dictionary=False) as cursor:
-            cursor.execute(query, (today, user_id, tokens, tokens))
+            cursor.execute(query, (today, user_id, requests, tokens, requests, tokens))
             con.commit()
 
     except mysql.connector.Error:
@@ -367,6 +368,182 @@ LIMIT 100
     return pd.DataFrame(res, columns=col_names)
 
 
+# job queue of long-running text jobs
+
+_JOB_TABLES_SQLITE = (
+    """
+    CREATE TABLE IF NOT EXISTS job (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        user_name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        request TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        chunks_total INTEGER NOT NULL DEFAULT 0,
+        chunks_done INTEGER NOT NULL DEFAULT 0,
+        created REAL NOT NULL,
+        lease_until REAL NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_job_status ON job(status, created)",
+    """
+    CREATE TABLE IF NOT EXISTS job_chunk (
+        job_id TEXT NOT NULL,
+        item INTEGER NOT NULL,
+        chunk INTEGER NOT NULL,
+        result TEXT NOT NULL,
+        PRIMARY KEY (job_id, item, chunk)
+    )
+    """,
+)
+_JOB_COLUMNS = (
+    "id",
+    "user_id",
+    "user_name",
+    "status",
+    "request",
+    "result",
+    "error",
+    "chunks_total",
+    "chunks_done",
+    "created",
+)
+_sqlite_job_tables: set[Path] = set()
+
+
+def _job_db_execute(query: str, param: tuple) -> tuple[list[tuple], int]:
+    """Execute a query on the job tables, return the rows and the rowcount."""
+    if ENV != "PROD":
+        try:
+            with sqlite_connection() as con:
+                # the job tables are newer than existing local databases
+                if SQLITE_DB_PATH not in _sqlite_job_tables:
+                    for statement in _JOB_TABLES_SQLITE:
+                        con.execute(statement)
+                    _sqlite_job_tables.add(SQLITE_DB_PATH)
+                cursor = con.execute(query, param)
+                rows = cursor.fetchall()
+                con.commit()
+                return rows, cursor.rowcount
+        except sqlite3.Error:
+            logger.exception("SQLite error during job query\n%s", query)
+            raise
+
+    try:
+        with db_connection() as con, con.cursor(dictionary=False) as cursor:
+            cursor.execute(query.replace("?", "%s"), param)
+            rows = cursor.fetchall() if cursor.with_rows else []
+            con.commit()
+            return rows, cursor.rowcount  # type: ignore[return-value]
+    except mysql.connector.Error:
+        logger.exception("Database error during job query\n%s", query)
+        raise
+
+
+def db_insert_job(job_id: str, user_id: int, user_name: str, request: str) -> None:
+    """Insert a queued job, request is the JSON of the job request."""
+    _job_db_execute(
+        "INSERT INTO job (id, user_id, user_name, status, request, created)"
+        " VALUES (?, ?, ?, 'queued', ?, ?)",
+        (job_id, user_id, user_name, request, time.time()),
+    )
+
+
+def db_select_job(job_id: str, user_id: int | None = None) -> dict | None:
+    """Return the job as dict, None if not found or not of the user."""
+    query = f"SELECT {', '.join(_JOB_COLUMNS)} FROM job WHERE id = ?"  # noqa: S608
+    param: tuple = (job_id,)
+    if user_id is not None:
+        query += " AND user_id = ?"
+        param += (user_id,)
+    rows, _ = _job_db_execute(query, param)
+    return dict(zip(_JOB_COLUMNS, rows[0], strict=True)) if rows else None
+
+
+def db_claim_job(lease_seconds: float) -> dict | None:
+    """
+    Claim the oldest queued job, or a running one whose lease expired.
+
+    The job of a worker that died is taken over after its lease expired.
+    Returns the claimed job, None if there is none.
+    """
+    now = time.time()
+    rows, _ = _job_db_execute(
+        "SELECT id FROM job"
+        " WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+        " ORDER BY created LIMIT 10",
+        (now,),
+    )
+    for (job_id,) in rows:
+        # optimistic: another worker may have claimed it in the meantime
+        _, rowcount = _job_db_execute(
+            "UPDATE job SET status = 'running', lease_until = ?"
+            " WHERE id = ?"
+            " AND (status = 'queued' OR (status = 'running' AND lease_until < ?))",
+            (now + lease_seconds, job_id, now),
+        )
+        if rowcount == 1:
+            return db_select_job(job_id)
+    return None
+
+
+def db_update_job_progress(
+    job_id: str, lease_seconds: float, chunks_total: int, chunks_done: int
+) -> None:
+    """Update the progress of a running job and extend its lease."""
+    _job_db_execute(
+        "UPDATE job SET lease_until = ?, chunks_total = ?, chunks_done = ?"
+        " WHERE id = ? AND status = 'running'",
+        (time.time() + lease_seconds, chunks_total, chunks_done, job_id),
+    )
+
+
+def db_extend_job_lease(job_id: str, lease_seconds: float) -> None:
+    """Extend the lease of a running job, so no other worker takes it over."""
+    _job_db_execute(
+        "UPDATE job SET lease_until = ? WHERE id = ? AND status = 'running'",
+        (time.time() + lease_seconds, job_id),
+    )
+
+
+def db_update_job_status(
+    job_id: str, status: str, result: str | None = None, error: str | None = None
+) -> None:
+    """Set the status of a job: 'done' or 'failed' with result/error, 'queued'."""
+    _job_db_execute(
+        "UPDATE job SET status = ?, result = ?, error = ?, lease_until = 0"
+        " WHERE id = ?",
+        (status, result, error, job_id),
+    )
+
+
+def db_insert_job_chunk(job_id: str, item: int, chunk: int, result: str) -> None:
+    """Store the result of a chunk of a job, so it is not processed again."""
+    _job_db_execute(
+        "INSERT INTO job_chunk (job_id, item, chunk, result) VALUES (?, ?, ?, ?)",
+        (job_id, item, chunk, result),
+    )
+
+
+def db_select_job_chunks(job_id: str) -> dict[tuple[int, int], str]:
+    """Return the stored chunk results of a job by item and chunk."""
+    rows, _ = _job_db_execute(
+        "SELECT item, chunk, result FROM job_chunk WHERE job_id = ?", (job_id,)
+    )
+    return {(int(item), int(chunk)): str(result) for item, chunk, result in rows}
+
+
+def db_delete_jobs_before(created: float) -> None:
+    """Delete the finished jobs created before the timestamp."""
+    param = (created,)
+    finished = "SELECT id FROM job WHERE status IN ('done', 'failed') AND created < ?"
+    _job_db_execute(f"DELETE FROM job_chunk WHERE job_id IN ({finished})", param)  # noqa: S608
+    _job_db_execute(
+        "DELETE FROM job WHERE status IN ('done', 'failed') AND created < ?", param
+    )
+
+
 if __name__ == "__main__":
     res = db_select_usage_stats_total(1)
     print(res.to_csv())
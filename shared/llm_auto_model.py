@@ -0,0 +1,174 @@
+"""
+Adaptive model selection for requests with model "auto".
+
+Keeps an EWMA of latency and throughput (tokens per second) per provider and
+model, observed from the upstream calls. The expected latency of a call is a
+fixed offset (time to first token, connection) plus its tokens over the
+throughput, fitted from EWMAs of the tokens and latencies of the calls, so
+short requests are not underestimated.
+
+A request is routed to the model expected to finish within the latency SLO
+of its mode: the strongest one for modes preferring quality, else the
+fastest one. Models without observations are tried first, so their EWMAs
+are learned.
+"""
+
+import logging
+import math
+import threading
+from collections import deque
+from pathlib import Path
+
+from .config import (
+    LLM_AUTO_MODEL_ALPHA,
+    LLM_CHUNK_CONCURRENCY,
+    LLM_CHUNK_MAX_CHARS,
+)
+from .llm_provider import LLMProvider
+from .llm_tokens import TOKEN_ESTIMATOR
+from .mode_configs import MODE_CONFIGS
+
+logger = logging.getLogger(Path(__file__).stem)
+
+AUTO_MODEL = "auto"
+DECISIONS_KEPT = 50
+# min. standard deviation of the tokens of the calls, relative to their mean,
+# to fit the offset; else the latency is attributed to the throughput
+MIN_TOKENS_SPREAD = 0.05
+
+
+def _fit(stats: dict[str, float]) -> tuple[float, float]:
+    """Return latency offset and seconds per token of the EWMAs of the calls."""
+    tokens, latency = stats["tokens"], stats["latency"]
+    variance = stats["tokens_squared"] - tokens**2
+    if variance <= (MIN_TOKENS_SPREAD * tokens) ** 2:
+        per_token = 1 / stats["tokens_per_second"] if stats["tokens_per_second"] else 0
+        return 0.0, per_token
+    per_token = max((stats["tokens_latency"] - tokens * latency) / variance, 0.0)
+    offset = latency - per_token * tokens
+    if offset < 0:  # noisy: no offset, all latency from the throughput
+        return 0.0, latency / tokens
+    return offset, per_token
+
+
+class ModelStats:
+    """EWMA of latency, tokens per second and latency offset per provider and model."""
+
+    def __init__(self, alpha: float) -> None:
+        """Init the stats, alpha is the weight of a new observation."""
+        self.alpha = alpha
+        self._stats: dict[tuple[str, str], dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, seconds: float, tokens: int) -> None:
+        """Record an upstream call."""
+        if seconds <= 0:
+            return
+        sample = {
+            "latency": seconds,
+            "tokens_per_second": tokens / seconds,
+            "tokens": tokens,
+            "tokens_squared": tokens**2,
+            "tokens_latency": tokens * seconds,
+        }
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            if stats is None:
+                stats = self._stats[(provider, model)] = {"count": 1, **sample}
+            else:
+                stats["count"] += 1
+                for key, value in sample.items():
+                    stats[key] += self.alpha * (value - stats[key])
+            stats["offset"], stats["seconds_per_token"] = _fit(stats)
+
+    def expected_seconds(self, provider: str, model: str, tokens: int) -> float | None:
+        """Return the expected latency of a call with tokens, None if unknown."""
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            if stats is None:
+                return None
+            if stats["offset"] or stats["seconds_per_token"]:
+                return stats["offset"] + tokens * stats["seconds_per_token"]
+            return stats["latency"]
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """Return the EWMAs per provider/model."""
+        with self._lock:
+            return {
+                f"{provider}/{model}": dict(stats)
+                for (provider, model), stats in self._stats.items()
+            }
+
+
+MODEL_STATS = ModelStats(alpha=LLM_AUTO_MODEL_ALPHA)
+
+_decisions: deque[dict[str, str | float]] = deque(maxlen=DECISIONS_KEPT)
+_decisions_lock = threading.Lock()
+
+
+def expected_tokens(provider: str, mode: str, text: str) -> int:
+    """
+    Return the tokens a request is expected to take, input and response.
+
+    Chunkable modes process long texts in concurrent chunks, so only the
+    sequential rounds of chunks count.
+    """
+    mode_config = MODE_CONFIGS[mode]
+    tokens = TOKEN_ESTIMATOR.estimate(provider, text)
+    if mode_config.chunkable and len(text) > LLM_CHUNK_MAX_CHARS:
+        chunks = math.ceil(len(text) / LLM_CHUNK_MAX_CHARS)
+        rounds = math.ceil(chunks / LLM_CHUNK_CONCURRENCY)
+        tokens = tokens * min(1, rounds * LLM_CHUNK_MAX_CHARS / len(text))
+    return round(tokens * (1 + mode_config.output_ratio))
+
+
+def select_model(llm_provider: LLMProvider, mode: str, text: str) -> str:
+    """
+    Return the model of the provider to use for the request.
+
+    Models without observations are assumed to meet the SLO; modes not
+    preferring strong models try them first, so they get observations.
+    If none meets the SLO, the fastest one is used.
+    """
+    mode_config = MODE_CONFIGS[mode]
+    models = llm_provider.get_models()  # ordered from cheap/fast to strong
+    tokens = expected_tokens(llm_provider.provider, mode, text)
+    expected: dict[str, float] = {}
+    for model in models:
+        seconds = MODEL_STATS.expected_seconds(llm_provider.provider, model, tokens)
+        # unknown models: infinitely slow, but assumed to meet the SLO
+        expected[model] = math.inf if seconds is None else seconds
+
+    within_slo = [
+        model
+        for model in models
+        if math.isinf(expected[model]) or expected[model] <= mode_config.latency_slo
+    ]
+    unobserved = [model for model in models if math.isinf(expected[model])]
+    if within_slo and mode_config.prefer_strong_model:
+        model = within_slo[-1]
+    elif unobserved:
+        # explored once, then ranked by its EWMA
+        model = unobserved[0]
+    elif within_slo:
+        model = min(within_slo, key=expected.__getitem__)
+    else:
+        model = min(models, key=expected.__getitem__)
+
+    decision: dict[str, str | float] = {
+        "provider": llm_provider.provider,
+        "mode": mode,
+        "tokens": tokens,
+        "model": model,
+        "expected_seconds": -1 if math.isinf(expected[model]) else expected[model],
+    }
+    logger.debug("Auto model selection: %s", decision)
+    with _decisions_lock:
+        _decisions.append(decision)
+    return model
+
+
+def get_decisions() -> list[dict[str, str | float]]:
+    """Return the latest auto model selections, most recent last."""
+    with _decisions_lock:
+        return list(_decisions)
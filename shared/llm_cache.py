@@ -0,0 +1,387 @@
+"""
+Content-addressed cache of LLM responses.
+
+Responses are keyed by a hash of provider, model, instruction and the
+normalized text. Two tiers:
+- in-process LRU with size limit and TTL
+- SQLite file shared by all gunicorn workers of the host, read and written
+  in a thread by the async callers, so a lock of another worker does not
+  block the event loop
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Generator
+from contextlib import contextmanager
+from pathlib import Path
+
+from .config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_SQLITE,
+    LLM_CACHE_SQLITE_MAX_ENTRIES,
+    LLM_CACHE_TTL,
+)
+from .llm_auto_model import MODEL_STATS
+from .llm_output_cap import check_stream_output, output_cap, truncations
+from .llm_provider import LLM_SINGLE_FLIGHT, LLMProvider
+from .llm_rate_limit import RATE_GOVERNOR
+from .llm_tokens import TOKEN_ESTIMATOR, count_pieces, count_reasoning_tokens
+
+logger = logging.getLogger(Path(__file__).stem)
+
+CACHE_DB_PATH = Path(__file__).parent.parent / "llm_cache.sqlite"
+# seconds between evictions of expired and surplus entries of the SQLite tier
+EVICTION_INTERVAL = 300
+
+
+def normalize_text(text: str) -> str:
+    """Normalize line endings and surrounding whitespace of the text."""
+    return text.replace("\r\n", "\n").strip()
+
+
+def cache_key(provider: str, model: str, instruction: str, text: str) -> str:
+    """Return the content hash of an LLM request."""
+    parts = (provider, model, instruction, normalize_text(text))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier cache of LLM responses (text and tokens consumed)."""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        max_entries: int = 500,
+        ttl: int = 86400,
+        db_path: Path | None = None,
+        db_max_entries: int = 100000,
+    ) -> None:
+        """Init the cache, db_path=None disables the SQLite tier."""
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self._memory: OrderedDict[str, tuple[float, str, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits_memory": 0,
+            "hits_sqlite": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        # one connection per worker process, used by one thread at a time
+        self._db_lock = threading.Lock()
+        self._con: sqlite3.Connection | None = None
+        self._con_pid = 0
+        self._next_eviction = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection of this process, create the table on first use."""
+        assert self.db_path is not None
+        if self._con is not None and self._con_pid == os.getpid():
+            return self._con
+        # not shared with a forked worker
+        con = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        # WAL: readers of other workers are not blocked by a writer
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                text TEXT NOT NULL,
+                tokens INTEGER NOT NULL
+            )
+        """)
+        con.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache(created)"
+        )
+        con.commit()
+        self._con, self._con_pid = con, os.getpid()
+        return con
+
+    @contextmanager
+    def _sqlite_connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """Lock the connection to the SQLite tier, commit on exit."""
+        with self._db_lock:
+            con = self._connect()
+            try:
+                yield con
+                con.commit()
+            except sqlite3.Error:
+                con.rollback()
+                raise
+
+    def _sqlite_get(self, key: str) -> tuple[float, str, int] | None:
+        try:
+            with self._sqlite_connection() as con:
+                row = con.execute(
+                    "SELECT created, text, tokens FROM llm_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+        except sqlite3.Error:
+            logger.exception("LLM cache SQLite read failed")
+            return None
+        return (float(row[0]), str(row[1]), int(row[2])) if row else None
+
+    def _sqlite_put(self, key: str, entry: tuple[float, str, int]) -> None:
+        try:
+            with self._sqlite_connection() as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, created, text, tokens) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, *entry),
+                )
+                if entry[0] >= self._next_eviction:
+                    self._next_eviction = entry[0] + EVICTION_INTERVAL
+                    self._sqlite_evict(con, entry[0])
+        except sqlite3.Error:
+            logger.exception("LLM cache SQLite write failed")
+
+    def _sqlite_evict(self, con: sqlite3.Connection, now: float) -> None:
+        """Delete the expired entries and the oldest ones over db_max_entries."""
+        expired = con.execute(
+            "DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)
+        ).rowcount
+        # the index on created: the oldest entries without a table scan
+        oldest = con.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.db_max_entries,),
+        ).rowcount
+        logger.debug("LLM cache SQLite: %d expired, %d oldest", expired, oldest)
+
+    def _memory_put(self, key: str, entry: tuple[float, str, int]) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _memory_get(self, key: str, now: float) -> tuple[str, int] | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] > self.ttl:
+                del self._memory[key]
+                self._stats["evictions"] += 1
+                entry = None
+            if entry:
+                self._memory.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return entry[1], entry[2]
+        return None
+
+    def _sqlite_hit(
+        self, key: str, entry: tuple[float, str, int] | None, now: float
+    ) -> tuple[str, int] | None:
+        """Promote a valid entry of the SQLite tier, count a miss otherwise."""
+        if entry and now - entry[0] <= self.ttl:
+            self._memory_put(key, entry)
+            with self._lock:
+                self._stats["hits_sqlite"] += 1
+            return entry[1], entry[2]
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def get(self, key: str) -> tuple[str, int] | None:
+        """Return cached response text and the tokens it originally consumed."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        if hit := self._memory_get(key, now):
+            return hit
+        entry = self._sqlite_get(key) if self.db_path is not None else None
+        return self._sqlite_hit(key, entry, now)
+
+    async def aget(self, key: str) -> tuple[str, int] | None:
+        """Async variant of get(), the SQLite tier is read in a thread."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        if hit := self._memory_get(key, now):
+            return hit
+        entry = (
+            await asyncio.to_thread(self._sqlite_get, key)
+            if self.db_path is not None
+            else None
+        )
+        return self._sqlite_hit(key, entry, now)
+
+    def _store(self, key: str, text: str, tokens: int) -> tuple[float, str, int]:
+        entry = (time.time(), text, tokens)
+        self._memory_put(key, entry)
+        with self._lock:
+            self._stats["stores"] += 1
+        return entry
+
+    def put(self, key: str, text: str, tokens: int) -> None:
+        """Store a response, empty responses are not cached."""
+        if not self.enabled or not text:
+            return
+        entry = self._store(key, text, tokens)
+        if self.db_path is not None:
+            self._sqlite_put(key, entry)
+
+    async def aput(self, key: str, text: str, tokens: int) -> None:
+        """Async variant of put(), the SQLite tier is written in a thread."""
+        if not self.enabled or not text:
+            return
+        entry = self._store(key, text, tokens)
+        if self.db_path is not None:
+            await asyncio.to_thread(self._sqlite_put, key, entry)
+
+    def get_stats(self) -> dict[str, int]:
+        """Return hit/miss/eviction counters and the number of entries in memory."""
+        with self._lock:
+            return {**self._stats, "entries_memory": len(self._memory)}
+
+
+LLM_CACHE = LLMResponseCache(
+    enabled=LLM_CACHE_ENABLED,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl=LLM_CACHE_TTL,
+    db_path=CACHE_DB_PATH if LLM_CACHE_SQLITE else None,
+    db_max_entries=LLM_CACHE_SQLITE_MAX_ENTRIES,
+)
+
+
+def _estimated_tokens(llm_provider: LLMProvider, instruction: str, prompt: str) -> int:
+    """Return the estimated tokens of a call, the response as long as the prompt."""
+    return TOKEN_ESTIMATOR.estimate(llm_provider.provider, instruction + prompt * 2)
+
+
+def _call_upstream(
+    llm_provider: LLMProvider, model: str, instruction: str, prompt: str
+) -> tuple[str, int]:
+    """
+    Call the provider within its rate limit, recording latency and usage.
+
+    The token estimate is calibrated by the reported tokens, less the hidden
+    reasoning tokens.
+    """
+    estimated = _estimated_tokens(llm_provider, instruction, prompt)
+    RATE_GOVERNOR.acquire(llm_provider.provider, model, estimated)
+    started = time.monotonic()
+    with count_reasoning_tokens() as reasoning:
+        text, tokens = llm_provider.call(
+            model=model, instruction=instruction, prompt=prompt
+        )
+    MODEL_STATS.record(llm_provider.provider, model, time.monotonic() - started, tokens)
+    RATE_GOVERNOR.record_usage(llm_provider.provider, model, estimated, tokens)
+    TOKEN_ESTIMATOR.calibrate(
+        llm_provider.provider,
+        count_pieces(instruction + prompt + text),
+        tokens - reasoning.tokens,
+    )
+    return text, tokens
+
+
+async def _acall_upstream(
+    llm_provider: LLMProvider, model: str, instruction: str, prompt: str
+) -> tuple[str, int]:
+    """Async variant of _call_upstream()."""
+    estimated = _estimated_tokens(llm_provider, instruction, prompt)
+    await RATE_GOVERNOR.aacquire(llm_provider.provider, model, estimated)
+    started = time.monotonic()
+    with count_reasoning_tokens() as reasoning:
+        text, tokens = await llm_provider.acall(
+            model=model, instruction=instruction, prompt=prompt
+        )
+    MODEL_STATS.record(llm_provider.provider, model, time.monotonic() - started, tokens)
+    await RATE_GOVERNOR.arecord_usage(llm_provider.provider, model, estimated, tokens)
+    TOKEN_ESTIMATOR.calibrate(
+        llm_provider.provider,
+        count_pieces(instruction + prompt + text),
+        tokens - reasoning.tokens,
+    )
+    return text, tokens
+
+
+async def astream_upstream(
+    llm_provider: LLMProvider, model: str, instruction: str, prompt: str
+) -> AsyncIterator[tuple[str, int]]:
+    """
+    Stream the response of the provider within its rate limit.
+
+    Raises OutputLimitError once the response exceeds its output cap.
+    """
+    estimated = _estimated_tokens(llm_provider, instruction, prompt)
+    await RATE_GOVERNOR.aacquire(llm_provider.provider, model, estimated)
+    cap = output_cap(llm_provider.provider, prompt)
+    tokens_used = 0
+    pieces = 0
+    async for delta, tokens in llm_provider.astream(
+        model=model, instruction=instruction, prompt=prompt
+    ):
+        tokens_used += tokens
+        pieces += count_pieces(delta)
+        check_stream_output(llm_provider.provider, cap, pieces)
+        yield delta, tokens
+    await RATE_GOVERNOR.arecord_usage(
+        llm_provider.provider, model, estimated, tokens_used
+    )
+
+
+def call_cached(
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    use_cache: bool = True,
+) -> tuple[str, int, bool]:
+    """
+    Call the LLM via the response cache.
+
+    Concurrent identical calls are coalesced into one upstream call.
+    Returns response text, tokens consumed and whether it was served from cache
+    or shared with an identical in-flight call, which consume no tokens.
+    """
+    key = cache_key(llm_provider.provider, model, instruction, prompt)
+    if use_cache and (cached := LLM_CACHE.get(key)):
+        return cached[0], 0, True
+    truncated = truncations()
+    (text, tokens), leader = LLM_SINGLE_FLIGHT.do(
+        key, lambda: _call_upstream(llm_provider, model, instruction, prompt)
+    )
+    if not leader:
+        return text, 0, True
+    # responses cut off at the output cap are not cached
+    if use_cache and truncations() == truncated:
+        LLM_CACHE.put(key, text, tokens)
+    return text, tokens, False
+
+
+async def acall_cached(
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    use_cache: bool = True,
+) -> tuple[str, int, bool]:
+    """Async variant of call_cached()."""
+    key = cache_key(llm_provider.provider, model, instruction, prompt)
+    if use_cache and (cached := await LLM_CACHE.aget(key)):
+        return cached[0], 0, True
+    truncated = truncations()
+    (text, tokens), leader = await LLM_SINGLE_FLIGHT.ado(
+        key, lambda: _acall_upstream(llm_provider, model, instruction, prompt)
+    )
+    if not leader:
+        return text, 0, True
+    # responses cut off at the output cap are not cached
+    if use_cache and truncations() == truncated:
+        await LLM_CACHE.aput(key, text, tokens)
+    return text, tokens, False
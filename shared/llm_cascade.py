@@ -0,0 +1,185 @@
+"""
+Cheap-first model cascade of the correct and improve modes.
+
+Most requests are short texts with a few typos, yet users often select a
+strong model. Requests opting in via `cascade` are answered by the cheap tier
+(LLM_CASCADE_ROUTE, else the first model of the requested provider) first,
+its answer is checked locally, in a thread:
+
+- length: relative change of the length
+- structure: number of lines (correct) or paragraphs kept
+- similarity: difflib ratio of the answer to the text, line by line (correct)
+  or paragraph by paragraph, skipped for texts over MAX_SIMILARITY_CHARS
+
+Only if a check fails or the cheap tier errors out, the request escalates to
+the requested model, with its fallback chain. The cheap tier gets at most
+half of the time left until the deadline, so the escalation still fits.
+"""
+
+import asyncio
+import difflib
+import logging
+import threading
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+from .config import LLM_CASCADE_ENABLED, LLM_CASCADE_ROUTE
+from .llm_catalog import get_llm_models
+from .llm_chunking import split_paragraphs
+from .llm_deadline import (
+    await_with_deadline,
+    check_deadline,
+    remaining,
+    request_deadline,
+)
+from .llm_routing import Route, acall_routed, parse_chain
+from .mode_configs import CascadeCheck
+
+logger = logging.getLogger(Path(__file__).stem)
+
+TIER_CHEAP = "cheap"
+TIER_ESCALATED = "escalated"
+# difflib is quadratic in the length of the compared texts
+MAX_SIMILARITY_CHARS = 20000
+
+CASCADE_ROUTES = parse_chain(LLM_CASCADE_ROUTE)
+
+# text, tokens, cached and further fields of the response
+CallResult = tuple[str, int, bool, dict[str, Any]]
+
+
+class CascadeStats:
+    """Counters of the cascaded requests of this worker."""
+
+    def __init__(self) -> None:
+        """Init the counters."""
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "cheap": 0, "escalated": 0, "tokens_cheap": 0}
+        self._reasons: dict[str, int] = {}
+
+    def record(self, tier: str, tokens_cheap: int, reason: str | None = None) -> None:
+        """Record a cascaded request, reason: the failed check of an escalation."""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats[tier] += 1
+            self._stats["tokens_cheap"] += tokens_cheap
+            if reason:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def get_stats(self) -> dict[str, float]:
+        """Return the counters, escalations per reason and the escalation rate."""
+        with self._lock:
+            stats: dict[str, float] = dict(self._stats)
+            stats.update({f"reason_{k}": v for k, v in self._reasons.items()})
+        requests = stats["requests"]
+        stats["escalation_rate"] = (
+            round(stats["escalated"] / requests, 3) if requests else 0.0
+        )
+        return stats
+
+
+CASCADE_STATS = CascadeStats()
+
+
+def _units(text: str, check: CascadeCheck) -> list[str]:
+    """Return the lines (keep_lines) or non-empty paragraphs of the text."""
+    if check.keep_lines:
+        return [line.strip() for line in text.strip().splitlines()]
+    return [p.strip() for p in split_paragraphs(text.strip()) if p.strip()]
+
+
+def _similarity(units: list[str], answers: list[str]) -> float:
+    """Return the difflib ratio of the units and answers, weighted by length."""
+    total = sum(
+        len(unit) + len(answer) for unit, answer in zip(units, answers, strict=True)
+    )
+    if not total:
+        return 1.0
+    return (
+        sum(
+            difflib.SequenceMatcher(None, unit, answer).ratio()
+            * (len(unit) + len(answer))
+            for unit, answer in zip(units, answers, strict=True)
+        )
+        / total
+    )
+
+
+def failed_check(text: str, answer: str, check: CascadeCheck) -> str | None:
+    """Return the name of the first check the answer fails, None if it passes."""
+    if not answer.strip():
+        return "empty"
+    if abs(len(answer) - len(text)) > check.max_length_change * len(text):
+        return "length"
+    units = _units(text, check)
+    answers = _units(answer, check)
+    if len(units) != len(answers):
+        return "structure"
+    if (
+        len(text) <= MAX_SIMILARITY_CHARS
+        and _similarity(units, answers) < check.min_similarity
+    ):
+        return "similarity"
+    return None
+
+
+def cheap_route(route: Route) -> Route | None:
+    """Return the cheap tier of the route, None if the route is the cheap one."""
+    cheap = (
+        CASCADE_ROUTES[0]
+        if CASCADE_ROUTES
+        else Route(route.provider, get_llm_models(route.provider)[0])
+    )
+    return None if cheap == route else cheap
+
+
+async def acall_cascade(
+    routes: list[Route],
+    func: Callable[[Route], Awaitable[CallResult]],
+    *,
+    text: str,
+    check: CascadeCheck | None,
+) -> tuple[CallResult, Route, str | None]:
+    """
+    Await func() of the cheap tier, escalate to acall_routed() of the routes.
+
+    Without check (mode not cascaded or cascade not requested) or if the first
+    route is the cheap one, only the routes are called. The tokens of an
+    escalated cheap call are added to the result.
+    Returns the result, the route that answered and the tier: cheap, escalated
+    or None if not cascaded.
+    """
+    cheap = cheap_route(routes[0]) if check and LLM_CASCADE_ENABLED else None
+    if cheap is None or check is None:
+        result, route = await acall_routed(routes, func)
+        return result, route, None
+
+    with request_deadline(remaining() / 2):
+        task = asyncio.ensure_future(await_with_deadline(func(cheap)))
+        try:
+            await asyncio.wait({task})
+        finally:
+            task.cancel()
+    tokens_cheap = 0
+    if (error := task.exception()) is None:
+        result = task.result()
+        tokens_cheap = result[1]
+        # CPU-bound for long texts, off the event loop
+        reason = await asyncio.to_thread(failed_check, text, result[0], check)
+        if reason is None:
+            CASCADE_STATS.record(TIER_CHEAP, tokens_cheap)
+            return result, cheap, TIER_CHEAP
+    else:
+        logger.warning("Cascade: cheap tier %s failed: %s", cheap, error)
+        reason = "error"
+    # the deadline of the request may have passed meanwhile
+    check_deadline()
+    logger.info("Cascade: escalating from %s to %s (%s)", cheap, routes[0], reason)
+    CASCADE_STATS.record(TIER_ESCALATED, tokens_cheap, reason)
+    (answer, tokens, cached, details), route = await acall_routed(routes, func)
+    return (
+        (answer, tokens + tokens_cheap, cached and not tokens_cheap, details),
+        route,
+        TIER_ESCALATED,
+    )
@@ -0,0 +1,109 @@
+"""
+Static catalog of LLM providers and their models.
+
+Serves provider and model lists without importing the provider modules and
+their SDKs (google.genai, azure.identity, mistralai, ...).
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    """
+    Catalog entry of an LLM provider.
+
+    Attributes:
+        module: Module in package shared implementing the provider
+        class_name: Provider class in that module
+        models: Available models, first is the default
+        context_tokens: Context window of the models, input and response
+        output_tokens: Maximum tokens of a response
+        warm_up: Warm up the provider at worker start, e.g. load local models
+
+    """
+
+    module: str
+    class_name: str
+    models: tuple[str, ...]
+    context_tokens: int = 128_000
+    output_tokens: int = 16_384
+    warm_up: bool = False
+
+
+LLM_CATALOG = {
+    "Mock": ProviderSpec(
+        module="llm_provider",
+        class_name="MockProvider",
+        models=("random",),
+        context_tokens=1_000_000,
+        output_tokens=1_000_000,
+    ),
+    "Google": ProviderSpec(
+        module="llm_provider_gemini",
+        class_name="GeminiProvider",
+        models=(
+            "gemini-2.5-flash-lite",
+            "gemini-2.5-flash",
+            "gemini-2.5-pro",
+        ),
+        context_tokens=1_048_576,
+        output_tokens=65_536,
+    ),
+    "OpenAI": ProviderSpec(
+        module="llm_provider_openai",
+        class_name="OpenAIProvider",
+        models=(
+            "gpt-5-nano",
+            "gpt-5-mini",
+            "gpt-5",
+        ),
+        context_tokens=400_000,
+        output_tokens=128_000,
+    ),
+    "OpenAI_Azure": ProviderSpec(
+        module="llm_provider_azure",
+        class_name="AzureOpenAIProvider",
+        models=(
+            "gpt-5-nano",
+            "gpt-5-mini",
+            "gpt-5",
+        ),
+        context_tokens=400_000,
+        output_tokens=128_000,
+    ),
+    "Mistral": ProviderSpec(
+        module="llm_provider_mistral",
+        class_name="MistralProvider",
+        models=(
+            "mistral-medium-latest",
+            "mistral-large-latest",
+        ),
+        output_tokens=32_768,
+    ),
+    "Ollama": ProviderSpec(
+        module="llm_provider_ollama",
+        class_name="OllamaProvider",
+        models=(
+            "mistral",
+            "llama3.2:1b",
+            "llama3.2:3b",
+            "deepseek-r1:1.5b",
+            "deepseek-r1:8b",
+            "deepseek-r1:7b",
+        ),
+        # default num_ctx of the Ollama server
+        context_tokens=4_096,
+        output_tokens=4_096,
+        warm_up=True,
+    ),
+}
+
+
+def get_llm_models(provider_name: str) -> list[str]:
+    """Return the models of a provider, raise ValueError for unknown providers."""
+    spec = LLM_CATALOG.get(provider_name)
+    if spec is None:
+        msg = f"Unknown LLM provider: {provider_name}"
+        raise ValueError(msg)
+    return list(spec.models)
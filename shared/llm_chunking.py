@@ -0,0 +1,471 @@
+"""
+Chunked processing of long texts.
+
+Long texts are split at paragraph (else sentence or line) boundaries,
+the chunks are sent to the LLM concurrently with a bounded fan-out,
+and the results are stitched back together, keeping the original
+whitespace and line breaks between the chunks.
+
+Incremental processing remembers the results per paragraph of a document,
+so a re-submitted document only sends its new or modified paragraphs,
+consecutive ones together as a chunk. The memories of the documents are kept
+in SQLite file `document_memory.sqlite`, shared by the workers of the host.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+from .config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_SQLITE,
+    LLM_CHUNK_CONCURRENCY,
+    LLM_CHUNK_MAX_CHARS,
+    LLM_DOCUMENT_MEMORY_MAX,
+)
+from .llm_cache import acall_cached, cache_key, call_cached
+from .llm_provider import LLMProvider
+
+logger = logging.getLogger(Path(__file__).stem)
+
+DOCUMENT_MEMORY_DB_PATH = Path(__file__).parent.parent / "document_memory.sqlite"
+
+# separators are captured, so they are kept at the end of the parts
+_PARAGRAPH_SEPARATOR = re.compile(r"(\n[ \t]*\n\s*)")
+_SENTENCE_SEPARATOR = re.compile(r"((?<=[.!?])\s+|\n\s*)")
+
+
+def _split_keep_separators(text: str, pattern: re.Pattern[str]) -> list[str]:
+    """Split text at pattern, appending each separator to the part before it."""
+    parts = pattern.split(text)
+    return [
+        parts[i] + (parts[i + 1] if i + 1 < len(parts) else "")
+        for i in range(0, len(parts), 2)
+        if parts[i] or i + 1 < len(parts)
+    ]
+
+
+def split_text(text: str, max_chars: int) -> list[str]:
+    """
+    Split text into chunks of up to max_chars characters.
+
+    Splits at paragraph boundaries, paragraphs longer than max_chars at
+    sentence and line boundaries. A single longer sentence is not split.
+    The chunks concatenate to the original text.
+    """
+    units: list[str] = []
+    for paragraph in _split_keep_separators(text, _PARAGRAPH_SEPARATOR):
+        if len(paragraph) > max_chars:
+            units.extend(_split_keep_separators(paragraph, _SENTENCE_SEPARATOR))
+        else:
+            units.append(paragraph)
+
+    chunks: list[str] = []
+    current = ""
+    for unit in units:
+        if current and len(current) + len(unit) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def stitch(chunk: str, response: str) -> str:
+    """Surround the response with the leading and trailing whitespace of chunk."""
+    lead = chunk[: len(chunk) - len(chunk.lstrip())]
+    trail = chunk[len(chunk.rstrip()) :]
+    return lead + response.strip() + trail
+
+
+def _check_response(text: str) -> str:
+    if not text:
+        msg = "LLM returned empty response for chunk"
+        raise ValueError(msg)
+    return text
+
+
+def call_chunked(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool]:
+    """
+    Call the LLM for each chunk of a long prompt, in a thread pool.
+
+    Returns the stitched response text, the sum of tokens consumed
+    and whether all chunks were served from cache.
+    """
+    chunks = split_text(prompt, max_chars or LLM_CHUNK_MAX_CHARS)
+    if len(chunks) <= 1:
+        return call_cached(
+            llm_provider, model, instruction, prompt, use_cache=use_cache
+        )
+
+    def process(chunk: str) -> tuple[str, int, bool]:
+        if not chunk.strip():
+            return chunk, 0, True
+        text, tokens, cached = call_cached(
+            llm_provider, model, instruction, chunk.strip(), use_cache=use_cache
+        )
+        return stitch(chunk, _check_response(text)), tokens, cached
+
+    logger.info("Processing %d chunks of %d chars", len(chunks), len(prompt))
+    with ThreadPoolExecutor(
+        max_workers=concurrency or LLM_CHUNK_CONCURRENCY
+    ) as executor:
+        results = list(executor.map(process, chunks))
+    return (
+        "".join(r[0] for r in results),
+        sum(r[1] for r in results),
+        all(r[2] for r in results),
+    )
+
+
+async def acall_chunked(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool]:
+    """
+    Async variant of call_chunked(), chunks are awaited concurrently.
+
+    Each chunk is retried by the provider on its own. As finished chunks are
+    cached, a retry of a failed request does not redo them.
+    """
+    chunks = split_text(prompt, max_chars or LLM_CHUNK_MAX_CHARS)
+    if len(chunks) <= 1:
+        return await acall_cached(
+            llm_provider, model, instruction, prompt, use_cache=use_cache
+        )
+
+    semaphore = asyncio.Semaphore(concurrency or LLM_CHUNK_CONCURRENCY)
+
+    async def process(chunk: str) -> tuple[str, int, bool]:
+        if not chunk.strip():
+            return chunk, 0, True
+        async with semaphore:
+            text, tokens, cached = await acall_cached(
+                llm_provider, model, instruction, chunk.strip(), use_cache=use_cache
+            )
+        return stitch(chunk, _check_response(text)), tokens, cached
+
+    logger.info("Processing %d chunks of %d chars", len(chunks), len(prompt))
+    results = await asyncio.gather(*(process(chunk) for chunk in chunks))
+    return (
+        "".join(r[0] for r in results),
+        sum(r[1] for r in results),
+        all(r[2] for r in results),
+    )
+
+
+def split_paragraphs(text: str) -> list[str]:
+    """Split text into paragraphs, which concatenate to the original text."""
+    return _split_keep_separators(text, _PARAGRAPH_SEPARATOR)
+
+
+def split_sentences(text: str) -> list[str]:
+    """Split text into sentences and lines, which concatenate to the original text."""
+    return _split_keep_separators(text, _SENTENCE_SEPARATOR)
+
+
+def split_known(
+    segments: list[str], lookup: Callable[[str], str | None], max_chars: int
+) -> list[tuple[str, str | None]]:
+    """
+    Split the segments of a text into the known ones and chunks of the others.
+
+    Returns the parts, which concatenate to the original text, with the
+    result of known segments, None for chunks to send.
+    """
+    parts: list[tuple[str, str | None]] = []
+    run = ""
+    for segment in segments:
+        result = lookup(segment) if segment.strip() else None
+        if result is None:
+            run += segment
+            continue
+        if run:
+            parts.extend((chunk, None) for chunk in split_text(run, max_chars))
+            run = ""
+        parts.append((segment, result))
+    if run:
+        parts.extend((chunk, None) for chunk in split_text(run, max_chars))
+    return parts
+
+
+def aligned_paragraphs(text: str, response: str) -> list[tuple[str, str]]:
+    """Return the paragraphs of text with those of the response, [] if not aligned."""
+    paragraphs = [p for p in split_paragraphs(text.strip()) if p.strip()]
+    answers = [p for p in split_paragraphs(response.strip()) if p.strip()]
+    if len(paragraphs) != len(answers):
+        logger.debug("Response does not align to the paragraphs, not remembered")
+        return []
+    return [
+        (paragraph.strip(), answer.strip())
+        for paragraph, answer in zip(paragraphs, answers, strict=True)
+    ]
+
+
+def _incremental_parts(
+    key: Callable[[str], str], prompt: str, memory: dict[str, str], max_chars: int
+) -> list[tuple[str, str | None]]:
+    """Split the prompt into the paragraphs in memory and chunks of the others."""
+    return split_known(
+        split_paragraphs(prompt), lambda p: memory.get(key(p)), max_chars
+    )
+
+
+def _remember(
+    memory: dict[str, str],
+    key: Callable[[str], str],
+    parts: list[tuple[str, str | None]],
+    results: list[tuple[str, int, bool, str | None]],
+) -> tuple[str, int, bool, int]:
+    """
+    Replace the memory by the results of the current paragraphs.
+
+    Results are the stitched text, tokens, cached and the response of the
+    chunks sent. Returns stitched text, tokens consumed, whether no tokens
+    were consumed (memory or cache) and number of paragraphs reused.
+    """
+    current: dict[str, str] = {}
+    for (chunk, known), (*_, response) in zip(parts, results, strict=True):
+        if known is not None:
+            current[key(chunk)] = known
+        elif response is not None:
+            current.update(
+                (key(paragraph), answer)
+                for paragraph, answer in aligned_paragraphs(chunk, response)
+            )
+    memory.clear()
+    memory.update(current)
+    return (
+        "".join(r[0] for r in results),
+        sum(r[1] for r in results),
+        all(r[2] for r in results),
+        sum(known is not None for _, known in parts),
+    )
+
+
+def call_incremental(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    memory: dict[str, str],
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool, int]:
+    """
+    Call the LLM only for the paragraphs not found in memory of the document.
+
+    Runs of new or modified paragraphs are sent as chunks of up to max_chars.
+    memory maps the paragraph keys to the LLM results of the previous call
+    and is updated in place; paragraphs of a response that does not align
+    to the chunk are not remembered.
+    Returns response text, tokens consumed, whether no tokens were consumed
+    (memory or cache) and number of paragraphs reused.
+    """
+    key = partial(cache_key, llm_provider.provider, model, instruction)
+    parts = _incremental_parts(key, prompt, memory, max_chars or LLM_CHUNK_MAX_CHARS)
+
+    def process(chunk: str, known: str | None) -> tuple[str, int, bool, str | None]:
+        if known is not None:
+            return stitch(chunk, known), 0, True, None
+        if not chunk.strip():
+            return chunk, 0, True, None
+        text, tokens, cached = call_cached(
+            llm_provider, model, instruction, chunk.strip(), use_cache=use_cache
+        )
+        return stitch(chunk, _check_response(text)), tokens, cached, text
+
+    with ThreadPoolExecutor(
+        max_workers=concurrency or LLM_CHUNK_CONCURRENCY
+    ) as executor:
+        results = list(executor.map(lambda part: process(*part), parts))
+    return _remember(memory, key, parts, results)
+
+
+async def acall_incremental(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    memory: dict[str, str],
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool, int]:
+    """Async variant of call_incremental(), the chunks are awaited concurrently."""
+    key = partial(cache_key, llm_provider.provider, model, instruction)
+    parts = _incremental_parts(key, prompt, memory, max_chars or LLM_CHUNK_MAX_CHARS)
+    semaphore = asyncio.Semaphore(concurrency or LLM_CHUNK_CONCURRENCY)
+
+    async def process(
+        chunk: str, known: str | None
+    ) -> tuple[str, int, bool, str | None]:
+        if known is not None:
+            return stitch(chunk, known), 0, True, None
+        if not chunk.strip():
+            return chunk, 0, True, None
+        async with semaphore:
+            text, tokens, cached = await acall_cached(
+                llm_provider, model, instruction, chunk.strip(), use_cache=use_cache
+            )
+        return stitch(chunk, _check_response(text)), tokens, cached, text
+
+    results = await asyncio.gather(*(process(*part) for part in parts))
+    return _remember(memory, key, parts, list(results))
+
+
+class DocumentMemory:
+    """
+    LRU of the paragraph memories of the documents of the users.
+
+    With db_path in SQLite, shared by the workers of the host, so a
+    re-submission reaching another worker reuses the paragraphs; else per
+    worker. At most max_documents documents, the least recently submitted
+    ones are dropped.
+    """
+
+    def __init__(self, max_documents: int, db_path: Path | None = None) -> None:
+        """Init the memory, db_path=None keeps it in the worker."""
+        self.max_documents = max_documents
+        self.db_path = db_path
+        self._documents: OrderedDict[tuple[int, str], dict[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_initialized = False
+
+    @contextmanager
+    def _connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """Connect to the memory, create the table on first use."""
+        assert self.db_path is not None
+        con = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            if not self._db_initialized:
+                # WAL: readers of other workers are not blocked by a writer
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute("""
+                    CREATE TABLE IF NOT EXISTS document_memory (
+                        user_id INTEGER NOT NULL,
+                        document_id TEXT NOT NULL,
+                        memory TEXT NOT NULL,
+                        updated REAL NOT NULL,
+                        PRIMARY KEY (user_id, document_id)
+                    )
+                """)
+                con.execute(
+                    "CREATE INDEX IF NOT EXISTS document_memory_updated"
+                    " ON document_memory (updated)"
+                )
+                self._db_initialized = True
+            yield con
+            con.commit()
+        finally:
+            con.close()
+
+    def _sqlite_get(self, user_id: int, document_id: str) -> dict[str, str]:
+        try:
+            with self._connection() as con:
+                row = con.execute(
+                    "SELECT memory FROM document_memory"
+                    " WHERE user_id = ? AND document_id = ?",
+                    (user_id, document_id),
+                ).fetchone()
+        except sqlite3.Error:
+            logger.exception("Document memory read failed")
+            return {}
+        return json.loads(row[0]) if row else {}
+
+    def _sqlite_put(
+        self, user_id: int, document_id: str, memory: dict[str, str]
+    ) -> None:
+        try:
+            with self._connection() as con:
+                con.execute(
+                    "INSERT INTO document_memory"
+                    " (user_id, document_id, memory, updated) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (user_id, document_id) DO UPDATE"
+                    " SET memory = excluded.memory, updated = excluded.updated",
+                    (user_id, document_id, json.dumps(memory), time.time()),
+                )
+                con.execute(
+                    "DELETE FROM document_memory WHERE rowid IN ("
+                    " SELECT rowid FROM document_memory"
+                    " ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                    (self.max_documents,),
+                )
+        except sqlite3.Error:
+            logger.exception("Document memory write failed")
+
+    def get(self, user_id: int, document_id: str) -> dict[str, str]:
+        """Return a copy of the paragraph memory of the document, {} if new."""
+        if self.db_path is not None:
+            return self._sqlite_get(user_id, document_id)
+        key = (user_id, document_id)
+        with self._lock:
+            if key not in self._documents:
+                return {}
+            self._documents.move_to_end(key)
+            return dict(self._documents[key])
+
+    def put(self, user_id: int, document_id: str, memory: dict[str, str]) -> None:
+        """Replace the paragraph memory of the document, evict the least recent ones."""
+        # replaced as a whole: concurrent submissions of the document do not
+        # interleave, the last one wins
+        if self.db_path is not None:
+            self._sqlite_put(user_id, document_id, memory)
+            return
+        key = (user_id, document_id)
+        with self._lock:
+            self._documents[key] = dict(memory)
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+    async def aget(self, user_id: int, document_id: str) -> dict[str, str]:
+        """Async variant of get(), SQLite is queried in a thread."""
+        if self.db_path is None:
+            return self.get(user_id, document_id)
+        return await asyncio.to_thread(self._sqlite_get, user_id, document_id)
+
+    async def aput(
+        self, user_id: int, document_id: str, memory: dict[str, str]
+    ) -> None:
+        """Async variant of put(), SQLite is written in a thread."""
+        if self.db_path is None:
+            self.put(user_id, document_id, memory)
+            return
+        await asyncio.to_thread(self._sqlite_put, user_id, document_id, memory)
+
+
+# shared by the workers with the SQLite tier of the LLM response cache
+DOCUMENT_MEMORY = DocumentMemory(
+    max_documents=LLM_DOCUMENT_MEMORY_MAX,
+    db_path=DOCUMENT_MEMORY_DB_PATH if LLM_CACHE_ENABLED and LLM_CACHE_SQLITE else None,
+)
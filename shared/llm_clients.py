@@ -0,0 +1,165 @@
+"""
+Process-wide registry of pooled LLM SDK clients.
+
+Each provider client is built once per worker and then reused, so the httpx
+connection pool (TLS session, DNS lookup, keep-alive connections) survives
+from one request to the next.
+Async clients are bound to the event loop they were created in, so they are
+registered per loop.
+"""
+
+import asyncio
+import atexit
+import inspect
+import logging
+import threading
+import weakref
+from collections.abc import Callable
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any, TypeVar
+
+import httpx
+
+from .config import (
+    LLM_HTTP2,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+)
+
+logger = logging.getLogger(Path(__file__).stem)
+
+T = TypeVar("T")
+
+# connect timeout and overall read timeout for LLM calls (gunicorn timeout is 120s)
+HTTP_TIMEOUT_SECONDS = 120.0
+HTTP_TIMEOUT = httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=10.0)
+
+# reentrant, as a factory may fetch a pooled httpx client from the registry
+_lock = threading.RLock()
+_clients: dict[str, Any] = {}
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, Any]] = (
+    weakref.WeakKeyDictionary()
+)
+_stats = {"hits": 0, "misses": 0}
+
+
+def _http2_enabled() -> bool:
+    """Return True if HTTP/2 is requested and the h2 package is installed."""
+    if not LLM_HTTP2:
+        return False
+    if find_spec("h2") is None:
+        logger.warning("LLM_HTTP2=1, but package h2 is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def http_client_kwargs() -> dict[str, Any]:
+    """Return the httpx pool settings shared by all SDK clients."""
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "http2": _http2_enabled(),
+        "timeout": HTTP_TIMEOUT,
+    }
+
+
+def new_http_client() -> httpx.Client:
+    """Create a httpx client with the shared pool settings."""
+    return httpx.Client(**http_client_kwargs())
+
+
+def new_async_http_client() -> httpx.AsyncClient:
+    """Create an async httpx client with the shared pool settings."""
+    return httpx.AsyncClient(**http_client_kwargs())
+
+
+def get_client(key: str, factory: Callable[[], T]) -> T:
+    """Return the client registered for key, creating it on first use."""
+    with _lock:
+        if key in _clients:
+            _stats["hits"] += 1
+            return _clients[key]
+        _stats["misses"] += 1
+        logger.info("Creating pooled client: %s", key)
+        client = factory()
+        _clients[key] = client
+        return client
+
+
+def get_async_client(key: str, factory: Callable[[], T]) -> T:
+    """Return the async client registered for key in the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if key in clients:
+            _stats["hits"] += 1
+            return clients[key]
+        _stats["misses"] += 1
+        logger.info("Creating pooled async client: %s", key)
+        client = factory()
+        clients[key] = client
+        return client
+
+
+def _close_client(key: str, client: Any) -> None:  # noqa: ANN401
+    """Close a sync client via close() or its context manager protocol."""
+    try:
+        if hasattr(client, "close"):
+            client.close()
+        elif hasattr(client, "__exit__"):
+            client.__exit__(None, None, None)
+    except Exception:
+        logger.exception("Failed to close client %s", key)
+
+
+async def _aclose_client(key: str, client: Any) -> None:  # noqa: ANN401
+    """Close an async client via aclose(), close() or __aexit__()."""
+    try:
+        if hasattr(client, "aclose"):
+            await client.aclose()
+        elif hasattr(client, "close"):
+            result = client.close()
+            if inspect.isawaitable(result):
+                await result
+        elif hasattr(client, "__aexit__"):
+            await client.__aexit__(None, None, None)
+    except Exception:
+        logger.exception("Failed to close async client %s", key)
+
+
+def close_clients() -> None:
+    """Close and forget all sync clients (at process exit)."""
+    with _lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for key, client in clients:
+        _close_client(key, client)
+
+
+async def aclose_clients() -> None:
+    """Close and forget all clients, including those of the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        async_clients = list(_async_clients.pop(loop, {}).items())
+    for key, client in async_clients:
+        await _aclose_client(key, client)
+    close_clients()
+
+
+def get_client_stats() -> dict[str, int]:
+    """Return registry hit/miss counters and number of open clients."""
+    with _lock:
+        return {
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "clients": len(_clients),
+            "async_clients": sum(len(c) for c in _async_clients.values()),
+        }
+
+
+atexit.register(close_clients)
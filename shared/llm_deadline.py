@@ -0,0 +1,93 @@
+"""
+Deadline of a request, propagated from the HTTP request to the SDK calls.
+
+The deadline is set per request (default of the mode, or requested by the
+client) and kept in a ContextVar, so it reaches the provider calls of all
+tasks the request starts: chunks, hedged and fallback routes.
+
+- each SDK call gets the remaining time as its timeout
+- a retry is only started if it can still finish before the deadline
+- the request is cancelled at the deadline with DeadlineExceededError
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TypeVar
+
+from .config import LLM_DEADLINE_MAX
+from .llm_clients import HTTP_TIMEOUT_SECONDS
+
+T = TypeVar("T")
+
+# an attempt with less time left is not started
+MIN_ATTEMPT_SECONDS = 1.0
+
+# time.monotonic() of the deadline of the current request, None if it has none
+_deadline: ContextVar[float | None] = ContextVar("llm_deadline", default=None)
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised if the deadline of the request passed or would before an answer."""
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Generator[float, None, None]:
+    """
+    Set the deadline of the request to seconds from now, at most LLM_DEADLINE_MAX.
+
+    An earlier deadline already set, e.g. of the batch, is kept.
+    Yields the seconds until the deadline.
+    """
+    deadline = time.monotonic() + min(seconds, LLM_DEADLINE_MAX)
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    _deadline.set(deadline)
+    try:
+        yield deadline - time.monotonic()
+    finally:
+        # not reset(token): a stream may be closed from another context
+        _deadline.set(outer)
+
+
+def remaining() -> float:
+    """Return the seconds until the deadline, inf without a deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return float("inf")
+    return deadline - time.monotonic()
+
+
+def check_deadline(needed: float = MIN_ATTEMPT_SECONDS) -> None:
+    """Raise DeadlineExceededError if less than needed seconds are left."""
+    if remaining() < needed:
+        msg = "Request deadline exceeded"
+        raise DeadlineExceededError(msg)
+
+
+def attempt_timeout() -> float:
+    """Return the timeout of the next SDK call: the remaining time, capped."""
+    check_deadline()
+    return min(remaining(), HTTP_TIMEOUT_SECONDS)
+
+
+async def await_with_deadline(awaitable: Awaitable[T]) -> T:
+    """
+    Await the awaitable, cancel it at the deadline.
+
+    Backstop for calls not observing their timeout, e.g. waits for a
+    semaphore or SDKs without a request timeout.
+    """
+    left = remaining()
+    timeout = asyncio.timeout(None if left == float("inf") else max(left, 0))
+    try:
+        async with timeout:
+            return await awaitable
+    except TimeoutError as e:
+        if not timeout.expired():
+            raise
+        msg = "Request deadline exceeded"
+        raise DeadlineExceededError(msg) from e
@@ -0,0 +1,206 @@
+"""
+Map-reduce processing of long texts, e.g. summaries of long meeting notes.
+
+Instead of a single call with the whole text, which is slow and whose
+response may be cut off by the model, the text is split into sections:
+
+- map: each section is processed concurrently by the fast model of the
+  provider (its first model), with the map instruction of the mode
+- reduce: a single call of the requested model turns the section results
+  into the final response, with the instruction of the mode
+
+Texts shorter than LLM_MAP_REDUCE_MIN_CHARS are processed in a single call.
+The tokens are accounted per stage.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .config import (
+    LLM_CHUNK_CONCURRENCY,
+    LLM_MAP_REDUCE_MIN_CHARS,
+    LLM_MAP_REDUCE_SECTION_CHARS,
+)
+from .llm_cache import acall_cached, call_cached
+from .llm_chunking import split_text
+from .llm_provider import LLMProvider
+
+logger = logging.getLogger(Path(__file__).stem)
+
+
+class MapReduceStats:
+    """Counters of the map-reduce calls of this worker."""
+
+    def __init__(self) -> None:
+        """Init the counters."""
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "single_calls": 0,
+            "sections": 0,
+            "map_tokens": 0,
+            "reduce_tokens": 0,
+        }
+
+    def record(self, sections: int, stage_tokens: dict[str, int]) -> None:
+        """Record a call of sections, 1 for a single call."""
+        with self._lock:
+            if sections <= 1:
+                self._stats["single_calls"] += 1
+                return
+            self._stats["calls"] += 1
+            self._stats["sections"] += sections
+            self._stats["map_tokens"] += stage_tokens["map"]
+            self._stats["reduce_tokens"] += stage_tokens["reduce"]
+
+    def get_stats(self) -> dict[str, int]:
+        """Return the counters."""
+        with self._lock:
+            return dict(self._stats)
+
+
+MAP_REDUCE_STATS = MapReduceStats()
+
+
+def split_sections(prompt: str, max_chars: int | None = None) -> list[str]:
+    """
+    Return the sections of the text, a single one below the min. length.
+
+    max_chars is set for texts exceeding the model, they are always split.
+    """
+    if len(prompt) < LLM_MAP_REDUCE_MIN_CHARS and not max_chars:
+        return [prompt]
+    max_chars = min(
+        max_chars or LLM_MAP_REDUCE_SECTION_CHARS, LLM_MAP_REDUCE_SECTION_CHARS
+    )
+    return [section for section in split_text(prompt, max_chars) if section.strip()]
+
+
+def reduce_prompt(results: list[str]) -> str:
+    """Return the prompt of the reduce call: the section results in order."""
+    return "\n\n".join(
+        f"Abschnitt {i}/{len(results)}:\n{result.strip()}"
+        for i, result in enumerate(results, start=1)
+    )
+
+
+def _check_response(text: str) -> str:
+    if not text:
+        msg = "LLM returned empty response for section"
+        raise ValueError(msg)
+    return text
+
+
+def call_map_reduce(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    map_instruction: str,
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool, dict[str, int]]:
+    """
+    Call the LLM map-reduce for long prompts, the map calls in a thread pool.
+
+    Returns the response text, the sum of tokens consumed, whether all calls
+    were served from cache, and the tokens per stage (map, reduce).
+    """
+    sections = split_sections(prompt, max_chars)
+    if len(sections) <= 1:
+        text, tokens, cached = call_cached(
+            llm_provider, model, instruction, prompt, use_cache=use_cache
+        )
+        MAP_REDUCE_STATS.record(1, {})
+        return text, tokens, cached, {}
+
+    map_model = llm_provider.get_models()[0]
+
+    def process(section: str) -> tuple[str, int, bool]:
+        text, tokens, cached = call_cached(
+            llm_provider,
+            map_model,
+            map_instruction,
+            section.strip(),
+            use_cache=use_cache,
+        )
+        return _check_response(text), tokens, cached
+
+    logger.info("Map-reduce of %d sections of %d chars", len(sections), len(prompt))
+    with ThreadPoolExecutor(
+        max_workers=concurrency or LLM_CHUNK_CONCURRENCY
+    ) as executor:
+        results = list(executor.map(process, sections))
+    text, tokens, cached = call_cached(
+        llm_provider,
+        model,
+        instruction,
+        reduce_prompt([r[0] for r in results]),
+        use_cache=use_cache,
+    )
+    stage_tokens = {"map": sum(r[1] for r in results), "reduce": tokens}
+    MAP_REDUCE_STATS.record(len(sections), stage_tokens)
+    return (
+        text,
+        sum(stage_tokens.values()),
+        cached and all(r[2] for r in results),
+        stage_tokens,
+    )
+
+
+async def acall_map_reduce(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    map_instruction: str,
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool, dict[str, int]]:
+    """Async variant of call_map_reduce(), the map calls are awaited concurrently."""
+    sections = split_sections(prompt, max_chars)
+    if len(sections) <= 1:
+        text, tokens, cached = await acall_cached(
+            llm_provider, model, instruction, prompt, use_cache=use_cache
+        )
+        MAP_REDUCE_STATS.record(1, {})
+        return text, tokens, cached, {}
+
+    map_model = llm_provider.get_models()[0]
+    semaphore = asyncio.Semaphore(concurrency or LLM_CHUNK_CONCURRENCY)
+
+    async def process(section: str) -> tuple[str, int, bool]:
+        async with semaphore:
+            text, tokens, cached = await acall_cached(
+                llm_provider,
+                map_model,
+                map_instruction,
+                section.strip(),
+                use_cache=use_cache,
+            )
+        return _check_response(text), tokens, cached
+
+    logger.info("Map-reduce of %d sections of %d chars", len(sections), len(prompt))
+    results = await asyncio.gather(*(process(section) for section in sections))
+    text, tokens, cached = await acall_cached(
+        llm_provider,
+        model,
+        instruction,
+        reduce_prompt([r[0] for r in results]),
+        use_cache=use_cache,
+    )
+    stage_tokens = {"map": sum(r[1] for r in results), "reduce": tokens}
+    MAP_REDUCE_STATS.record(len(sections), stage_tokens)
+    return (
+        text,
+        sum(stage_tokens.values()),
+        cached and all(r[2] for r in results),
+        stage_tokens,
+    )
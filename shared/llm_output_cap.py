@@ -0,0 +1,136 @@
+"""
+Output caps of the LLM calls, computed from the size of the input.
+
+A misbehaving model can generate far more than the input warrants, which
+inflates latency and cost. The output guard of a request holds the
+output_ratio of its mode, kept in a ContextVar like the deadline, so it
+reaches the provider calls of all tasks the request starts:
+
+- each SDK call gets max. tokens: estimated prompt tokens x output_ratio
+  x LLM_OUTPUT_CAP_FACTOR + LLM_OUTPUT_CAP_MIN_TOKENS, at most the output
+  limit of the model (the min. tokens leave room for short texts)
+- reasoning models count their hidden reasoning tokens against max. tokens,
+  their calls get LLM_OUTPUT_CAP_REASONING_TOKENS on top, so the reasoning
+  does not starve the visible answer
+- responses cut off at the cap are reported as truncated, and not cached
+- streams are aborted with OutputLimitError once their text exceeds the cap,
+  also for providers ignoring it
+"""
+
+import logging
+import math
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+
+from .config import (
+    LLM_OUTPUT_CAP_FACTOR,
+    LLM_OUTPUT_CAP_MIN_TOKENS,
+    LLM_OUTPUT_CAP_REASONING_TOKENS,
+)
+from .llm_tokens import TOKEN_ESTIMATOR
+
+logger = logging.getLogger(Path(__file__).stem)
+
+_stats = {"capped_calls": 0, "truncated": 0, "aborted": 0}
+_stats_lock = threading.Lock()
+
+
+class OutputLimitError(ValueError):
+    """Raised if a streamed response exceeds the output cap of its call."""
+
+
+@dataclass
+class OutputGuard:
+    """Output ratio of the mode of a request, and its truncated calls."""
+
+    output_ratio: float
+    truncated: int = 0
+
+
+_guard: ContextVar[OutputGuard | None] = ContextVar("llm_output_guard", default=None)
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_output_cap_stats() -> dict[str, int]:
+    """Return the number of capped calls, truncated and aborted responses."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+@contextmanager
+def output_guard(output_ratio: float) -> Generator[OutputGuard, None, None]:
+    """Cap the output of the LLM calls of the request by the output_ratio."""
+    guard = OutputGuard(output_ratio)
+    outer = _guard.get()
+    _guard.set(guard)
+    try:
+        yield guard
+    finally:
+        # not reset(token): a stream may be closed from another context
+        _guard.set(outer)
+
+
+def output_cap(provider: str, prompt: str) -> int | None:
+    """
+    Return the expected max. tokens of the response to the prompt.
+
+    provider is the name of the LLMProvider, for the token estimate.
+    None without output guard (no cap) or if LLM_OUTPUT_CAP_FACTOR is 0.
+    """
+    guard = _guard.get()
+    if guard is None or LLM_OUTPUT_CAP_FACTOR <= 0:
+        return None
+    tokens = TOKEN_ESTIMATOR.estimate(provider, prompt)
+    return (
+        math.ceil(tokens * guard.output_ratio * LLM_OUTPUT_CAP_FACTOR)
+        + LLM_OUTPUT_CAP_MIN_TOKENS
+    )
+
+
+def max_output_tokens(
+    provider: str, prompt: str, limit: int, *, reasoning: bool = False
+) -> int | None:
+    """
+    Return the max. tokens parameter of an SDK call, at most limit of the model.
+
+    reasoning: the parameter includes the reasoning tokens of the model, add
+    LLM_OUTPUT_CAP_REASONING_TOKENS to the cap of the visible answer.
+    """
+    cap = output_cap(provider, prompt)
+    if cap is None:
+        return None
+    _count("capped_calls")
+    if reasoning:
+        cap += LLM_OUTPUT_CAP_REASONING_TOKENS
+    return min(cap, limit)
+
+
+def record_truncation(provider: str, model: str) -> None:
+    """Record a response cut off at the output cap."""
+    logger.warning("Response of %s/%s truncated at the output cap", provider, model)
+    _count("truncated")
+    if guard := _guard.get():
+        guard.truncated += 1
+
+
+def truncations() -> int:
+    """Return the number of truncated responses of the request so far."""
+    guard = _guard.get()
+    return guard.truncated if guard else 0
+
+
+def check_stream_output(provider: str, cap: int | None, pieces: int) -> None:
+    """Raise OutputLimitError if the word pieces streamed so far exceed the cap."""
+    if cap is None or pieces * TOKEN_ESTIMATOR.factor(provider) <= cap:
+        return
+    _count("aborted")
+    msg = f"Response exceeds the expected length of {cap} tokens"
+    raise OutputLimitError(msg)
@@ -0,0 +1,117 @@
+"""
+Provider-side caching of the instructions of the modes.
+
+The instruction of a mode is the same for all its requests, only the text
+differs. Providers cache such prompt prefixes automatically, if the prefix is
+byte-identical and long enough (OpenAI, Azure: 1024 tokens; Gemini implicit
+caching). Explicit Gemini context caches are not used: the mode instructions
+are far below their minimum size.
+
+The chat messages are built with the unchanged instruction first, so the
+prefix is stable. The prompt and cached tokens the providers report are
+recorded per provider and model, to verify the cache hits; the OpenAI and
+Azure providers share the parsing of their chat completions.
+"""
+
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .llm_output_cap import record_truncation
+from .llm_tokens import record_reasoning_tokens
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion import ChatCompletion
+    from openai.types.completion_usage import CompletionUsage
+
+logger = logging.getLogger(Path(__file__).stem)
+
+
+def instruction_key(instruction: str) -> str:
+    """Return a short stable key of the instruction, e.g. for OpenAI routing."""
+    return hashlib.sha256(instruction.encode()).hexdigest()[:16]
+
+
+def chat_messages(instruction: str, prompt: str) -> list[dict[str, str]]:
+    """Return the chat messages, instruction first as the cacheable prefix."""
+    return [
+        {"role": "system", "content": instruction},
+        {"role": "user", "content": prompt},
+    ]
+
+
+class PromptCacheStats:
+    """Prompt tokens and cached prompt tokens per provider and model."""
+
+    def __init__(self) -> None:
+        """Init the counters."""
+        self._stats: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, provider: str, model: str, prompt_tokens: int, cached_tokens: int
+    ) -> None:
+        """Record the usage of a call, as reported by the provider."""
+        if prompt_tokens <= 0:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(
+                f"{provider}/{model}",
+                {"calls": 0, "calls_cached": 0, "prompt_tokens": 0, "cached_tokens": 0},
+            )
+            stats["calls"] += 1
+            stats["calls_cached"] += cached_tokens > 0
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """Return the counters and the cached share of prompt tokens."""
+        with self._lock:
+            return {
+                key: {
+                    **stats,
+                    "cached_ratio": round(
+                        stats["cached_tokens"] / stats["prompt_tokens"], 3
+                    ),
+                }
+                for key, stats in self._stats.items()
+            }
+
+
+PROMPT_CACHE_STATS = PromptCacheStats()
+
+
+def record_chat_usage(
+    provider: str, model: str, usage: "CompletionUsage | None"
+) -> None:
+    """
+    Record the prompt tokens, those served from the prompt cache and reasoning.
+
+    usage of an OpenAI chat completion, also of Azure OpenAI.
+    """
+    if usage is None:
+        return
+    details = usage.prompt_tokens_details
+    cached_tokens = (details.cached_tokens or 0) if details else 0
+    PROMPT_CACHE_STATS.record(provider, model, usage.prompt_tokens, cached_tokens)
+    # reasoning models: not part of the response text
+    details = usage.completion_tokens_details
+    record_reasoning_tokens(details.reasoning_tokens if details else 0)
+
+
+def parse_chat_completion(
+    provider: str, response: "ChatCompletion", model: str
+) -> tuple[str, int]:
+    """Extract response text and token consumption of an OpenAI chat completion."""
+    s = response.choices[0].message.content or ""
+    if response.choices[0].finish_reason == "length":
+        record_truncation(provider, model)
+    record_chat_usage(provider, model, response.usage)
+    tokens = (
+        response.usage.total_tokens
+        if hasattr(response, "usage") and response.usage
+        else 0
+    )
+    return s, tokens
@@ -1,62 +1,115 @@
 """Classes for different LLM providers."""
 
+import asyncio
+import importlib
 import logging
-import time
-from collections.abc import Callable
+import threading
+from collections.abc import AsyncIterator, Awaitable, Callable
+from concurrent.futures import Future
 from pathlib import Path
-from typing import TypeVar
+from typing import Any, TypeVar
+
+from .llm_catalog import LLM_CATALOG, get_llm_models
 
 logger = logging.getLogger(Path(__file__).stem)
 
 T = TypeVar("T")
 
 
-def retry_with_exponential_backoff(
-    func: Callable[..., T],
-    max_retries: int = 3,
-    initial_wait: int = 1,
-    provider_name: str = "API",
-) -> Callable[..., T]:
+class SingleFlight:
     """
-    Retry decorator for function with exponential backoff.
+    Coalesce concurrent identical calls into one.
 
-    Args:
-        func: Function to retry
-        max_retries: Maximum number of retry attempts
-        initial_wait: Initial wait time in seconds (will be multiplied by 2^attempt)
-        provider_name: Name of the provider for logging
+    While a call for a key is in flight, further callers with the same key
+    wait for it and share its result (or exception) instead of calling again.
+    Works across threads (do) and across asyncio tasks of an event loop (ado).
+    """
 
-    Returns:
-        Wrapped function with retry logic
+    def __init__(self) -> None:
+        """Init the registry of in-flight calls."""
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future[Any]] = {}
+        self._async_calls: dict[str, asyncio.Future[Any]] = {}
+        self._async_waiters: dict[asyncio.Future[Any], int] = {}
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key: str, func: Callable[[], T]) -> tuple[T, bool]:
+        """
+        Call func once per key for concurrent callers (threads).
 
-    """
+        Returns the result and whether this caller made the call itself.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = Future()
+                self._calls[key] = future
+                self._stats["calls"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            return future.result(), False
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key: str, func: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        Await func once per key for concurrent callers (asyncio tasks).
 
-    def wrapper(*args, **kwargs) -> T:  # noqa: ANN002, ANN003  # NOSONAR(S6796)
-        for attempt in range(max_retries):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = initial_wait * 2**attempt
-                    logger.warning(
-                        "%s error, retrying in %d seconds (attempt %d/%d): %s",
-                        provider_name,
-                        wait_time,
-                        attempt + 1,
-                        max_retries,
-                        str(e),
-                    )
-                    time.sleep(wait_time)
-                else:
-                    logger.exception(
-                        "%s failed after %d attempts", provider_name, max_retries
-                    )
-                    raise
-        # This should never be reached, but satisfies type checker
-        msg = f"{provider_name} retry logic failed unexpectedly"
-        raise RuntimeError(msg)
-
-    return wrapper
+        Returns the result and whether this caller made the call itself.
+        The shared call is shielded, so a cancelled caller (e.g. disconnected
+        client) does not cancel it for the others. It is cancelled when
+        the last waiting caller is.
+        """
+        with self._lock:
+            task = self._async_calls.get(key)
+            leader = task is None
+            if task is None:
+                task = asyncio.ensure_future(func())
+                self._async_calls[key] = task
+                self._async_waiters[task] = 0
+                task.add_done_callback(lambda _: self._forget(key))
+                self._stats["calls"] += 1
+            else:
+                self._stats["coalesced"] += 1
+            self._async_waiters[task] += 1
+        try:
+            return await asyncio.shield(task), leader
+        except asyncio.CancelledError:
+            with self._lock:
+                if task in self._async_waiters:
+                    self._async_waiters[task] -= 1
+                    if self._async_waiters[task] == 0:
+                        task.cancel()
+            raise
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            task = self._async_calls.pop(key, None)
+            self._async_waiters.pop(task, None)  # type: ignore[arg-type]
+
+    def get_stats(self) -> dict[str, int]:
+        """Return number of upstream calls, coalesced calls and calls in flight."""
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
+
+
+LLM_SINGLE_FLIGHT = SingleFlight()
 
 
 class LLMProvider:
@@ -80,6 +133,10 @@ class LLMProvider:
         """Return list of available models."""
         return self.models
 
+    def get_stats(self) -> dict[str, float]:
+        """Return provider specific statistics for monitoring."""
+        return {}
+
     def call(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
         """
         Call the LLM model with instruction and prompt.
@@ -88,13 +145,38 @@ class LLMProvider:
         """
         raise NotImplementedError
 
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        """
+        Async variant of call(), to be awaited from the FastAPI event loop.
+
+        Providers with an async SDK client override this.
+        The fallback runs the blocking call() in a worker thread.
+        """
+        return await asyncio.to_thread(self.call, model, instruction, prompt)
+
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        """
+        Stream the LLM response.
+
+        Yields tuples of text delta and tokens consumed.
+        The tokens are 0 until the provider reports the usage, typically at the end.
+        Providers with a streaming API override this.
+        The fallback yields the complete response of acall() at once.
+        """
+        yield await self.acall(model=model, instruction=instruction, prompt=prompt)
+
+    async def awarm_up(self) -> None:
+        """Prepare the provider at worker start, e.g. load local models."""
+
 
 class MockProvider(LLMProvider):
     """Mocking LLM provider for local dev and tests."""
 
     def __init__(self) -> None:
         """Initialize Mock provider with instruction and model."""
-        super().__init__(provider="Mocked", models=["random"])
+        super().__init__(provider="Mocked", models=get_llm_models("Mock"))
         self.check_model_valid("random")
 
     def call(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:  # noqa: ARG002
@@ -103,42 +185,66 @@ class MockProvider(LLMProvider):
         response = f"Mocked {prompt} response"
         return response, tokens
 
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        """Call the LLM (async)."""
+        return self.call(model=model, instruction=instruction, prompt=prompt)
 
-def get_llm_provider(provider_name: str) -> LLMProvider:
-    """Get LLM provider."""
-    logger.debug("Getting LLM provider: %s", provider_name)
-
-    if provider_name == "Google":
-        from .llm_provider_gemini import GeminiProvider  # noqa: PLC0415
-
-        return GeminiProvider()
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        """Stream the LLM response word by word."""
+        response, tokens = self.call(
+            model=model, instruction=instruction, prompt=prompt
+        )
+        for word in response.split(" ")[:-1]:
+            yield f"{word} ", 0
+        yield response.split(" ")[-1], tokens
 
-    if provider_name == "Mock":
-        return MockProvider()
 
-    if provider_name == "OpenAI_Azure":
-        from .llm_provider_azure import AzureOpenAIProvider  # noqa: PLC0415
+_providers: dict[str, LLMProvider] = {}
+_providers_lock = threading.Lock()
 
-        return AzureOpenAIProvider()
 
-    if provider_name == "OpenAI":
-        from .llm_provider_openai import OpenAIProvider  # noqa: PLC0415
+def get_llm_provider(provider_name: str) -> LLMProvider:
+    """
+    Get LLM provider.
 
-        return OpenAIProvider()
+    The provider module is imported and the provider is created on first use,
+    then the instance is reused for the lifetime of the worker.
+    """
+    with _providers_lock:
+        if provider_name in _providers:
+            return _providers[provider_name]
+
+        logger.debug("Creating LLM provider: %s", provider_name)
+        spec = LLM_CATALOG.get(provider_name)
+        if spec is None:
+            msg = f"Unknown LLM provider: {provider_name}"
+            logger.error("Unknown LLM provider")
+            raise ValueError(msg)
 
-    if provider_name == "Ollama":
-        from .llm_provider_ollama import OllamaProvider  # noqa: PLC0415
+        module = importlib.import_module(f".{spec.module}", package=__package__)
+        provider: LLMProvider = getattr(module, spec.class_name)()
+        _providers[provider_name] = provider
+        return provider
 
-        return OllamaProvider()
 
-    if provider_name == "Mistral":
-        from .llm_provider_mistral import MistralProvider  # noqa: PLC0415
+def get_llm_provider_instances() -> dict[str, LLMProvider]:
+    """Return the providers created so far in this worker."""
+    with _providers_lock:
+        return dict(_providers)
 
-        return MistralProvider()
 
-    msg = f"Unknown LLM provider: {provider_name}"
-    logger.error("Unknown LLM provider")
-    raise ValueError(msg)
+async def awarm_up_providers(provider_names: list[str]) -> None:
+    """Warm up the providers of the catalog requiring it, failures are logged."""
+    for provider_name in provider_names:
+        spec = LLM_CATALOG.get(provider_name)
+        if spec is None or not spec.warm_up:
+            continue
+        try:
+            await get_llm_provider(provider_name).awarm_up()
+        except Exception:
+            logger.exception("Warm-up of LLM provider %s failed", provider_name)
 
 
 if __name__ == "__main__":
@@ -1,35 +1,186 @@
 """Azure LLM provider class."""
 
+import asyncio
 import logging
+import threading
+import time
+from collections.abc import AsyncIterator
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from azure.identity import (
-    DefaultAzureCredential,
-    get_bearer_token_provider,
-)
-from openai import AzureOpenAI
+from azure.identity import DefaultAzureCredential
+from openai import APIConnectionError, AsyncAzureOpenAI, AsyncStream, AzureOpenAI
 from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 
 from .helper import my_get_env
-from .llm_provider import LLMProvider, retry_with_exponential_backoff
+from .llm_catalog import LLM_CATALOG, get_llm_models
+from .llm_clients import (
+    get_async_client,
+    get_client,
+    new_async_http_client,
+    new_http_client,
+)
+from .llm_deadline import attempt_timeout
+from .llm_output_cap import max_output_tokens, record_truncation
+from .llm_prompt_cache import chat_messages, parse_chat_completion, record_chat_usage
+from .llm_provider import LLMProvider
+from .llm_resilience import async_retry_with_backoff, retry_with_backoff
+
+if TYPE_CHECKING:
+    from azure.core.credentials import AccessToken
 
 logger = logging.getLogger(Path(__file__).stem)
 
 PROVIDER = "AzureOpenAI"
-MODELS = [
-    "gpt-5-nano",
-    "gpt-5-mini",
-    "gpt-5",
-]
+# transient SDK errors without HTTP status
+RETRYABLE_ERRORS = (APIConnectionError,)
+MODELS = get_llm_models("OpenAI_Azure")
+OUTPUT_TOKENS = LLM_CATALOG["OpenAI_Azure"].output_tokens
+AZURE_AD_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+# refresh the token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+# tokens closer to expiry than this are not handed out anymore
+TOKEN_MIN_VALIDITY = 30
+# wait time before retrying a failed background refresh
+TOKEN_RETRY_WAIT = 30
+
+
+class AzureTokenCache:
+    """
+    In-memory cache of the Azure AD access token, one credential per worker.
+
+    After the first fetch, a daemon thread refreshes the token before it
+    expires, so requests read the cached token and do not wait for AAD.
+    """
+
+    def __init__(self, scope: str) -> None:
+        """Init the cache, the credential is created on first use."""
+        self.scope = scope
+        self._credential: DefaultAzureCredential | None = None
+        self._token: AccessToken | None = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: threading.Thread | None = None
+        self._stats = {"fetches": 0, "fetch_errors": 0, "last_fetch_ms": 0.0}
+
+    def is_valid(self) -> bool:
+        """Return True if the cached token can still be handed out."""
+        token = self._token
+        return token is not None and token.expires_on - time.time() > (
+            TOKEN_MIN_VALIDITY
+        )
+
+    def get_token(self) -> str:
+        """Return the cached token, fetching it synchronously only if needed."""
+        if not self.is_valid():
+            with self._lock:
+                if not self.is_valid():
+                    self._fetch()
+            self._start_refresher()
+        assert self._token is not None
+        return self._token.token
+
+    def _fetch(self) -> None:
+        """Fetch a new token from AAD, measure the latency."""
+        if self._credential is None:
+            self._credential = DefaultAzureCredential()
+        start = time.perf_counter()
+        try:
+            token = self._credential.get_token(self.scope)
+        except Exception:
+            self._stats["fetch_errors"] += 1
+            raise
+        self._stats["fetches"] += 1
+        self._stats["last_fetch_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._token = token
+        self._fetched_at = time.time()
+        logger.info("Fetched Azure AD token in %.0f ms", self._stats["last_fetch_ms"])
+
+    def _start_refresher(self) -> None:
+        """Start the background refresh thread once."""
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="azure-token-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        """Refresh the token shortly before it expires, until closed."""
+        while not self._stop.is_set():
+            token = self._token
+            wait = (
+                token.expires_on - time.time() - TOKEN_REFRESH_MARGIN if token else 0.0
+            )
+            if self._stop.wait(max(wait, 0.0)):
+                return
+            try:
+                with self._lock:
+                    self._fetch()
+            except Exception:
+                logger.exception("Azure AD token refresh failed")
+                if self._stop.wait(TOKEN_RETRY_WAIT):
+                    return
+
+    def close(self) -> None:
+        """Stop the refresh thread and close the credential."""
+        self._stop.set()
+        if self._credential is not None:
+            self._credential.close()
+
+    def get_stats(self) -> dict[str, float]:
+        """Return fetch counters, last fetch latency and cache age."""
+        token = self._token
+        return {
+            **self._stats,
+            "cache_age_s": round(time.time() - self._fetched_at, 1) if token else 0.0,
+            "expires_in_s": round(token.expires_on - time.time(), 1) if token else 0.0,
+        }
+
+
+def get_token_cache() -> AzureTokenCache:
+    """Return the Azure AD token cache of this worker."""
+    return get_client(f"{PROVIDER}_token", lambda: AzureTokenCache(AZURE_AD_SCOPE))
+
+
+async def _async_token_provider() -> str:
+    """Return the cached token, fetch it in a thread if it is not valid."""
+    # azure.identity.aio is not used, as it requires aiohttp
+    cache = get_token_cache()
+    if cache.is_valid():
+        return cache.get_token()
+    return await asyncio.to_thread(cache.get_token)
 
 
 def get_openai_client_default_azure_creds() -> AzureOpenAI:
-    """Create and return an Azure OpenAI client."""
-    return AzureOpenAI(
-        api_version=my_get_env("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=my_get_env("AZURE_OPENAI_URL"),
-        azure_ad_token_provider=get_bearer_token_provider(
-            DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
+    """Return the pooled Azure OpenAI client."""
+    return get_client(
+        PROVIDER,
+        lambda: AzureOpenAI(
+            api_version=my_get_env("AZURE_OPENAI_API_VERSION"),
+            azure_endpoint=my_get_env("AZURE_OPENAI_URL"),
+            azure_ad_token_provider=get_token_cache().get_token,
+            http_client=new_http_client(),
+            max_retries=0,  # retried by retry_with_backoff
+        ),
+    )
+
+
+def get_async_openai_client_default_azure_creds() -> AsyncAzureOpenAI:
+    """Return the pooled async Azure OpenAI client."""
+    return get_async_client(
+        PROVIDER,
+        lambda: AsyncAzureOpenAI(
+            api_version=my_get_env("AZURE_OPENAI_API_VERSION"),
+            azure_endpoint=my_get_env("AZURE_OPENAI_URL"),
+            azure_ad_token_provider=_async_token_provider,
+            http_client=new_async_http_client(),
+            max_retries=0,  # retried by async_retry_with_backoff
         ),
     )
 
@@ -41,28 +192,83 @@ class AzureOpenAIProvider(LLMProvider):
         """Initialize Azure OpenAI provider with instruction and model."""
         super().__init__(provider=PROVIDER, models=MODELS)
 
+    def get_stats(self) -> dict[str, float]:
+        """Return Azure AD token cache statistics."""
+        return get_token_cache().get_stats()
+
     def call(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
         """Call the LLM with retry logic."""
         self.check_model_valid(model)
         client = get_openai_client_default_azure_creds()
-        messages = [
-            {"role": "system", "content": instruction},
-            {"role": "user", "content": prompt},
-        ]
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
 
         def _api_call() -> ChatCompletion:
             response = client.chat.completions.create(
                 model=model,
                 messages=messages,  # type: ignore
+                timeout=attempt_timeout(),
+                max_completion_tokens=max_tokens,
             )
             return response
 
-        response = retry_with_exponential_backoff(_api_call, provider_name=PROVIDER)()
+        response = retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        return parse_chat_completion(PROVIDER, response, model)
 
-        s = response.choices[0].message.content or ""
-        tokens = (
-            response.usage.total_tokens
-            if hasattr(response, "usage") and response.usage
-            else 0
-        )
-        return s, tokens
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        """Call the LLM with retry logic (async)."""
+        self.check_model_valid(model)
+        client = get_async_openai_client_default_azure_creds()
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
+
+        async def _api_call() -> ChatCompletion:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,  # type: ignore
+                timeout=attempt_timeout(),
+                max_completion_tokens=max_tokens,
+            )
+            return response
+
+        response = await async_retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        return parse_chat_completion(PROVIDER, response, model)
+
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        """Stream the LLM response, retry only the opening of the stream."""
+        self.check_model_valid(model)
+        client = get_async_openai_client_default_azure_creds()
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
+
+        async def _api_call() -> AsyncStream[ChatCompletionChunk]:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,  # type: ignore
+                timeout=attempt_timeout(),
+                max_completion_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            return stream
+
+        stream = await async_retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content, 0
+                if chunk.choices and chunk.choices[0].finish_reason == "length":
+                    record_truncation(PROVIDER, model)
+                if chunk.usage:
+                    record_chat_usage(PROVIDER, model, chunk.usage)
+                    yield "", chunk.usage.total_tokens
+        finally:
+            await stream.close()
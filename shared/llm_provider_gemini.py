@@ -1,31 +1,114 @@
 """Google Gemini LLM provider class."""
 
 import logging
+from collections.abc import AsyncIterator
 from pathlib import Path
 
 from google.genai import types as genai_types
-from google.genai.client import Client
+from google.genai.client import AsyncClient, Client
 from google.genai.types import GenerateContentResponse
 
 from .helper import my_get_env
-from .llm_provider import LLMProvider, retry_with_exponential_backoff
+from .llm_catalog import LLM_CATALOG, get_llm_models
+from .llm_clients import get_async_client, get_client, http_client_kwargs
+from .llm_deadline import attempt_timeout
+from .llm_output_cap import max_output_tokens, record_truncation
+from .llm_prompt_cache import PROMPT_CACHE_STATS
+from .llm_provider import LLMProvider
+from .llm_resilience import async_retry_with_backoff, retry_with_backoff
+from .llm_tokens import record_reasoning_tokens
 
 logger = logging.getLogger(Path(__file__).stem)
 
 PROVIDER = "Google"
-MODELS = [
-    "gemini-2.5-flash-lite",
-    "gemini-2.5-flash",
-    "gemini-2.5-pro",
-]
+MODELS = get_llm_models("Google")
+OUTPUT_TOKENS = LLM_CATALOG["Google"].output_tokens
 
 
-def get_gemini_client() -> Client:
-    """Get cached Gemini client."""
+def _create_gemini_client() -> Client:
+    """Create a Gemini client with the shared pool settings."""
     from google import genai  # noqa: PLC0415
 
     api_key = my_get_env("GEMINI_API_KEY")
-    return genai.Client(api_key=api_key)
+    return genai.Client(
+        api_key=api_key,
+        http_options=genai_types.HttpOptions(
+            client_args=http_client_kwargs(),
+            async_client_args=http_client_kwargs(),
+        ),
+    )
+
+
+def get_gemini_client() -> Client:
+    """Get cached Gemini client."""
+    return get_client(PROVIDER, _create_gemini_client)
+
+
+def get_async_gemini_client() -> AsyncClient:
+    """Get cached async Gemini client."""
+    return get_async_client(PROVIDER, lambda: _create_gemini_client().aio)
+
+
+def _generate_config(
+    instruction: str, max_tokens: int | None
+) -> genai_types.GenerateContentConfig:
+    """
+    Return the config of a call, the instruction first as the cacheable prefix.
+
+    The timeout of the call is the time left until the deadline of the request,
+    the response is capped at max_tokens.
+    """
+    return genai_types.GenerateContentConfig(
+        system_instruction=instruction,
+        http_options=genai_types.HttpOptions(timeout=round(attempt_timeout() * 1000)),
+        max_output_tokens=max_tokens,
+    )
+
+
+def _check_truncation(response: GenerateContentResponse, model: str) -> None:
+    """Record the response if it was cut off at the output cap."""
+    if (
+        response.candidates
+        and response.candidates[0].finish_reason == genai_types.FinishReason.MAX_TOKENS
+    ):
+        record_truncation(PROVIDER, model)
+
+
+def _record_cached_tokens(
+    model: str, usage: genai_types.GenerateContentResponseUsageMetadata | None
+) -> None:
+    """Record the prompt tokens, those served from the implicit cache and thinking."""
+    if usage is None or not usage.prompt_token_count:
+        return
+    PROMPT_CACHE_STATS.record(
+        PROVIDER,
+        model,
+        usage.prompt_token_count,
+        usage.cached_content_token_count or 0,
+    )
+    # thinking models: not part of the response text
+    record_reasoning_tokens(usage.thoughts_token_count)
+
+
+def _parse_response(
+    response: GenerateContentResponse | None, model: str
+) -> tuple[str, int]:
+    """Extract response text and token consumption."""
+    if (
+        response
+        and response.usage_metadata
+        and response.usage_metadata.total_token_count
+    ):
+        tokens = response.usage_metadata.total_token_count
+        _record_cached_tokens(model, response.usage_metadata)
+    else:
+        logger.warning("No token consumption retrieved.")
+        tokens = 0
+
+    if response:
+        _check_truncation(response, model)
+    s = str(response.text) if response else ""
+    return s, tokens
 
 
 class GeminiProvider(LLMProvider):
@@ -39,28 +122,65 @@ class GeminiProvider(LLMProvider):
         """Call the LLM with retry logic."""
         self.check_model_valid(model)
         client = get_gemini_client()
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
 
         def _api_call() -> GenerateContentResponse:
             response = client.models.generate_content(
                 model=model,
-                config=genai_types.GenerateContentConfig(
-                    system_instruction=instruction
-                ),
+                config=_generate_config(instruction, max_tokens),
+                contents=prompt,
+            )
+            return response
+
+        response = retry_with_backoff(_api_call, provider_name=PROVIDER)()
+        return _parse_response(response, model)
+
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        """Call the LLM with retry logic (async)."""
+        self.check_model_valid(model)
+        client = get_async_gemini_client()
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
+
+        async def _api_call() -> GenerateContentResponse:
+            response = await client.models.generate_content(
+                model=model,
+                config=_generate_config(instruction, max_tokens),
                 contents=prompt,
             )
             return response
 
-        response = retry_with_exponential_backoff(_api_call, provider_name=PROVIDER)()
+        response = await async_retry_with_backoff(_api_call, provider_name=PROVIDER)()
+        return _parse_response(response, model)
 
-        if (
-            response
-            and response.usage_metadata
-            and response.usage_metadata.total_token_count
-        ):
-            tokens = response.usage_metadata.total_token_count
-        else:
-            logger.warning("No token consumption retrieved.")
-            tokens = 0
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        """Stream the LLM response, retry only the opening of the stream."""
+        self.check_model_valid(model)
+        client = get_async_gemini_client()
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
 
-        s = str(response.text) if response else ""
-        return s, tokens
+        async def _api_call() -> AsyncIterator[GenerateContentResponse]:
+            stream = await client.models.generate_content_stream(
+                model=model,
+                config=_generate_config(instruction, max_tokens),
+                contents=prompt,
+            )
+            return stream
+
+        stream = await async_retry_with_backoff(_api_call, provider_name=PROVIDER)()
+        tokens = 0
+        usage = None
+        try:
+            async for chunk in stream:
+                # usage metadata is cumulative, the last chunk has the total
+                if chunk.usage_metadata and chunk.usage_metadata.total_token_count:
+                    tokens = chunk.usage_metadata.total_token_count
+                    usage = chunk.usage_metadata
+                _check_truncation(chunk, model)
+                if chunk.text:
+                    yield chunk.text, 0
+        finally:
+            await stream.aclose()  # type: ignore
+        _record_cached_tokens(model, usage)
+        yield "", tokens
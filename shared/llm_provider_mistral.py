@@ -1,27 +1,83 @@
 """OpenAI LLM provider class."""
 
 import logging
+from collections.abc import AsyncIterator
 from pathlib import Path
-from typing import Any
 
 from mistralai.client import Mistral
+from mistralai.client.errors import NoResponseError
 from mistralai.client.models.chatcompletionresponse import ChatCompletionResponse
+from mistralai.client.models.completionevent import CompletionEvent
+from mistralai.client.models.usageinfo import UsageInfo
+from mistralai.client.utils.eventstreaming import EventStreamAsync
 
 from .helper import my_get_env
-from .llm_provider import LLMProvider, retry_with_exponential_backoff
+from .llm_catalog import LLM_CATALOG, get_llm_models
+from .llm_clients import (
+    get_async_client,
+    get_client,
+    new_async_http_client,
+    new_http_client,
+)
+from .llm_deadline import attempt_timeout
+from .llm_output_cap import max_output_tokens, record_truncation
+from .llm_prompt_cache import PROMPT_CACHE_STATS, chat_messages
+from .llm_provider import LLMProvider
+from .llm_resilience import async_retry_with_backoff, retry_with_backoff
 
 logger = logging.getLogger(Path(__file__).stem)
 
 PROVIDER = "Mistral"
-MODELS = [
-    "mistral-medium-latest",
-    "mistral-large-latest",
-]
+# transient SDK errors without HTTP status
+RETRYABLE_ERRORS = (NoResponseError,)
+MODELS = get_llm_models("Mistral")
+OUTPUT_TOKENS = LLM_CATALOG["Mistral"].output_tokens
 
 
 def get_mistral_client() -> Mistral:
-    """Create and return an Mistral client."""
-    return Mistral(api_key=my_get_env("MISTRAL_API_KEY"))
+    """Return the pooled Mistral client."""
+    # Mistral does not close supplied httpx clients, so they are pooled separately
+    return get_client(
+        PROVIDER,
+        lambda: Mistral(
+            api_key=my_get_env("MISTRAL_API_KEY"),
+            client=get_client(f"{PROVIDER}_httpx", new_http_client),
+        ),
+    )
+
+
+def get_async_mistral_client() -> Mistral:
+    """Return the pooled Mistral client for async calls."""
+    return get_async_client(
+        PROVIDER,
+        lambda: Mistral(
+            api_key=my_get_env("MISTRAL_API_KEY"),
+            async_client=get_async_client(f"{PROVIDER}_httpx", new_async_http_client),
+        ),
+    )
+
+
+def _record_cached_tokens(model: str, usage: UsageInfo | None) -> None:
+    """Record the prompt tokens and those served from the prompt cache."""
+    if usage is None or not usage.prompt_tokens:
+        return
+    # not part of the SDK model, reported by the API as extra field
+    details = (usage.additional_properties or {}).get("prompt_tokens_details") or {}
+    cached_tokens = details.get("cached_tokens") or 0
+    PROMPT_CACHE_STATS.record(PROVIDER, model, usage.prompt_tokens, cached_tokens)
+
+
+def _parse_response(response: ChatCompletionResponse, model: str) -> tuple[str, int]:
+    """Extract response text and token consumption."""
+    _record_cached_tokens(model, response.usage)
+    choice = response.choices[0] if response.choices else None
+    s = str(choice.message.content) if choice and choice.message else ""
+    if choice and choice.finish_reason == "length":
+        record_truncation(PROVIDER, model)
+    tokens = 0
+    if hasattr(response, "usage") and response.usage and response.usage.total_tokens:
+        tokens = response.usage.total_tokens
+    return s, tokens
 
 
 class MistralProvider(LLMProvider):
@@ -35,27 +91,72 @@ class MistralProvider(LLMProvider):
         """Call the LLM with retry logic."""
         self.check_model_valid(model)
         client = get_mistral_client()
-        messages: list[dict[str, Any]] = [
-            {"role": "system", "content": instruction},
-            {"role": "user", "content": prompt},
-        ]
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS)
 
         def _api_call() -> ChatCompletionResponse:
             response = client.chat.complete(
                 model=model,
                 messages=messages,  # type: ignore
+                timeout_ms=round(attempt_timeout() * 1000),
+                max_tokens=max_tokens,
             )
             return response
 
-        response = retry_with_exponential_backoff(_api_call, provider_name=PROVIDER)()
-
-        choice = response.choices[0] if response.choices else None
-        s = str(choice.message.content) if choice and choice.message else ""
-        tokens = 0
-        if (
-            hasattr(response, "usage")
-            and response.usage
-            and response.usage.total_tokens
-        ):
-            tokens = response.usage.total_tokens
-        return s, tokens
+        response = retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        return _parse_response(response, model)
+
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        """Call the LLM with retry logic (async)."""
+        self.check_model_valid(model)
+        client = get_async_mistral_client()
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS)
+
+        async def _api_call() -> ChatCompletionResponse:
+            response = await client.chat.complete_async(
+                model=model,
+                messages=messages,  # type: ignore
+                timeout_ms=round(attempt_timeout() * 1000),
+                max_tokens=max_tokens,
+            )
+            return response
+
+        response = await async_retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        return _parse_response(response, model)
+
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        """Stream the LLM response, retry only the opening of the stream."""
+        self.check_model_valid(model)
+        client = get_async_mistral_client()
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS)
+
+        async def _api_call() -> EventStreamAsync[CompletionEvent]:
+            stream = await client.chat.stream_async(
+                model=model,
+                messages=messages,  # type: ignore
+                timeout_ms=round(attempt_timeout() * 1000),
+                max_tokens=max_tokens,
+            )
+            return stream
+
+        stream = await async_retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        async with stream:
+            async for event in stream:
+                chunk = event.data
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield str(chunk.choices[0].delta.content), 0
+                if chunk.choices and chunk.choices[0].finish_reason == "length":
+                    record_truncation(PROVIDER, model)
+                if chunk.usage and chunk.usage.total_tokens:
+                    _record_cached_tokens(model, chunk.usage)
+                    yield "", chunk.usage.total_tokens
@@ -1,23 +1,62 @@
-"""Ollama LLM provider class."""
+"""
+Ollama LLM provider class.
 
+The models are loaded at worker start and kept loaded for
+LLM_OLLAMA_KEEP_ALIVE after each request, so requests after idle do not
+wait for the model load. Requests per model are limited to the parallel
+requests of the daemon, further ones wait in the worker instead of piling
+up at the daemon. The Ollama SDK takes no timeout per call: the async calls
+are cancelled at the request deadline, the wait for a slot included, so a
+slow local model does not hold a slot past it.
+"""
+
+import asyncio
 import logging
+import threading
+import weakref
+from collections.abc import AsyncIterator
 from pathlib import Path
 
-from ollama import ChatResponse, chat  # uv add --dev ollama
+from ollama import AsyncClient, ChatResponse, Client  # uv add --dev ollama
 
-from .llm_provider import LLMProvider, retry_with_exponential_backoff
+from .config import (
+    LLM_OLLAMA_KEEP_ALIVE,
+    LLM_OLLAMA_NUM_PARALLEL,
+    LLM_OLLAMA_PRELOAD,
+)
+from .llm_catalog import LLM_CATALOG, get_llm_models
+from .llm_clients import get_async_client, get_client, http_client_kwargs
+from .llm_deadline import attempt_timeout, await_with_deadline
+from .llm_output_cap import max_output_tokens, record_truncation
+from .llm_prompt_cache import chat_messages
+from .llm_provider import LLMProvider
+from .llm_resilience import async_retry_with_backoff, retry_with_backoff
 
 logger = logging.getLogger(Path(__file__).stem)
 
 PROVIDER = "Ollama"
-MODELS = [
-    "mistral",
-    "llama3.2:1b",
-    "llama3.2:3b",
-    "deepseek-r1:1.5b",
-    "deepseek-r1:8b",
-    "deepseek-r1:7b",
-]
+MODELS = get_llm_models("Ollama")
+OUTPUT_TOKENS = LLM_CATALOG["Ollama"].output_tokens
+# Ollama reports durations in nanoseconds
+NS_PER_SECOND = 1e9
+# a load taking longer was a cold start, not a loaded model
+COLD_LOAD_SECONDS = 1.0
+
+
+def get_ollama_client() -> Client:
+    """Return the pooled Ollama client."""
+    return get_client(PROVIDER, lambda: Client(**http_client_kwargs()))
+
+
+def get_async_ollama_client() -> AsyncClient:
+    """Return the pooled async Ollama client."""
+    return get_async_client(PROVIDER, lambda: AsyncClient(**http_client_kwargs()))
+
+
+def _options(prompt: str) -> dict[str, int] | None:
+    """Return the options of a chat, the response capped at the output cap."""
+    max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS)
+    return {"num_predict": max_tokens} if max_tokens else None
 
 
 class OllamaProvider(LLMProvider):
@@ -26,23 +65,169 @@ class OllamaProvider(LLMProvider):
     def __init__(self) -> None:
         """Initialize Ollama provider with instruction and model."""
         super().__init__(provider=PROVIDER, models=MODELS)
+        self.num_parallel = LLM_OLLAMA_NUM_PARALLEL
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._async_semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]
+        ] = weakref.WeakKeyDictionary()
+        self._stats = {
+            "calls": 0,
+            "cold_starts": 0,
+            "prompt_tokens": 0,
+            "eval_tokens": 0,
+            "load_seconds": 0.0,
+            "prompt_eval_seconds": 0.0,
+            "eval_seconds": 0.0,
+        }
+
+    def _semaphore(self, model: str) -> threading.BoundedSemaphore:
+        """Return the semaphore limiting the parallel requests to the model."""
+        with self._lock:
+            if model not in self._semaphores:
+                self._semaphores[model] = threading.BoundedSemaphore(self.num_parallel)
+            return self._semaphores[model]
+
+    def _async_semaphore(self, model: str) -> asyncio.Semaphore:
+        """Return the semaphore of the model in the running event loop."""
+        with self._lock:
+            semaphores = self._async_semaphores.setdefault(
+                asyncio.get_running_loop(), {}
+            )
+            if model not in semaphores:
+                semaphores[model] = asyncio.Semaphore(self.num_parallel)
+            return semaphores[model]
+
+    def _record_usage(self, response: ChatResponse) -> int:
+        """Record token counts and durations of a response, return its tokens."""
+        if response.done_reason == "length":
+            record_truncation(PROVIDER, str(response.model))
+        prompt_tokens = response.prompt_eval_count or 0
+        eval_tokens = response.eval_count or 0
+        load_seconds = (response.load_duration or 0) / NS_PER_SECOND
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["cold_starts"] += load_seconds > COLD_LOAD_SECONDS
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["eval_tokens"] += eval_tokens
+            self._stats["load_seconds"] += load_seconds
+            self._stats["prompt_eval_seconds"] += (
+                response.prompt_eval_duration or 0
+            ) / NS_PER_SECOND
+            self._stats["eval_seconds"] += (response.eval_duration or 0) / NS_PER_SECOND
+        return prompt_tokens + eval_tokens
+
+    def get_stats(self) -> dict[str, float]:
+        """Return token counts, load and eval durations and tokens per second."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["eval_tokens_per_second"] = (
+            round(stats["eval_tokens"] / stats["eval_seconds"], 1)
+            if stats["eval_seconds"]
+            else 0.0
+        )
+        return stats
+
+    async def awarm_up(self) -> None:
+        """Load the preload models and keep them loaded."""
+        client = get_async_ollama_client()
+        models = [m.strip() for m in LLM_OLLAMA_PRELOAD.split(",") if m.strip()]
+        for model in models or MODELS[:1]:
+            self.check_model_valid(model)
+            # a chat without messages only loads the model
+            response = await client.chat(
+                model=model, messages=[], keep_alive=LLM_OLLAMA_KEEP_ALIVE
+            )
+            logger.info(
+                "Loaded Ollama model %s in %.1f seconds",
+                model,
+                (response.load_duration or 0) / NS_PER_SECOND,
+            )
 
     def call(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
         """Call the LLM with retry logic."""
         self.check_model_valid(model)
+        client = get_ollama_client()
 
         def _api_call() -> ChatResponse:
-            response = chat(
-                model=model,
-                stream=False,
-                messages=[
-                    {"role": "system", "content": instruction},
-                    {"role": "user", "content": prompt},
-                ],
-            )
+            semaphore = self._semaphore(model)
+            # the call itself is bounded by the timeout of the client
+            if not semaphore.acquire(timeout=attempt_timeout()):
+                msg = f"No free {PROVIDER} slot for {model} before the timeout"
+                raise TimeoutError(msg)
+            try:
+                response = client.chat(
+                    model=model,
+                    stream=False,
+                    messages=chat_messages(instruction, prompt),
+                    keep_alive=LLM_OLLAMA_KEEP_ALIVE,
+                    options=_options(prompt),
+                )
+            finally:
+                semaphore.release()
             return response
 
-        response = retry_with_exponential_backoff(_api_call, provider_name=PROVIDER)()
+        response = retry_with_backoff(_api_call, provider_name=PROVIDER)()
+        tokens = self._record_usage(response)
+        return str(response.message.content), tokens
+
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        """Call the LLM with retry logic (async)."""
+        self.check_model_valid(model)
+        client = get_async_ollama_client()
+
+        async def _api_call() -> ChatResponse:
+            async with (
+                asyncio.timeout(attempt_timeout()),
+                self._async_semaphore(model),
+            ):
+                response = await client.chat(
+                    model=model,
+                    stream=False,
+                    messages=chat_messages(instruction, prompt),
+                    keep_alive=LLM_OLLAMA_KEEP_ALIVE,
+                    options=_options(prompt),
+                )
+            return response
 
-        tokens = 0  # not returned by ollama
+        response = await async_retry_with_backoff(_api_call, provider_name=PROVIDER)()
+        tokens = self._record_usage(response)
         return str(response.message.content), tokens
+
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        """Stream the LLM response, retry only the opening of the stream."""
+        self.check_model_valid(model)
+        client = get_async_ollama_client()
+
+        async def _api_call() -> AsyncIterator[ChatResponse]:
+            async with asyncio.timeout(attempt_timeout()):
+                stream = await client.chat(
+                    model=model,
+                    stream=True,
+                    messages=chat_messages(instruction, prompt),
+                    keep_alive=LLM_OLLAMA_KEEP_ALIVE,
+                    options=_options(prompt),
+                )
+            return stream
+
+        # the request runs until the stream is consumed, at most to the deadline
+        semaphore = self._async_semaphore(model)
+        await await_with_deadline(semaphore.acquire())
+        try:
+            stream = await async_retry_with_backoff(_api_call, provider_name=PROVIDER)()
+            tokens = 0
+            try:
+                while (
+                    part := await await_with_deadline(anext(stream, None))
+                ) is not None:
+                    if part.message.content:
+                        yield part.message.content, 0
+                    if part.done:  # the last part has the counts and durations
+                        tokens = self._record_usage(part)
+            finally:
+                await stream.aclose()  # type: ignore
+        finally:
+            semaphore.release()
+        yield "", tokens
@@ -1,27 +1,63 @@
 """OpenAI LLM provider class."""
 
 import logging
+from collections.abc import AsyncIterator
 from pathlib import Path
 
-from openai import OpenAI
+from openai import APIConnectionError, AsyncOpenAI, AsyncStream, OpenAI
 from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 
 from .helper import my_get_env
-from .llm_provider import LLMProvider, retry_with_exponential_backoff
+from .llm_catalog import LLM_CATALOG, get_llm_models
+from .llm_clients import (
+    get_async_client,
+    get_client,
+    new_async_http_client,
+    new_http_client,
+)
+from .llm_deadline import attempt_timeout
+from .llm_output_cap import max_output_tokens, record_truncation
+from .llm_prompt_cache import (
+    chat_messages,
+    instruction_key,
+    parse_chat_completion,
+    record_chat_usage,
+)
+from .llm_provider import LLMProvider
+from .llm_resilience import async_retry_with_backoff, retry_with_backoff
 
 logger = logging.getLogger(Path(__file__).stem)
 
 PROVIDER = "OpenAI"
-MODELS = [
-    "gpt-5-nano",
-    "gpt-5-mini",
-    "gpt-5",
-]
+# transient SDK errors without HTTP status
+RETRYABLE_ERRORS = (APIConnectionError,)
+MODELS = get_llm_models("OpenAI")
+OUTPUT_TOKENS = LLM_CATALOG["OpenAI"].output_tokens
 
 
 def get_openai_client() -> OpenAI:
-    """Create and return an OpenAI client."""
-    return OpenAI(api_key=my_get_env("OPENAI_API_KEY"))
+    """Return the pooled OpenAI client."""
+    return get_client(
+        PROVIDER,
+        lambda: OpenAI(
+            api_key=my_get_env("OPENAI_API_KEY"),
+            http_client=new_http_client(),
+            max_retries=0,  # retried by retry_with_backoff
+        ),
+    )
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return the pooled async OpenAI client."""
+    return get_async_client(
+        PROVIDER,
+        lambda: AsyncOpenAI(
+            api_key=my_get_env("OPENAI_API_KEY"),
+            http_client=new_async_http_client(),
+            max_retries=0,  # retried by async_retry_with_backoff
+        ),
+    )
 
 
 class OpenAIProvider(LLMProvider):
@@ -35,25 +71,84 @@ class OpenAIProvider(LLMProvider):
         """Call the LLM with retry logic."""
         self.check_model_valid(model)
         client = get_openai_client()
-        messages = [
-            {"role": "system", "content": instruction},
-            {"role": "user", "content": prompt},
-        ]
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
 
         def _api_call() -> ChatCompletion:
             response = client.chat.completions.create(
                 reasoning_effort="low",
                 model=model,
                 messages=messages,  # type: ignore
+                timeout=attempt_timeout(),
+                max_completion_tokens=max_tokens,
+                # routes requests of the same instruction to the same cache
+                prompt_cache_key=instruction_key(instruction),
+            )
+            return response
+
+        response = retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        return parse_chat_completion(PROVIDER, response, model)
+
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        """Call the LLM with retry logic (async)."""
+        self.check_model_valid(model)
+        client = get_async_openai_client()
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
+
+        async def _api_call() -> ChatCompletion:
+            response = await client.chat.completions.create(
+                reasoning_effort="low",
+                model=model,
+                messages=messages,  # type: ignore
+                timeout=attempt_timeout(),
+                max_completion_tokens=max_tokens,
+                # routes requests of the same instruction to the same cache
+                prompt_cache_key=instruction_key(instruction),
             )
             return response
 
-        response = retry_with_exponential_backoff(_api_call, provider_name=PROVIDER)()
+        response = await async_retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        return parse_chat_completion(PROVIDER, response, model)
+
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        """Stream the LLM response, retry only the opening of the stream."""
+        self.check_model_valid(model)
+        client = get_async_openai_client()
+        messages = chat_messages(instruction, prompt)
+        max_tokens = max_output_tokens(PROVIDER, prompt, OUTPUT_TOKENS, reasoning=True)
+
+        async def _api_call() -> AsyncStream[ChatCompletionChunk]:
+            stream = await client.chat.completions.create(
+                reasoning_effort="low",
+                model=model,
+                messages=messages,  # type: ignore
+                timeout=attempt_timeout(),
+                max_completion_tokens=max_tokens,
+                # routes requests of the same instruction to the same cache
+                prompt_cache_key=instruction_key(instruction),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            return stream
 
-        s = response.choices[0].message.content or ""
-        tokens = (
-            response.usage.total_tokens
-            if hasattr(response, "usage") and response.usage
-            else 0
-        )
-        return s, tokens
+        stream = await async_retry_with_backoff(
+            _api_call, provider_name=PROVIDER, retryable_errors=RETRYABLE_ERRORS
+        )()
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content, 0
+                if chunk.choices and chunk.choices[0].finish_reason == "length":
+                    record_truncation(PROVIDER, model)
+                if chunk.usage:
+                    record_chat_usage(PROVIDER, model, chunk.usage)
+                    yield "", chunk.usage.total_tokens
+        finally:
+            await stream.close()
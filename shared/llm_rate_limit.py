@@ -0,0 +1,278 @@
+"""
+Upstream rate governor per provider and model.
+
+Token buckets of requests per minute and tokens per minute, stored in a
+SQLite file (WAL), so all gunicorn workers of the host share them.
+Requests exceeding a bucket wait briefly until it refilled, instead of
+running into a 429 of the provider; if the wait would be too long, or
+last past the deadline of the request, they fail with RateLimitError.
+
+Limits are configured in LLM_RATE_LIMITS, comma-separated
+provider[/model]=requests_per_minute:tokens_per_minute, 0 for no limit.
+Provider names as of the provider classes, e.g. "OpenAI", "AzureOpenAI".
+A provider limit applies to each of its models on its own.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from .config import LLM_RATE_LIMITS, LLM_RATE_MAX_WAIT
+from .llm_deadline import MIN_ATTEMPT_SECONDS, remaining
+
+logger = logging.getLogger(Path(__file__).stem)
+
+RATE_LIMIT_DB_PATH = Path(__file__).parent.parent / "llm_rate_limit.sqlite"
+
+
+class RateLimitError(RuntimeError):
+    """Raised if a request would have to wait too long for its rate limit."""
+
+    def __init__(self, msg: str, retry_after: float) -> None:
+        """Init the error with the seconds until the request may be sent."""
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Limits of a bucket, 0 for no limit."""
+
+    requests_per_minute: float
+    tokens_per_minute: float
+
+
+def parse_limits(config: str) -> dict[str, RateLimit]:
+    """Parse LLM_RATE_LIMITS, e.g. "OpenAI=500:200000, Google/gemini-2.5-pro=150:0"."""
+    limits = {}
+    for item in config.split(","):
+        if not item.strip():
+            continue
+        name, _, values = item.partition("=")
+        requests, _, tokens = values.partition(":")
+        limits[name.strip()] = RateLimit(float(requests or 0), float(tokens or 0))
+    return limits
+
+
+def _refill(
+    limit: RateLimit, requests: float, tokens: float, seconds: float
+) -> tuple[float, float]:
+    """Return the levels of the buckets refilled for the elapsed seconds."""
+    return (
+        min(
+            limit.requests_per_minute,
+            requests + seconds * limit.requests_per_minute / 60,
+        ),
+        min(limit.tokens_per_minute, tokens + seconds * limit.tokens_per_minute / 60),
+    )
+
+
+def _wait_time(limit: RateLimit, requests: float, tokens: float, needed: int) -> float:
+    """Return seconds until a request of needed tokens fits the buckets."""
+    waits = [0.0]
+    if limit.requests_per_minute and requests < 1:
+        waits.append((1 - requests) * 60 / limit.requests_per_minute)
+    # requests larger than the bucket wait for a full bucket
+    needed_tokens = min(needed, limit.tokens_per_minute)
+    if limit.tokens_per_minute and tokens < needed_tokens:
+        waits.append((needed_tokens - tokens) * 60 / limit.tokens_per_minute)
+    return max(waits)
+
+
+class RateGovernor:
+    """Token buckets per provider/model, shared via SQLite."""
+
+    def __init__(
+        self, limits: dict[str, RateLimit], db_path: Path, max_wait: float
+    ) -> None:
+        """Init the governor, disabled if there are no limits."""
+        self.limits = limits
+        self.db_path = db_path
+        self.max_wait = max_wait
+        self._db_initialized = False
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, float]] = {}
+
+    def get_limit(self, provider: str, model: str) -> RateLimit | None:
+        """Return the limit of the model, else of the provider, None if none."""
+        return self.limits.get(f"{provider}/{model}") or self.limits.get(provider)
+
+    @contextmanager
+    def _sqlite_connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """Connect in autocommit mode, create the table on first use."""
+        con = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        try:
+            if not self._db_initialized:
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute("""
+                    CREATE TABLE IF NOT EXISTS rate_bucket (
+                        key TEXT PRIMARY KEY,
+                        requests REAL NOT NULL,
+                        tokens REAL NOT NULL,
+                        updated REAL NOT NULL
+                    )
+                """)
+                self._db_initialized = True
+            yield con
+        finally:
+            con.close()
+
+    def _try_acquire(self, key: str, limit: RateLimit, tokens: int) -> float:
+        """Take a request and tokens from the buckets, else return seconds to wait."""
+        now = time.time()
+        try:
+            with self._sqlite_connection() as con:
+                # exclusive for the read-modify-write, also against other workers
+                con.execute("BEGIN IMMEDIATE")
+                row = con.execute(
+                    "SELECT requests, tokens, updated FROM rate_bucket WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                requests, available, updated = row or (
+                    limit.requests_per_minute,
+                    limit.tokens_per_minute,
+                    now,
+                )
+                requests, available = _refill(limit, requests, available, now - updated)
+                wait = _wait_time(limit, requests, available, tokens)
+                if wait == 0:
+                    requests -= 1
+                    available -= tokens
+                con.execute(
+                    "INSERT OR REPLACE INTO rate_bucket VALUES (?, ?, ?, ?)",
+                    (key, requests, available, now),
+                )
+                con.execute("COMMIT")
+        except sqlite3.Error:
+            # fail open, the provider enforces its limits anyway
+            logger.exception("Rate limit SQLite update failed")
+            return 0.0
+        return wait
+
+    def _count(self, key: str, waited: float, *, rejected: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                key,
+                {
+                    "requests": 0,
+                    "waited": 0,
+                    "wait_seconds": 0,
+                    "max_wait_seconds": 0,
+                    "rejected": 0,
+                },
+            )
+            stats["requests"] += 1
+            if waited > 0:
+                stats["waited"] += 1
+                stats["wait_seconds"] += waited
+                stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            stats["rejected"] += rejected
+
+    def _next_wait(
+        self, key: str, limit: RateLimit, tokens: int, waited: float
+    ) -> float:
+        """Return the seconds to wait before the next attempt, 0 if acquired."""
+        wait = self._try_acquire(key, limit, tokens)
+        if wait == 0:
+            if waited > 0:
+                logger.info("%s rate limit: waited %.1f seconds", key, waited)
+            self._count(key, waited)
+            return 0.0
+        # no wait past the deadline of the request, the call would not finish
+        if waited + wait > self.max_wait or wait + MIN_ATTEMPT_SECONDS > remaining():
+            self._count(key, waited, rejected=True)
+            msg = f"{key} rate limit reached, retry in {wait:.0f} seconds"
+            raise RateLimitError(msg, retry_after=wait)
+        return wait
+
+    def acquire(self, provider: str, model: str, tokens: int) -> None:
+        """Wait until a request of tokens may be sent to the model."""
+        limit = self.get_limit(provider, model)
+        if limit is None:
+            return
+        key = f"{provider}/{model}"
+        waited = 0.0
+        while wait := self._next_wait(key, limit, tokens, waited):
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, provider: str, model: str, tokens: int) -> None:
+        """
+        Async variant of acquire(), other requests are served while waiting.
+
+        The buckets are updated in a thread, so a lock of another worker on
+        the SQLite file does not block the event loop.
+        """
+        limit = self.get_limit(provider, model)
+        if limit is None:
+            return
+        key = f"{provider}/{model}"
+        waited = 0.0
+        while wait := await asyncio.to_thread(
+            self._next_wait, key, limit, tokens, waited
+        ):
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def record_usage(
+        self, provider: str, model: str, estimated: int, tokens: int
+    ) -> None:
+        """Correct the token bucket by the tokens actually consumed."""
+        if self.get_limit(provider, model) is None or tokens <= 0:
+            return
+        try:
+            with self._sqlite_connection() as con:
+                con.execute(
+                    "UPDATE rate_bucket SET tokens = tokens - ? WHERE key = ?",
+                    (tokens - estimated, f"{provider}/{model}"),
+                )
+        except sqlite3.Error:
+            logger.exception("Rate limit SQLite update failed")
+
+    async def arecord_usage(
+        self, provider: str, model: str, estimated: int, tokens: int
+    ) -> None:
+        """Async variant of record_usage(), the bucket is updated in a thread."""
+        if self.get_limit(provider, model) is None or tokens <= 0:
+            return
+        await asyncio.to_thread(self.record_usage, provider, model, estimated, tokens)
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """Return the bucket levels of the host and the waits of this worker."""
+        with self._lock:
+            stats = {key: dict(values) for key, values in self._stats.items()}
+        if not self.limits:
+            return stats
+        now = time.time()
+        try:
+            with self._sqlite_connection() as con:
+                rows = con.execute(
+                    "SELECT key, requests, tokens, updated FROM rate_bucket"
+                ).fetchall()
+        except sqlite3.Error:
+            logger.exception("Rate limit SQLite read failed")
+            return stats
+        for key, requests, tokens, updated in rows:
+            provider, _, model = key.partition("/")
+            if (limit := self.get_limit(provider, model)) is None:
+                continue
+            level_requests, level_tokens = _refill(
+                limit, requests, tokens, now - updated
+            )
+            stats.setdefault(key, {}).update(
+                {"level_requests": level_requests, "level_tokens": level_tokens}
+            )
+        return stats
+
+
+RATE_GOVERNOR = RateGovernor(
+    parse_limits(LLM_RATE_LIMITS),
+    db_path=RATE_LIMIT_DB_PATH,
+    max_wait=LLM_RATE_MAX_WAIT,
+)
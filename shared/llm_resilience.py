@@ -0,0 +1,366 @@
+"""
+Resilience of the LLM provider calls.
+
+- errors are classified as retryable (transport errors, 408/409/425/429/5xx)
+  or not (e.g. 400, invalid model), which fail immediately
+- Retry-After headers are honoured, else full-jitter exponential backoff
+- per-provider circuit breaker: after repeated failures calls fail fast,
+  after a cool-down a single probe call decides whether to close it again
+- no retry is started that cannot finish before the deadline of the request
+  (see llm_deadline), running out of time does not count as provider failure
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import TypeVar
+
+import httpx
+
+from .config import (
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_TIMEOUT,
+    LLM_RETRY_INITIAL_WAIT,
+    LLM_RETRY_MAX_ATTEMPTS,
+    LLM_RETRY_MAX_WAIT,
+)
+from .llm_deadline import (
+    MIN_ATTEMPT_SECONDS,
+    DeadlineExceededError,
+    check_deadline,
+    remaining,
+)
+
+logger = logging.getLogger(Path(__file__).stem)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+# errors of all SDKs, provider modules add their SDK specific ones
+RETRYABLE_ERRORS: tuple[type[BaseException], ...] = (
+    ConnectionError,
+    TimeoutError,
+    httpx.TransportError,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+def get_status_code(e: BaseException) -> int | None:
+    """Return the HTTP status code of an SDK error, if any."""
+    # OpenAI, Mistral, Ollama: status_code, Gemini: code
+    for attr in ("status_code", "code"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int) and value > 0:
+            return value
+    return None
+
+
+def is_retryable(
+    e: BaseException, retryable_errors: tuple[type[BaseException], ...] = ()
+) -> bool:
+    """Return True if the error is transient and the call should be retried."""
+    status_code = get_status_code(e)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return isinstance(e, RETRYABLE_ERRORS + retryable_errors)
+
+
+def get_retry_after(e: BaseException) -> float | None:
+    """Return the wait time in seconds requested by the Retry-After header."""
+    headers = getattr(e, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        # OpenAI specific, in milliseconds
+        if value := headers.get("retry-after-ms"):
+            return float(value) / 1000
+        if value := headers.get("retry-after"):
+            try:
+                return float(value)
+            except ValueError:
+                return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def backoff_wait(attempt: int, initial_wait: float, max_wait: float) -> float:
+    """Return full-jitter backoff: random wait up to initial_wait * 2^attempt."""
+    return random.uniform(0, min(max_wait, initial_wait * 2**attempt))  # noqa: S311
+
+
+class CircuitBreaker:
+    """Circuit breaker of a provider, with counters for monitoring."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        """Init the closed circuit breaker."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected": 0,
+            "opened": 0,
+        }
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call is not allowed."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_started_at = 0.0
+            # half open: a single probe, a new one if the last got lost
+            if self.state == "half_open" and (
+                now - self._probe_started_at >= self.reset_timeout
+            ):
+                self._probe_started_at = now
+                self._stats["calls"] += 1
+                return
+            if self.state != "closed":
+                self._stats["rejected"] += 1
+                msg = f"{self.name} circuit breaker is open"
+                raise CircuitOpenError(msg)
+            self._stats["calls"] += 1
+
+    def record_retry(self) -> None:
+        """Count a retry."""
+        with self._lock:
+            self._stats["retries"] += 1
+
+    def record_success(self) -> None:
+        """Close the circuit, the provider responded."""
+        with self._lock:
+            if self.state != "closed":
+                logger.info("%s circuit breaker closed", self.name)
+            self.state = "closed"
+            self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        """Count a failed call, open the circuit after repeated failures."""
+        with self._lock:
+            self._stats["failures"] += 1
+            self._consecutive_failures += 1
+            if self.state == "half_open" or (
+                self._consecutive_failures >= self.failure_threshold
+            ):
+                if self.state != "open":
+                    logger.warning("%s circuit breaker opened", self.name)
+                    self._stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def is_open(self) -> bool:
+        """Return True if calls are currently rejected."""
+        with self._lock:
+            return self.state == "open" and (
+                time.monotonic() - self._opened_at < self.reset_timeout
+            )
+
+    def get_stats(self) -> dict[str, str | float]:
+        """Return state and counters."""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive_failures,
+                **self._stats,
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider_name: str) -> CircuitBreaker:
+    """Return the circuit breaker of the provider, created on first use."""
+    with _breakers_lock:
+        if provider_name not in _breakers:
+            _breakers[provider_name] = CircuitBreaker(
+                provider_name,
+                failure_threshold=LLM_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=LLM_CIRCUIT_RESET_TIMEOUT,
+            )
+        return _breakers[provider_name]
+
+
+def get_circuit_breaker_stats() -> dict[str, dict[str, str | float]]:
+    """Return state and counters of all circuit breakers of this worker."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.get_stats() for name, breaker in breakers.items()}
+
+
+def _next_wait(  # noqa: PLR0913
+    e: Exception,
+    attempt: int,
+    *,
+    max_retries: int,
+    initial_wait: float,
+    provider_name: str,
+    retryable_errors: tuple[type[BaseException], ...],
+) -> float | None:
+    """Return the wait time before the next attempt, None to give up."""
+    if not is_retryable(e, retryable_errors):
+        logger.warning("%s non-retryable error: %s", provider_name, str(e))
+        return None
+    if attempt >= max_retries - 1:
+        logger.error(
+            "%s failed after %d attempts: %s", provider_name, max_retries, str(e)
+        )
+        return None
+    wait_time = get_retry_after(e)
+    if wait_time is not None and wait_time > LLM_RETRY_MAX_WAIT:
+        logger.warning(
+            "%s asks to retry after %.0f seconds, giving up", provider_name, wait_time
+        )
+        return None
+    if wait_time is None:
+        wait_time = backoff_wait(attempt, initial_wait, LLM_RETRY_MAX_WAIT)
+    if max(wait_time, 0.0) + MIN_ATTEMPT_SECONDS > remaining():
+        logger.warning(
+            "%s error, no time left for a retry before the deadline: %s",
+            provider_name,
+            str(e),
+        )
+        msg = f"{provider_name} request deadline exceeded"
+        raise DeadlineExceededError(msg) from e
+    logger.warning(
+        "%s error, retrying in %.1f seconds (attempt %d/%d): %s",
+        provider_name,
+        wait_time,
+        attempt + 1,
+        max_retries,
+        str(e),
+    )
+    return max(wait_time, 0.0)
+
+
+def retry_with_backoff(
+    func: Callable[..., T],
+    provider_name: str = "API",
+    max_retries: int = LLM_RETRY_MAX_ATTEMPTS,
+    initial_wait: float = LLM_RETRY_INITIAL_WAIT,
+    retryable_errors: tuple[type[BaseException], ...] = (),
+) -> Callable[..., T]:
+    """
+    Retry decorator for provider calls, guarded by the circuit breaker.
+
+    Args:
+        func: Function to retry
+        provider_name: Name of the provider for logging and its circuit breaker
+        max_retries: Maximum number of attempts
+        initial_wait: Initial wait time in seconds of the jittered backoff
+        retryable_errors: SDK specific error types to retry
+
+    Returns:
+        Wrapped function with retry logic
+
+    """
+    breaker = get_circuit_breaker(provider_name)
+
+    def wrapper(*args, **kwargs) -> T:  # noqa: ANN002, ANN003  # NOSONAR(S6796)
+        check_deadline()
+        breaker.before_call()
+        for attempt in range(max_retries):
+            try:
+                result = func(*args, **kwargs)
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                wait_time = _next_wait(
+                    e,
+                    attempt,
+                    max_retries=max_retries,
+                    initial_wait=initial_wait,
+                    provider_name=provider_name,
+                    retryable_errors=retryable_errors,
+                )
+                if wait_time is None:
+                    _record_outcome(breaker, e, retryable_errors)
+                    raise
+                breaker.record_retry()
+                time.sleep(wait_time)
+            else:
+                breaker.record_success()
+                return result
+        # This should never be reached, but satisfies type checker
+        msg = f"{provider_name} retry logic failed unexpectedly"
+        raise RuntimeError(msg)
+
+    return wrapper
+
+
+def async_retry_with_backoff(
+    func: Callable[..., Awaitable[T]],
+    provider_name: str = "API",
+    max_retries: int = LLM_RETRY_MAX_ATTEMPTS,
+    initial_wait: float = LLM_RETRY_INITIAL_WAIT,
+    retryable_errors: tuple[type[BaseException], ...] = (),
+) -> Callable[..., Awaitable[T]]:
+    """
+    Async variant of retry_with_backoff.
+
+    Waits via asyncio.sleep, so other requests keep being served in between.
+    """
+    breaker = get_circuit_breaker(provider_name)
+
+    async def wrapper(*args, **kwargs) -> T:  # noqa: ANN002, ANN003  # NOSONAR(S6796)
+        check_deadline()
+        breaker.before_call()
+        for attempt in range(max_retries):
+            try:
+                result = await func(*args, **kwargs)
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                wait_time = _next_wait(
+                    e,
+                    attempt,
+                    max_retries=max_retries,
+                    initial_wait=initial_wait,
+                    provider_name=provider_name,
+                    retryable_errors=retryable_errors,
+                )
+                if wait_time is None:
+                    _record_outcome(breaker, e, retryable_errors)
+                    raise
+                breaker.record_retry()
+                await asyncio.sleep(wait_time)
+            else:
+                breaker.record_success()
+                return result
+        # This should never be reached, but satisfies type checker
+        msg = f"{provider_name} retry logic failed unexpectedly"
+        raise RuntimeError(msg)
+
+    return wrapper
+
+
+def _record_outcome(
+    breaker: CircuitBreaker,
+    e: Exception,
+    retryable_errors: tuple[type[BaseException], ...],
+) -> None:
+    """Record a final error: transient errors count as provider failure."""
+    if is_retryable(e, retryable_errors):
+        breaker.record_failure()
+    else:
+        # the provider responded, e.g. 400 for an invalid request
+        breaker.record_success()
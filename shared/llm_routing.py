@@ -0,0 +1,249 @@
+"""
+Routing of LLM requests over an ordered chain of providers/models.
+
+- fallback: if a provider errors out, the next route of the chain is tried
+- hedging: if a provider has not answered within a percentile of its
+  observed latency, the next route is started in parallel.
+  The first answer wins, the other call is cancelled.
+- no fallback once the deadline of the request passed (see llm_deadline)
+"""
+
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TypeVar
+
+from .config import (
+    LLM_FALLBACK_CHAIN,
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_PERCENTILE,
+)
+from .llm_catalog import get_llm_models
+from .llm_deadline import DeadlineExceededError
+from .llm_provider import get_llm_provider
+from .llm_resilience import get_circuit_breaker
+
+logger = logging.getLogger(Path(__file__).stem)
+
+T = TypeVar("T")
+
+# latencies observed before the hedge delay is taken from them
+LATENCY_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+@dataclass(frozen=True)
+class Route:
+    """Provider (name of LLM_CATALOG) and model to send a request to."""
+
+    provider: str
+    model: str
+
+    def __str__(self) -> str:
+        """Return provider/model."""
+        return f"{self.provider}/{self.model}"
+
+
+def parse_chain(chain: str) -> list[Route]:
+    """
+    Parse the fallback chain config.
+
+    Comma-separated list of provider or provider/model, for example:
+    "OpenAI/gpt-5-nano, Mistral" (first model of the catalog if omitted)
+    """
+    routes = []
+    for item in chain.split(","):
+        if not item.strip():
+            continue
+        provider, _, model = (part.strip() for part in item.partition("/"))
+        routes.append(Route(provider, model or get_llm_models(provider)[0]))
+    return routes
+
+
+FALLBACK_ROUTES = parse_chain(LLM_FALLBACK_CHAIN)
+
+
+def get_routes(provider: str, model: str) -> list[Route]:
+    """
+    Return the requested route followed by the fallback chain.
+
+    Routes of providers with open circuit breaker are skipped,
+    unless no other route is left.
+    """
+    routes = [Route(provider, model)]
+    routes += [route for route in FALLBACK_ROUTES if route not in routes]
+    if len(routes) == 1:
+        return routes
+    available = []
+    for route in routes:
+        try:
+            llm_provider = get_llm_provider(route.provider)
+        except (ValueError, ImportError):
+            logger.exception("Skipping route %s", route)
+            continue
+        if not get_circuit_breaker(llm_provider.provider).is_open():
+            available.append(route)
+    return available or routes[:1]
+
+
+class LatencyTracker:
+    """Sliding window of the latencies of successful calls per route."""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        """Init the tracker, keeping the last window latencies per route."""
+        self.window = window
+        self._samples: dict[Route, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: Route, seconds: float) -> None:
+        """Record the latency of a successful call."""
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, route: Route, percentile: float) -> float | None:
+        """Return the percentile of the latencies, None if too few samples."""
+        with self._lock:
+            samples = list(self._samples.get(route, ()))
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return statistics.quantiles(samples, n=100)[round(percentile) - 1]
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """Return number of samples, median and p95 latency per route."""
+        with self._lock:
+            routes = {route: list(samples) for route, samples in self._samples.items()}
+        return {
+            str(route): {
+                "count": len(samples),
+                "p50": statistics.median(samples),
+                "p95": (
+                    statistics.quantiles(samples, n=100)[94]
+                    if len(samples) > 1
+                    else samples[0]
+                ),
+            }
+            for route, samples in routes.items()
+        }
+
+
+LATENCY = LatencyTracker()
+
+_stats = {"requests": 0, "hedged": 0, "hedge_won": 0, "fallbacks": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_routing_stats() -> dict[str, int]:
+    """Return the counters of hedged and fallback requests."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def hedge_delay(route: Route) -> float | None:
+    """Return seconds to wait for route before hedging, None if disabled."""
+    if not LLM_HEDGE_PERCENTILE:
+        return None
+    delay = LATENCY.percentile(route, LLM_HEDGE_PERCENTILE)
+    if delay is None:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return max(delay, LLM_HEDGE_MIN_DELAY)
+
+
+async def acall_routed(
+    routes: list[Route], func: Callable[[Route], Awaitable[T]]
+) -> tuple[T, Route]:
+    """
+    Await func(route) for the routes, with hedging and fallback.
+
+    Returns the first successful result and the route that answered.
+    Raises the error of the last route if all fail.
+    """
+    remaining = list(routes)
+    pending: dict[asyncio.Future[T], Route] = {}
+    error: Exception | None = None
+
+    async def call(route: Route) -> T:
+        started = time.monotonic()
+        result = await func(route)
+        LATENCY.record(route, time.monotonic() - started)
+        return result
+
+    def start_next() -> None:
+        route = remaining.pop(0)
+        pending[asyncio.ensure_future(call(route))] = route
+
+    _count("requests")
+    start_next()
+    try:
+        while pending:
+            # hedge at most one request in parallel to the first one
+            hedge = remaining and len(pending) == 1
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=hedge_delay(next(iter(pending.values()))) if hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                logger.info("Hedging request to %s", remaining[0])
+                _count("hedged")
+                start_next()
+                continue
+            for task in done:
+                route = pending.pop(task)
+                if (error := task.exception()) is None:  # type: ignore[assignment]
+                    if route != routes[0] and len(pending) > 0:
+                        _count("hedge_won")
+                    return task.result(), route
+                logger.warning("Route %s failed: %s", route, error)
+            # no fallback once the deadline of the request passed
+            if (
+                not pending
+                and remaining
+                and not isinstance(error, DeadlineExceededError)
+            ):
+                logger.warning("Falling back to %s", remaining[0])
+                _count("fallbacks")
+                start_next()
+    finally:
+        for task in pending:
+            task.cancel()
+    _count("failed")
+    assert error is not None
+    raise error
+
+
+async def astream_routed(
+    routes: list[Route], func: Callable[[Route], AsyncIterator[tuple[str, int]]]
+) -> AsyncIterator[tuple[Route, str, int]]:
+    """
+    Stream func(route) of the first route that answers, with fallback.
+
+    Yields the route with the text deltas and tokens of func.
+    Falls back to the next route only as long as no text was streamed yet.
+    """
+    _count("requests")
+    for i, route in enumerate(routes):
+        streamed = False
+        try:
+            async for delta, tokens in func(route):
+                streamed = streamed or bool(delta)
+                yield route, delta, tokens
+        except Exception as e:
+            if streamed or i == len(routes) - 1 or isinstance(e, DeadlineExceededError):
+                _count("failed")
+                raise
+            logger.warning("Route %s failed: %s", route, e)
+            _count("fallbacks")
+        else:
+            return
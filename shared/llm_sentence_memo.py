@@ -0,0 +1,186 @@
+"""
+Sentence memo of the correct mode, shared by the requests of all users.
+
+Many texts share boilerplate: signatures, legal footers, standard greetings.
+Their sentences are corrected once and then served from the memo; only the
+unseen sentences are sent upstream, consecutive ones together as context.
+Known neighbours are not sent along: the model may merge sentences across
+the boundary, and the answer of the unseen ones could not be cut out.
+
+Sentences are keyed by their normalized text, provider, model and
+instruction, so another model or a changed instruction does not reuse the
+corrections. The memo is an LRU of LLM_SENTENCE_MEMO_MAX sentences per worker.
+Corrections are remembered per sentence only if the response has as many
+sentences as the text sent, so they can be aligned, and only pairs similar
+enough (MIN_SIMILARITY), so a sentence merged with its neighbour and another
+one split in two are not served to other users as corrections.
+"""
+
+import asyncio
+import difflib
+import logging
+import threading
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+
+from .config import (
+    LLM_CACHE_ENABLED,
+    LLM_CHUNK_CONCURRENCY,
+    LLM_CHUNK_MAX_CHARS,
+    LLM_SENTENCE_MEMO_MAX,
+)
+from .llm_cache import acall_cached, cache_key
+from .llm_chunking import split_known, split_sentences, stitch
+from .llm_provider import LLMProvider
+
+logger = logging.getLogger(Path(__file__).stem)
+
+# min. difflib ratio of a sentence and its correction to remember the pair
+MIN_SIMILARITY = 0.8
+
+
+def sentence_key(provider: str, model: str, instruction: str, sentence: str) -> str:
+    """Return the key of the sentence, whitespace normalized."""
+    return cache_key(provider, model, instruction, " ".join(sentence.split()))
+
+
+class SentenceMemo:
+    """Per-worker LRU of corrected sentences, with hit counters."""
+
+    def __init__(self, max_entries: int) -> None:
+        """Init the memo, keeping at most max_entries sentences."""
+        self.max_entries = max_entries
+        self._sentences: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def get(self, key: str) -> str | None:
+        """Return the correction of the sentence, None if unseen."""
+        with self._lock:
+            correction = self._sentences.get(key)
+            if correction is None:
+                self._stats["misses"] += 1
+                return None
+            self._sentences.move_to_end(key)
+            self._stats["hits"] += 1
+            return correction
+
+    def put(self, key: str, correction: str) -> None:
+        """Remember the correction of the sentence, evict the least recent ones."""
+        with self._lock:
+            self._sentences[key] = correction
+            self._sentences.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._sentences) > self.max_entries:
+                self._sentences.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_stats(self) -> dict[str, float]:
+        """Return the counters, number of sentences and hit ratio."""
+        with self._lock:
+            stats: dict[str, float] = {**self._stats, "sentences": len(self._sentences)}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+# disabled with the LLM response cache
+SENTENCE_MEMO = SentenceMemo(
+    max_entries=LLM_SENTENCE_MEMO_MAX if LLM_CACHE_ENABLED else 0
+)
+
+
+def _sentences(text: str) -> list[str]:
+    return [sentence for sentence in split_sentences(text.strip()) if sentence.strip()]
+
+
+def _similar(sentence: str, correction: str) -> bool:
+    ratio = difflib.SequenceMatcher(
+        None, sentence.strip().casefold(), correction.strip().casefold()
+    ).ratio()
+    return ratio >= MIN_SIMILARITY
+
+
+def aligned_sentences(text: str, response: str) -> list[tuple[str, str]]:
+    """
+    Return the sentences of text with their corrections, [] if not aligned.
+
+    Pairs below MIN_SIMILARITY are left out, e.g. shifted by a merged and a
+    split sentence.
+    """
+    sentences = _sentences(text)
+    corrections = _sentences(response)
+    if len(sentences) != len(corrections):
+        logger.debug("Response does not align to the sentences, not remembered")
+        return []
+    pairs = [
+        (sentence, correction.strip())
+        for sentence, correction in zip(sentences, corrections, strict=True)
+        if _similar(sentence, correction)
+    ]
+    if len(pairs) < len(sentences):
+        logger.debug(
+            "%d sentences not similar, not remembered", len(sentences) - len(pairs)
+        )
+    return pairs
+
+
+async def acall_sentence_memo(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    memo: SentenceMemo = SENTENCE_MEMO,
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool, int]:
+    """
+    Call the LLM only for the sentences not found in the memo.
+
+    Runs of unseen sentences are sent as chunks of up to max_chars,
+    concurrently, without the known sentences around them. The results are
+    stitched with the memo hits, keeping the original whitespace and line
+    breaks. Without use_cache the memo is neither read nor written.
+    Returns response text, tokens consumed, whether no tokens were consumed
+    (memo or cache) and number of sentences served from the memo.
+    """
+    key = partial(sentence_key, llm_provider.provider, model, instruction)
+    parts = split_known(
+        split_sentences(prompt),
+        lambda sentence: memo.get(key(sentence)) if use_cache else None,
+        max_chars or LLM_CHUNK_MAX_CHARS,
+    )
+    reused = sum(correction is not None for _, correction in parts)
+    semaphore = asyncio.Semaphore(concurrency or LLM_CHUNK_CONCURRENCY)
+
+    async def process(chunk: str, correction: str | None) -> tuple[str, int, bool]:
+        if not chunk.strip():
+            return chunk, 0, True
+        if correction is not None:
+            return stitch(chunk, correction), 0, True
+        async with semaphore:
+            text, tokens, cached = await acall_cached(
+                llm_provider, model, instruction, chunk.strip(), use_cache=use_cache
+            )
+        if not text:
+            msg = "LLM returned empty response for chunk"
+            raise ValueError(msg)
+        if use_cache:
+            # difflib off the event loop
+            pairs = await asyncio.to_thread(aligned_sentences, chunk, text)
+            for sentence, corrected in pairs:
+                memo.put(key(sentence), corrected)
+        return stitch(chunk, text), tokens, cached
+
+    if reused:
+        logger.info("Sentence memo: %d sentences reused", reused)
+    results = await asyncio.gather(*(process(*part) for part in parts))
+    return (
+        "".join(r[0] for r in results),
+        sum(r[1] for r in results),
+        all(r[2] for r in results),
+        reused,
+    )
@@ -0,0 +1,186 @@
+"""
+Local estimation of the tokens of LLM requests.
+
+Counts word pieces of up to 4 characters and punctuation marks, close to the
+BPE tokenizers of the providers for German and English texts, with no
+tokenizer dependency. A factor per provider is calibrated (EWMA) against the
+total tokens the providers report for the upstream calls, less the hidden
+reasoning tokens of reasoning models, which are not part of the texts.
+
+The estimate is used to check the context and output budget of a model
+before calling it, and to size the chunks of texts exceeding it.
+"""
+
+import logging
+import math
+import re
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+
+from .llm_catalog import ProviderSpec
+from .mode_configs import ModeConfig
+
+logger = logging.getLogger(Path(__file__).stem)
+
+_TOKEN_PIECES = re.compile(r"\w{1,4}|[^\w\s]")
+
+# start factors per provider (LLMProvider.provider), until calibrated
+BASE_FACTORS = {"Google": 0.9, "Mistral": 1.1}
+CALIBRATION_ALPHA = 0.1
+# bounds of the factor
+MIN_FACTOR = 0.5
+MAX_FACTOR = 2.0
+# chunks are sized below the budget, as the estimate is approximate
+CHUNK_SAFETY = 0.8
+MIN_CHUNK_TOKENS = 100
+
+
+class TokenBudgetError(ValueError):
+    """Raised if a text exceeds the context or output budget of a model."""
+
+
+def count_pieces(text: str) -> int:
+    """Return the uncalibrated token estimate of the text."""
+    return len(_TOKEN_PIECES.findall(text))
+
+
+@dataclass
+class ReasoningTokens:
+    """Hidden reasoning tokens reported for an upstream call."""
+
+    tokens: int = 0
+
+
+_reasoning: ContextVar[ReasoningTokens | None] = ContextVar(
+    "llm_reasoning_tokens", default=None
+)
+
+
+@contextmanager
+def count_reasoning_tokens() -> Generator[ReasoningTokens, None, None]:
+    """Collect the reasoning tokens the provider reports for the call."""
+    reasoning = ReasoningTokens()
+    outer = _reasoning.get()
+    _reasoning.set(reasoning)
+    try:
+        yield reasoning
+    finally:
+        _reasoning.set(outer)
+
+
+def record_reasoning_tokens(tokens: int | None) -> None:
+    """Record the hidden reasoning tokens reported by a provider."""
+    if tokens and (reasoning := _reasoning.get()) is not None:
+        reasoning.tokens += tokens
+
+
+class TokenEstimator:
+    """Token estimate per provider, calibrated by the reported usage."""
+
+    def __init__(self, alpha: float = CALIBRATION_ALPHA) -> None:
+        """Init the estimator, alpha is the weight of a new observation."""
+        self.alpha = alpha
+        self._factors: dict[str, float] = dict(BASE_FACTORS)
+        self._samples: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def factor(self, provider: str) -> float:
+        """Return the current factor of tokens per piece of the provider."""
+        with self._lock:
+            return self._factors.get(provider, 1.0)
+
+    def estimate(self, provider: str, text: str) -> int:
+        """Return the estimated tokens of the text for the provider."""
+        return math.ceil(count_pieces(text) * self.factor(provider))
+
+    def calibrate(self, provider: str, pieces: int, tokens: int) -> None:
+        """Update the factor by the tokens reported for a call of pieces."""
+        if pieces <= 0 or tokens <= 0:
+            return  # no tokens reported
+        ratio = min(max(tokens / pieces, MIN_FACTOR), MAX_FACTOR)
+        with self._lock:
+            factor = self._factors.get(provider, 1.0)
+            self._factors[provider] = factor + self.alpha * (ratio - factor)
+            self._samples[provider] = self._samples.get(provider, 0) + 1
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """Return factor and number of calibrations per provider."""
+        with self._lock:
+            return {
+                provider: {"factor": factor, "samples": self._samples.get(provider, 0)}
+                for provider, factor in self._factors.items()
+            }
+
+
+TOKEN_ESTIMATOR = TokenEstimator()
+
+
+@dataclass(frozen=True)
+class TokenBudget:
+    """
+    Estimated tokens of a request.
+
+    Attributes:
+        input_tokens: Tokens of instruction and text
+        output_tokens: Tokens of the expected response
+        max_chars: Chunk size fitting the model, None if the text fits as a whole
+
+    """
+
+    input_tokens: int
+    output_tokens: int
+    max_chars: int | None = None
+
+    @property
+    def total_tokens(self) -> int:
+        """Return input and output tokens."""
+        return self.input_tokens + self.output_tokens
+
+
+def check_budget(
+    provider: str,
+    spec: ProviderSpec,
+    instruction: str,
+    text: str,
+    *,
+    mode_config: ModeConfig,
+) -> TokenBudget:
+    """
+    Return the token budget of a request to a model of the provider.
+
+    provider is the name of the LLMProvider instance, spec its catalog entry.
+    Texts of chunkable or map-reduce modes exceeding the budget get the chunk
+    size fitting it, else TokenBudgetError is raised.
+    """
+    instruction_tokens = TOKEN_ESTIMATOR.estimate(provider, instruction)
+    text_tokens = TOKEN_ESTIMATOR.estimate(provider, text)
+    output_tokens = math.ceil(text_tokens * mode_config.output_ratio)
+    budget = TokenBudget(instruction_tokens + text_tokens, output_tokens)
+    if budget.total_tokens <= spec.context_tokens and (
+        output_tokens <= spec.output_tokens
+    ):
+        return budget
+
+    msg = (
+        f"Text of about {text_tokens} tokens exceeds the budget of the model "
+        f"({spec.context_tokens} context, {spec.output_tokens} output tokens)"
+    )
+    # long texts of chunkable and map-reduce modes are processed in parts
+    if not (mode_config.chunkable or mode_config.map_instruction):
+        raise TokenBudgetError(msg)
+    # largest chunk whose input and response fit the model
+    chunk_tokens = (spec.context_tokens - instruction_tokens) / (
+        1 + mode_config.output_ratio
+    )
+    if mode_config.output_ratio > 0:
+        chunk_tokens = min(chunk_tokens, spec.output_tokens / mode_config.output_ratio)
+    if chunk_tokens < MIN_CHUNK_TOKENS:
+        raise TokenBudgetError(msg)
+    chars_per_token = len(text) / text_tokens
+    max_chars = int(chunk_tokens * chars_per_token * CHUNK_SAFETY)
+    logger.info("%s, splitting into chunks of %d chars", msg, max_chars)
+    return TokenBudget(budget.input_tokens, budget.output_tokens, max_chars)
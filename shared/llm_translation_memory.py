@@ -0,0 +1,408 @@
+"""
+Translation memory of the translate modes, per user.
+
+Users translate many near-identical documents, e.g. versioned specifications
+or recurring newsletters. The translations are stored per paragraph (segment)
+in SQLite file `translation_memory.sqlite`, shared by the workers of the host.
+Segments are scoped by user and instruction, so no text of a user reaches
+the prompt or response of another one:
+
+- exact matches are reused without an LLM call
+- similar segments are passed to the LLM as reference translations of the
+  changed segments, so terminology and wording stay consistent
+
+Similar segments are found via MinHash of their word bigrams: each segment is
+indexed by LSH_BANDS band hashes of its signature, a lookup is one indexed
+query for candidates sharing a band, ranked by the number of shared bands.
+The async path queries SQLite in a thread, off the event loop.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from .config import (
+    LLM_CACHE_ENABLED,
+    LLM_CHUNK_CONCURRENCY,
+    LLM_CHUNK_MAX_CHARS,
+    LLM_TRANSLATION_MEMORY_MAX,
+    LLM_TRANSLATION_MEMORY_MIN_SIMILARITY,
+)
+from .llm_cache import acall_cached
+from .llm_chunking import split_known, split_paragraphs, stitch
+from .llm_prompt_cache import instruction_key
+from .llm_provider import LLMProvider
+
+logger = logging.getLogger(Path(__file__).stem)
+
+TRANSLATION_MEMORY_DB_PATH = Path(__file__).parent.parent / "translation_memory.sqlite"
+
+# MinHash signature of 16 values, 8 bands of 2: segments with a similarity
+# of 0.6 share a band with a probability of 96%
+MINHASH_PERMUTATIONS = 16
+LSH_BANDS = 8
+# candidates compared per segment
+MAX_CANDIDATES = 8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# fixed, the signatures are shared by all workers
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8]) % _MERSENNE_PRIME
+        or 1,
+        int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8]) % _MERSENNE_PRIME,
+    )
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+_REFERENCES = """Referenzen
+- frühere Übersetzungen ähnlicher Absätze
+- Terminologie und Formulierungen übernehmen, nur die Abweichungen neu übersetzen
+"""
+
+
+def normalize_segment(text: str) -> str:
+    """Return the segment with normalized whitespace."""
+    return " ".join(text.split())
+
+
+def shingles(text: str) -> set[int]:
+    """Return the hashes of the word bigrams of the text, of its word if only one."""
+    words = text.lower().split()
+    grams = [f"{a} {b}" for a, b in itertools.pairwise(words)] or words
+    return {zlib.crc32(gram.encode()) for gram in grams}
+
+
+def similarity(a: set[int], b: set[int]) -> float:
+    """Return the Jaccard similarity of two shingle sets."""
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def band_hashes(scope: str, hashes: set[int]) -> list[int]:
+    """Return the LSH band hashes of the MinHash signature of the shingles."""
+    signature = [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS
+    ]
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                f"{scope}:{band}:{signature[band * rows : (band + 1) * rows]}".encode(),
+                digest_size=8,
+            ).digest(),
+            signed=True,
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+
+@dataclass(frozen=True)
+class TranslationMatch:
+    """Segment of the memory matching a segment of the text."""
+
+    source: str
+    target: str
+    similarity: float
+
+
+class TranslationMemory:
+    """Segment pairs of the translations in SQLite, with a MinHash index."""
+
+    def __init__(
+        self,
+        db_path: Path | None,
+        *,
+        max_segments: int = 100000,
+        min_similarity: float = 0.6,
+    ) -> None:
+        """Init the memory, db_path=None or max_segments=0 disables it."""
+        self.db_path = db_path
+        self.max_segments = max_segments
+        self.min_similarity = min_similarity
+        self.enabled = db_path is not None and max_segments > 0
+        self._lock = threading.Lock()
+        self._stats: dict[str, float] = {
+            "lookups": 0,
+            "exact": 0,
+            "fuzzy": 0,
+            "misses": 0,
+            "stores": 0,
+            "lookup_seconds": 0.0,
+        }
+        self._db_initialized = False
+
+    @contextmanager
+    def _connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """Connect to the memory, create the tables on first use."""
+        assert self.db_path is not None
+        con = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            if not self._db_initialized:
+                # WAL: readers of other workers are not blocked by a writer
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute("""
+                    CREATE TABLE IF NOT EXISTS tm_segments (
+                        key TEXT PRIMARY KEY,
+                        source TEXT NOT NULL,
+                        target TEXT NOT NULL,
+                        created REAL NOT NULL
+                    )
+                """)
+                con.execute("""
+                    CREATE TABLE IF NOT EXISTS tm_bands (
+                        band INTEGER NOT NULL,
+                        segment INTEGER NOT NULL
+                    )
+                """)
+                con.execute("CREATE INDEX IF NOT EXISTS tm_band ON tm_bands (band)")
+                con.execute(
+                    "CREATE INDEX IF NOT EXISTS tm_segment ON tm_bands (segment)"
+                )
+                self._db_initialized = True
+            yield con
+            con.commit()
+        finally:
+            con.close()
+
+    @staticmethod
+    def _scope(user_id: int, instruction: str) -> str:
+        return f"{user_id}:{instruction_key(instruction)}"
+
+    @staticmethod
+    def _key(scope: str, segment: str) -> str:
+        return hashlib.sha256(f"{scope}\x1f{segment}".encode()).hexdigest()
+
+    def _match(
+        self, con: sqlite3.Connection, scope: str, segment: str
+    ) -> TranslationMatch | None:
+        """Return the exact match of the segment, else the most similar one."""
+        row = con.execute(
+            "SELECT target FROM tm_segments WHERE key = ?",
+            (self._key(scope, segment),),
+        ).fetchone()
+        if row:
+            return TranslationMatch(segment, str(row[0]), 1.0)
+        hashes = shingles(segment)
+        bands = band_hashes(scope, hashes)
+        rows = con.execute(
+            "SELECT source, target FROM tm_segments WHERE rowid IN ("
+            " SELECT segment FROM tm_bands"
+            " WHERE band IN (SELECT value FROM json_each(?))"
+            " GROUP BY segment ORDER BY COUNT(*) DESC LIMIT ?)",
+            (json.dumps(bands), MAX_CANDIDATES),
+        ).fetchall()
+        best = max(
+            (
+                TranslationMatch(
+                    str(source), str(target), similarity(hashes, shingles(source))
+                )
+                for source, target in rows
+            ),
+            key=lambda match: match.similarity,
+            default=None,
+        )
+        return best if best and best.similarity >= self.min_similarity else None
+
+    def lookup(
+        self, user_id: int, instruction: str, segments: list[str]
+    ) -> dict[str, TranslationMatch]:
+        """Return the matches of the segments of the user, by normalized segment."""
+        texts = {normalize_segment(s) for s in segments} - {""}
+        if not self.enabled or not texts:
+            return {}
+        scope = self._scope(user_id, instruction)
+        started = time.perf_counter()
+        try:
+            with self._connection() as con:
+                matches = {text: self._match(con, scope, text) for text in texts}
+        except sqlite3.Error:
+            logger.exception("Translation memory read failed")
+            return {}
+        found = {text: match for text, match in matches.items() if match}
+        exact = sum(match.similarity == 1.0 for match in found.values())
+        with self._lock:
+            self._stats["lookups"] += len(texts)
+            self._stats["exact"] += exact
+            self._stats["fuzzy"] += len(found) - exact
+            self._stats["misses"] += len(texts) - len(found)
+            self._stats["lookup_seconds"] += time.perf_counter() - started
+        return found
+
+    def _insert(
+        self, con: sqlite3.Connection, scope: str, source: str, target: str
+    ) -> int:
+        """Insert the segment pair and its bands, return its rowid."""
+        segment = normalize_segment(source)
+        key = self._key(scope, segment)
+        # replaced with a new rowid, the newest one: its old bands would be
+        # orphans taking slots of the candidates
+        con.execute(
+            "DELETE FROM tm_bands WHERE segment IN"
+            " (SELECT rowid FROM tm_segments WHERE key = ?)",
+            (key,),
+        )
+        cursor = con.execute(
+            "INSERT OR REPLACE INTO tm_segments (key, source, target, created)"
+            " VALUES (?, ?, ?, ?)",
+            (key, segment, target.strip(), time.time()),
+        )
+        rowid = cursor.lastrowid or 0
+        con.executemany(
+            "INSERT INTO tm_bands (band, segment) VALUES (?, ?)",
+            [(band, rowid) for band in band_hashes(scope, shingles(segment))],
+        )
+        return rowid
+
+    def store(
+        self, user_id: int, instruction: str, pairs: list[tuple[str, str]]
+    ) -> None:
+        """Store the translations of the segments of the user, drop the oldest ones."""
+        if not self.enabled or not pairs:
+            return
+        scope = self._scope(user_id, instruction)
+        try:
+            with self._connection() as con:
+                rowids = [
+                    self._insert(con, scope, source, target) for source, target in pairs
+                ]
+                # rowids increase: the bands of replaced segments are dropped
+                # with the oldest segments
+                oldest = max(rowids) - self.max_segments
+                con.execute("DELETE FROM tm_segments WHERE rowid <= ?", (oldest,))
+                con.execute("DELETE FROM tm_bands WHERE segment <= ?", (oldest,))
+        except sqlite3.Error:
+            logger.exception("Translation memory write failed")
+            return
+        with self._lock:
+            self._stats["stores"] += len(pairs)
+
+    def get_stats(self) -> dict[str, float]:
+        """Return the counters and the mean lookup time per segment (µs)."""
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats.pop("lookup_seconds")
+        stats["lookup_us"] = (
+            round(seconds / stats["lookups"] * 1e6, 1) if stats["lookups"] else 0.0
+        )
+        return stats
+
+
+# disabled with the LLM response cache
+TRANSLATION_MEMORY = TranslationMemory(
+    db_path=TRANSLATION_MEMORY_DB_PATH if LLM_CACHE_ENABLED else None,
+    max_segments=LLM_TRANSLATION_MEMORY_MAX,
+    min_similarity=LLM_TRANSLATION_MEMORY_MIN_SIMILARITY,
+)
+
+
+def _segments(text: str) -> list[str]:
+    return [segment for segment in split_paragraphs(text.strip()) if segment.strip()]
+
+
+def aligned_segments(text: str, response: str) -> list[tuple[str, str]]:
+    """Return the paragraphs of text with their translations, [] if not aligned."""
+    segments = _segments(text)
+    translations = _segments(response)
+    if len(segments) != len(translations):
+        logger.debug("Response does not align to the paragraphs, not stored")
+        return []
+    return [
+        (segment.strip(), translation.strip())
+        for segment, translation in zip(segments, translations, strict=True)
+    ]
+
+
+def reference_instruction(instruction: str, references: list[TranslationMatch]) -> str:
+    """Return the instruction with the reference translations appended."""
+    if not references:
+        return instruction
+    lines = [
+        f"- Original: {match.source}\n  Übersetzung: {match.target}"
+        for match in references
+    ]
+    # appended: the instruction of the mode stays the cacheable prefix
+    return f"{instruction}{_REFERENCES}" + "\n".join(lines) + "\n"
+
+
+async def acall_translation_memory(  # noqa: PLR0913
+    llm_provider: LLMProvider,
+    model: str,
+    instruction: str,
+    prompt: str,
+    *,
+    user_id: int,
+    memory: TranslationMemory = TRANSLATION_MEMORY,
+    use_cache: bool = True,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> tuple[str, int, bool, int]:
+    """
+    Call the LLM only for the paragraphs not found in the translation memory.
+
+    Runs of other paragraphs are sent as chunks of up to max_chars,
+    concurrently, with the translations of similar paragraphs of the user
+    as references.
+    Returns response text, tokens consumed, whether no tokens were consumed
+    (memory or cache) and number of paragraphs reused.
+    """
+    paragraphs = split_paragraphs(prompt)
+    matches = (
+        await asyncio.to_thread(memory.lookup, user_id, instruction, paragraphs)
+        if use_cache
+        else {}
+    )
+
+    def exact(paragraph: str) -> str | None:
+        match = matches.get(normalize_segment(paragraph))
+        return match.target if match and match.similarity == 1.0 else None
+
+    parts = split_known(paragraphs, exact, max_chars or LLM_CHUNK_MAX_CHARS)
+    reused = sum(target is not None for _, target in parts)
+    semaphore = asyncio.Semaphore(concurrency or LLM_CHUNK_CONCURRENCY)
+    translated: list[tuple[str, str]] = []
+
+    async def process(chunk: str, target: str | None) -> tuple[str, int, bool]:
+        if not chunk.strip():
+            return chunk, 0, True
+        if target is not None:
+            return stitch(chunk, target), 0, True
+        references = [
+            match
+            for paragraph in split_paragraphs(chunk)
+            if (match := matches.get(normalize_segment(paragraph)))
+        ]
+        async with semaphore:
+            text, tokens, cached = await acall_cached(
+                llm_provider,
+                model,
+                reference_instruction(instruction, references),
+                chunk.strip(),
+                use_cache=use_cache,
+            )
+        if not text:
+            msg = "LLM returned empty response for chunk"
+            raise ValueError(msg)
+        translated.extend(aligned_segments(chunk, text))
+        return stitch(chunk, text), tokens, cached
+
+    if reused:
+        logger.info("Translation memory: %d paragraphs reused", reused)
+    results = await asyncio.gather(*(process(*part) for part in parts))
+    if use_cache:
+        await asyncio.to_thread(memory.store, user_id, instruction, translated)
+    return (
+        "".join(r[0] for r in results),
+        sum(r[1] for r in results),
+        all(r[2] for r in results),
+        reused,
+    )
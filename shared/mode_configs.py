@@ -4,6 +4,23 @@ from dataclasses import dataclass
 from typing import Literal
 
 
+@dataclass(frozen=True)
+class CascadeCheck:
+    """
+    Local checks of the answer of the cheap tier of the cheap-first cascade.
+
+    Attributes:
+        min_similarity: Min. difflib ratio of the answer to the text
+        max_length_change: Max. relative change of the length
+        keep_lines: The number of lines is kept, else the number of paragraphs
+
+    """
+
+    min_similarity: float
+    max_length_change: float
+    keep_lines: bool = False
+
+
 @dataclass(frozen=True)
 class ModeConfig:
     """
@@ -13,12 +30,41 @@ class ModeConfig:
         mode: The mode identifier string
         description: User-facing description (button text)
         instruction: LLM instruction for backend processing
+        cacheable: Serve repeated requests from the LLM response cache
+        chunkable: Long texts may be processed in chunks, paragraph by paragraph
+        incremental: Re-submitted documents only send their changed paragraphs
+        latency_slo: Seconds a response should take at most, for auto model selection
+        prefer_strong_model: Auto model selection picks the strongest model within
+            the latency SLO, else the fastest
+        output_ratio: Expected length of the response relative to the input text
+        timeout: Seconds until the request ends with a 504 (deadline), unless the
+            client requests another via X-Request-Timeout
+        map_instruction: Long texts are processed map-reduce: each section with
+            this instruction by the fast model, then the section results with
+            the instruction of the mode
+        sentence_memo: Sentences corrected before, for any user, are served from
+            the sentence memo, only unseen ones are sent
+        translation_memory: Paragraphs translated before are served from the
+            translation memory, similar ones are sent as references
+        cascade: The cheapest model answers first, the requested one only if
+            its answer fails these checks
 
     """
 
     mode: str
     description: str
     instruction: str
+    cacheable: bool = True
+    chunkable: bool = False
+    incremental: bool = False
+    latency_slo: float = 20.0
+    prefer_strong_model: bool = False
+    output_ratio: float = 1.0
+    timeout: float = 60.0
+    map_instruction: str | None = None
+    sentence_memo: bool = False
+    translation_memory: bool = False
+    cascade: CascadeCheck | None = None
 
 
 # Base instruction templates
@@ -31,6 +77,19 @@ Output Format
 - plain Text, keine Markdown-Formatierung
 """
 
+_INSTRUCTION_SUMMARIZE_SECTION = """
+Input
+- Abschnitt eines längeren Textes
+Task
+- Abschnitt in Stichpunkten zusammenfassen
+- alle wesentlichen Inhalte erhalten: Themen, Entscheidungen, Aufgaben, Zahlen, Namen
+Output
+- Stichpunkte
+- in derselben Sprache! Falls Eingabe in Englisch, dann Ausgabe in Englisch, etc
+- keine Kommentare
+- Format: plain Text mit Stichpunkten
+"""
+
 # Consolidated mode configurations
 MODE_CONFIGS = {
     "correct": ModeConfig(
@@ -48,6 +107,14 @@ Output
 - Struktur und Zeilenumbrüche nicht ändern
 - Format: plain Text, keine Markdown-Formatierung
 """,
+        chunkable=True,
+        incremental=True,
+        latency_slo=10.0,
+        sentence_memo=True,
+        timeout=30.0,
+        cascade=CascadeCheck(
+            min_similarity=0.8, max_length_change=0.2, keep_lines=True
+        ),
     ),
     "improve": ModeConfig(
         mode="improve",
@@ -64,6 +131,10 @@ Output
 - keine Kommentare
 - Format: plain Text, keine Markdown-Formatierung
 """,
+        chunkable=True,
+        latency_slo=30.0,
+        prefer_strong_model=True,
+        cascade=CascadeCheck(min_similarity=0.5, max_length_change=0.5),
     ),
     "summarize": ModeConfig(
         mode="summarize",
@@ -80,6 +151,8 @@ Output
 - keine Kommentare
 - Format: Markdown mit Abschnitten und Stichpunkten
 """,
+        output_ratio=0.3,
+        map_instruction=_INSTRUCTION_SUMMARIZE_SECTION,
     ),
     "expand": ModeConfig(
         mode="expand",
@@ -95,16 +168,26 @@ Output
 - keine Kommentare
 - Format: plain Text, keine Markdown-Formatierung.
 """,
+        # re-submitting bullet points is a request for a new variant of the text
+        cacheable=False,
+        latency_slo=30.0,
+        prefer_strong_model=True,
+        output_ratio=4.0,
+        timeout=90.0,
     ),
     "translate_de": ModeConfig(
         mode="translate_de",
         description="Übersetzen -> DE",
         instruction=_INSTRUCTION_TRANSLATE.replace("<LANG>", "Deutsche", 1),
+        chunkable=True,
+        translation_memory=True,
     ),
     "translate_en": ModeConfig(
         mode="translate_en",
         description="Übersetzen -> EN",
         instruction=_INSTRUCTION_TRANSLATE.replace("<LANG>", "Englische", 1),
+        chunkable=True,
+        translation_memory=True,
     ),
     "custom": ModeConfig(
         mode="custom",
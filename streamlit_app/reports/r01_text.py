@@ -8,6 +8,10 @@ from st_copy import copy_button
 
 from shared.config import LLM_PROVIDER_DEFAULT, LLM_PROVIDERS
 from shared.helper_db import db_insert_usage
+from shared.llm_cache import call_cached
+from shared.llm_catalog import get_llm_models
+from shared.llm_chunking import call_chunked, call_incremental
+from shared.llm_map_reduce import call_map_reduce
 from shared.llm_provider import get_llm_provider
 from shared.mode_configs import MODE_CONFIGS
 from shared.texts import GOOGLE_DISCLAIMER, LABEL_KI_TEXT, LABEL_MY_TEXT
@@ -33,10 +37,8 @@ if sel_llm != st.session_state["LLM_PROVIDER"]:
 
 LLM = st.session_state["LLM_PROVIDER"]  # shortcut
 
-llm_provider = get_llm_provider(LLM)
-
 # Model select
-MODELS = llm_provider.get_models()
+MODELS = get_llm_models(LLM)
 if "LLM_MODEL" not in st.session_state:
     st.session_state["LLM_MODEL"] = MODELS[0]
 
@@ -96,9 +98,38 @@ if submit_button:
     st.subheader(LABEL_KI_TEXT)
 
     with st.spinner("Schmelze Gletscher..."):
-        text_response, tokens = llm_provider.call(
-            model=MODEL, instruction=instruction, prompt=textarea_in
-        )
+        llm_provider = get_llm_provider(LLM)
+        mode_config = MODE_CONFIGS[selected_mode]
+        paragraphs_reused = 0
+        if mode_config.incremental:
+            # the session is the document: only changed paragraphs are sent
+            text_response, tokens, cached, paragraphs_reused = call_incremental(
+                llm_provider,
+                model=MODEL,
+                instruction=instruction,
+                prompt=textarea_in,
+                memory=st.session_state.setdefault("PARAGRAPH_MEMORY", {}),
+                use_cache=mode_config.cacheable,
+            )
+        elif mode_config.map_instruction:
+            # long texts are processed per section, then combined
+            text_response, tokens, cached, _ = call_map_reduce(
+                llm_provider,
+                model=MODEL,
+                instruction=instruction,
+                prompt=textarea_in,
+                map_instruction=mode_config.map_instruction,
+                use_cache=mode_config.cacheable,
+            )
+        else:
+            llm_call = call_chunked if mode_config.chunkable else call_cached
+            text_response, tokens, cached = llm_call(
+                llm_provider,
+                model=MODEL,
+                instruction=instruction,
+                prompt=textarea_in,
+                use_cache=mode_config.cacheable,
+            )
 
         db_insert_usage(user_id=USER_ID, tokens=tokens)
     st.session_state["cnt_requests"] += 1
@@ -142,4 +173,12 @@ if submit_button:
     st.subheader("Anweisung")
     st.code(language="markdown", body=instruction)
 
-    st.write(f"LLM: {LLM} | Model: {MODEL} | Tokens: {tokens}")
+    st.write(
+        f"LLM: {LLM} | Model: {MODEL} | Tokens: {tokens}"
+        + (" (Cache)" if cached else "")
+        + (
+            f" | Absätze wiederverwendet: {paragraphs_reused}"
+            if paragraphs_reused
+            else ""
+        )
+    )
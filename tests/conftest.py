@@ -6,6 +6,10 @@ import os
 # This ensures that shared.config loads with Mock LLM settings
 os.environ["LLM_PROVIDERS"] = "Mock"
 os.environ["LLM_MODEL"] = "random"
+# no LLM response cache, tests expect each request to reach the (mocked) provider
+os.environ["LLM_CACHE_ENABLED"] = "0"
+
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from fastapi.testclient import TestClient
@@ -31,3 +35,14 @@ def auth_token(client: TestClient) -> str:
 def auth_headers(auth_token: str) -> dict[str, str]:
     """Fixture to get authorization headers (shared across session)."""
     return {"Authorization": f"Bearer {auth_token}"}
+
+
+@pytest.fixture
+def upper_provider() -> MagicMock:
+    """LLM provider answering acall() with the prompt in upper case, 5 tokens."""
+    provider = MagicMock()
+    provider.provider = "Upper"
+    provider.acall = AsyncMock(
+        side_effect=lambda model, instruction, prompt: (prompt.upper(), 5)  # noqa: ARG005
+    )
+    return provider
@@ -0,0 +1,83 @@
+"""Tests for fastapi_app/disconnect.py cancellation on client disconnect."""
+
+import asyncio
+from collections.abc import AsyncIterator
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from fastapi_app.disconnect import (
+    ClientDisconnectedError,
+    await_unless_disconnected,
+    iterate_unless_disconnected,
+)
+
+
+def _http_request(*, disconnected: bool) -> MagicMock:
+    return MagicMock(is_disconnected=AsyncMock(return_value=disconnected))
+
+
+@pytest.fixture(autouse=True)
+def _fast_polling() -> None:
+    """Check the connection every 10 ms."""
+    with patch("fastapi_app.disconnect.DISCONNECT_POLL_INTERVAL", 0.01):
+        yield
+
+
+def test_result_is_returned_while_connected() -> None:
+    async def call() -> str:
+        await asyncio.sleep(0.05)
+        return "result"
+
+    http_request = _http_request(disconnected=False)
+    assert asyncio.run(await_unless_disconnected(http_request, call())) == "result"
+    http_request.is_disconnected.assert_awaited()
+
+
+def test_call_is_cancelled_on_disconnect() -> None:
+    cancelled = asyncio.Event()
+
+    async def slow_call() -> str:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "never"
+
+    async def run() -> None:
+        with pytest.raises(ClientDisconnectedError):
+            await await_unless_disconnected(
+                _http_request(disconnected=True), slow_call()
+            )
+        assert cancelled.is_set()
+
+    asyncio.run(run())
+
+
+def test_stream_is_closed_on_disconnect() -> None:
+    closed = asyncio.Event()
+    http_request = _http_request(disconnected=False)
+
+    async def stream() -> AsyncIterator[str]:
+        try:
+            yield "first"
+            http_request.is_disconnected.return_value = True
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.set()
+
+    items: list[str] = []
+
+    async def consume() -> None:
+        async for item in iterate_unless_disconnected(http_request, stream()):
+            items.append(item)  # noqa: PERF401
+
+    async def run() -> None:
+        with pytest.raises(ClientDisconnectedError):
+            await consume()
+        assert closed.is_set()
+
+    asyncio.run(run())
+    assert items == ["first"]
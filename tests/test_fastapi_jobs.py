@@ -0,0 +1,176 @@
+"""Tests for the job queue: FastAPI job endpoints and the job worker."""
+
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app.jobs import JobWorker, run_job
+from fastapi_app.schemas import BatchItemResult, TextResponse
+from shared import helper_db
+
+
+@pytest.fixture(autouse=True)
+def _job_db(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Job tables in a temporary SQLite database."""
+    monkeypatch.setattr(helper_db, "SQLITE_DB_PATH", tmp_path / "db.sqlite")
+
+
+def _submit(client: TestClient, auth_headers: dict[str, str], items: list) -> str:
+    response = client.post("/api/jobs", json={"items": items}, headers=auth_headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    return response.json()["id"]
+
+
+def _process_next_job() -> None:
+    """Claim and process one job, as the worker does in the background."""
+    job = helper_db.db_claim_job(lease_seconds=60)
+    assert job is not None
+    asyncio.run(JobWorker()._process(job))  # noqa: SLF001
+
+
+class TestJobs:
+    """Test submit, processing and polling of jobs."""
+
+    def test_submit_process_and_poll(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        job_id = _submit(
+            client,
+            auth_headers,
+            [
+                {"text": "Absatz eins\n\nAbsatz zwei", "mode": "correct"},
+                {"text": "kurz", "mode": "custom"},  # missing custom_instruction
+            ],
+        )
+
+        with (
+            patch("fastapi_app.jobs.LLM_CHUNK_MAX_CHARS", 10),
+            patch("fastapi_app.jobs.db_insert_usage") as mock_usage,
+        ):
+            _process_next_job()
+
+        response = client.get(f"/api/jobs/{job_id}?wait=5", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "done"
+        assert (data["chunks_total"], data["chunks_done"]) == (3, 3)
+        results = data["result"]["results"]
+        assert results[0]["response"]["text_ai"] == (
+            "Mocked Absatz eins response\n\nMocked Absatz zwei response"
+        )
+        assert results[0]["response"]["tokens_used"] == 246
+        assert results[1]["status_code"] == 400
+        assert data["result"]["failed"] == 1
+        mock_usage.assert_called_once_with(user_id=1, tokens=246, requests=1)
+
+    def test_resumes_unfinished_chunks(self) -> None:
+        helper_db.db_insert_job(
+            "job1",
+            user_id=1,
+            user_name="Torben",
+            request='{"items": [{"text": "eins\\n\\nzwei", "mode": "correct"}]}',
+        )
+        # the first chunk was done by a worker that died
+        done = BatchItemResult(
+            status_code=200,
+            response=TextResponse(
+                text_original="eins",
+                text_ai="EINS",
+                mode="correct",
+                tokens_used=5,
+                model="random",
+                provider="Mock",
+            ),
+        )
+        helper_db.db_insert_job_chunk("job1", 0, 0, done.model_dump_json())
+        job = helper_db.db_claim_job(lease_seconds=60)
+
+        with (
+            patch("fastapi_app.jobs.LLM_CHUNK_MAX_CHARS", 5),
+            patch("fastapi_app.jobs.db_insert_usage"),
+        ):
+            result = asyncio.run(run_job(job))  # type: ignore[arg-type]
+
+        response = result.results[0].response
+        assert response is not None
+        assert response.text_ai == "EINS\n\nMocked zwei response"
+        assert response.tokens_used == 5 + 123
+
+    def test_db_calls_run_off_the_event_loop(self) -> None:
+        helper_db.db_insert_job(
+            "job1",
+            user_id=1,
+            user_name="Torben",
+            request='{"items": [{"text": "eins", "mode": "correct"}]}',
+        )
+        job = helper_db.db_claim_job(lease_seconds=60)
+        threads = []
+
+        def recorded(name: str):
+            func = getattr(helper_db, name)
+
+            def call(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return func(*args, **kwargs)
+
+            return patch(f"fastapi_app.jobs.{name}", call)
+
+        with (
+            recorded("db_select_job_chunks"),
+            recorded("db_insert_job_chunk"),
+            recorded("db_update_job_progress"),
+            recorded("db_update_job_status"),
+            patch("fastapi_app.jobs.db_insert_usage"),
+        ):
+            asyncio.run(JobWorker()._process(job))  # type: ignore[arg-type]  # noqa: SLF001
+
+        assert len(threads) == 5
+        assert threading.main_thread() not in threads
+        assert helper_db.db_select_job("job1")["status"] == "done"  # type: ignore[index]
+
+    def test_poll_returns_progress_without_waiting(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        job_id = _submit(client, auth_headers, [{"text": "eins", "mode": "correct"}])
+
+        response = client.get(f"/api/jobs/{job_id}", headers=auth_headers)
+
+        assert response.json()["status"] == "queued"
+        assert response.json()["result"] is None
+
+    def test_unknown_job_returns_404(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        response = client.get("/api/jobs/unknown", headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_shutdown_hands_job_back_to_queue(self) -> None:
+        helper_db.db_insert_job(
+            "job1",
+            user_id=1,
+            user_name="Torben",
+            request='{"items": [{"text": "eins", "mode": "correct"}]}',
+        )
+        job = helper_db.db_claim_job(lease_seconds=60)
+
+        async def cancel_while_running() -> None:
+            task = asyncio.create_task(JobWorker()._process(job))  # type: ignore[arg-type]  # noqa: SLF001
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        async def slow_job(_: dict) -> None:
+            await asyncio.sleep(10)
+
+        with patch("fastapi_app.jobs.run_job", slow_job):
+            asyncio.run(cancel_while_running())
+
+        assert helper_db.db_select_job("job1")["status"] == "queued"  # type: ignore[index]
+
+    def test_jobs_without_authentication(self, client: TestClient) -> None:
+        response = client.post("/api/jobs", json={"items": [{"text": "eins"}]})
+        assert response.status_code == 401
@@ -0,0 +1,45 @@
+"""Tests for FastAPI metrics endpoint."""
+
+from fastapi.testclient import TestClient
+
+from fastapi_app.helper_fastapi import create_access_token
+from shared.llm_provider import get_llm_provider
+
+
+class TestMetrics:
+    """Test /api/metrics endpoint."""
+
+    def test_metrics_without_authentication(self, client: TestClient) -> None:
+        response = client.get("/api/metrics/")
+        assert response.status_code == 401
+
+    def test_metrics_non_admin_forbidden(self, client: TestClient) -> None:
+        token = create_access_token({"user_id": 2, "username": "Other"})
+        response = client.get(
+            "/api/metrics/", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 403
+
+    def test_metrics_admin(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        get_llm_provider("Mock")
+        response = client.get("/api/metrics/", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data["clients"]) == {"hits", "misses", "clients", "async_clients"}
+        assert data["providers"] == {"Mock": {}}
+        assert "hits_memory" in data["cache"]
+        assert "coalesced" in data["single_flight"]
+        assert "hedged" in data["routing"]
+        assert isinstance(data["model_stats"], dict)
+        assert isinstance(data["auto_model_decisions"], list)
+        assert isinstance(data["token_estimator"], dict)
+        assert data["aborted"].keys() == {"requests", "batches", "streams"}
+        assert isinstance(data["prompt_cache"], dict)
+        assert isinstance(data["rate_limits"], dict)
+        assert "map_tokens" in data["map_reduce"]
+        assert "hit_ratio" in data["sentence_memo"]
+        assert "lookup_us" in data["translation_memory"]
+        assert "escalation_rate" in data["cascade"]
+        assert data["output_caps"].keys() == {"capped_calls", "truncated", "aborted"}
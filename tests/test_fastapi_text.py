@@ -1,14 +1,31 @@
 """Tests for FastAPI text improvement endpoints."""
 
-from unittest.mock import patch
+import asyncio
+import json
+import time
+import weakref
+from collections.abc import AsyncIterator
+from unittest.mock import MagicMock, patch
 
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
+from fastapi_app.disconnect import get_aborted_stats
+from fastapi_app.routers.text import improve_text, improve_text_stream
+from fastapi_app.schemas import TextRequest, UserInfoInternal
+from shared.llm_cache import LLMResponseCache
+from shared.llm_catalog import ProviderSpec, get_llm_models
+from shared.llm_rate_limit import RateLimitError
+from shared.llm_resilience import CircuitOpenError
+from shared.llm_routing import Route
+
 
 class _FakeProvider:
     """Minimal LLM provider stub for exercising error paths."""
 
+    provider = "Fake"
+
     def __init__(
         self,
         response: tuple[str, int] = ("improved text", 10),
@@ -25,6 +42,26 @@ class _FakeProvider:
             raise self._error
         return self._response
 
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        return self.call(model, instruction, prompt)
+
+    async def astream(
+        self, model: str, instruction: str, prompt: str
+    ) -> AsyncIterator[tuple[str, int]]:
+        yield self.call(model, instruction, prompt)
+
+
+# catalog with a model of small context, texts of a few sentences exceed it
+SMALL_MODEL = {
+    "Mock": ProviderSpec(
+        module="llm_provider",
+        class_name="MockProvider",
+        models=("random",),
+        context_tokens=400,
+        output_tokens=200,
+    )
+}
+
 
 class TestImproveText:
     """Test /api/text endpoint for text improvement."""
@@ -67,6 +104,21 @@ class TestImproveText:
             "OpenAI_Azure",
         )
 
+    def test_get_config_for_other_provider(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """Config of a non-default provider is served from the static catalog."""
+        response = client.get("/api/config/?provider=Google", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["models"][0] == "gemini-2.5-flash-lite"
+
+    def test_get_config_unknown_provider(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """Unknown providers are rejected."""
+        response = client.get("/api/config/?provider=Nope", headers=auth_headers)
+        assert response.status_code == 400
+
     def test_improve_with_correct_mode(
         self, client: TestClient, auth_headers: dict[str, str]
     ) -> None:
@@ -144,6 +196,78 @@ class TestImproveText:
         assert data["model"] == models[0]
         assert "text_ai" in data
 
+    def test_improve_with_auto_model(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """Test that model 'auto' selects one of the provider's models."""
+        response = client.post(
+            "/api/text",
+            json={"text": "Test text", "mode": "correct", "model": "auto"},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        assert response.json()["model"] in get_llm_models("Mock")
+
+    def test_improve_with_cascade_escalation(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """Test that a cheap answer failing the checks escalates to the model."""
+        with patch("shared.llm_cascade.CASCADE_ROUTES", [Route("Mock", "cheap")]):
+            response = client.post(
+                "/api/text",
+                json={"text": "Hallo", "mode": "correct", "cascade": True},
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        # "Mocked Hallo response" changes the length too much
+        assert data["cascade_tier"] == "escalated"
+        assert data["model"] == "random"
+        assert data["tokens_used"] == 246
+
+    def test_cascade_only_if_requested(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """Test that the selected model is the only tier by default."""
+        with patch("shared.llm_cascade.CASCADE_ROUTES", [Route("Mock", "cheap")]):
+            response = client.post(
+                "/api/text",
+                json={"text": "Hallo", "mode": "correct"},
+                headers=auth_headers,
+            )
+
+        data = response.json()
+        assert data["cascade_tier"] is None
+        assert data["tokens_used"] == 123
+
+    def test_rejected_cheap_answer_is_not_remembered(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """Test that the document memory only keeps the accepted answer."""
+
+        def correct(text: str, *, cascade: bool) -> dict:
+            return client.post(
+                "/api/text",
+                json={
+                    "text": text,
+                    "mode": "correct",
+                    "document_id": "doc-cascade",
+                    "cascade": cascade,
+                },
+                headers=auth_headers,
+            ).json()
+
+        correct("Absatz eins", cascade=False)
+        with patch("shared.llm_cascade.CASCADE_ROUTES", [Route("Mock", "cheap")]):
+            data = correct("Absatz eins\n\nAbsatz zwei", cascade=True)
+
+        assert data["cascade_tier"] == "escalated"
+        # the rejected cheap answer did not replace the memory of the document
+        assert (data["paragraphs_reused"], data["cached"]) == (1, False)
+        assert data["tokens_used"] == 246
+
     def test_improve_with_expand_mode(
         self, client: TestClient, auth_headers: dict[str, str]
     ) -> None:
@@ -403,6 +527,128 @@ class TestErrorHandling:
         assert response.status_code == 500
         assert response.json()["detail"] == "Failed to process text. Please try again."
 
+    def test_improve_open_circuit_returns_503(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """A provider with open circuit breaker yields a 503 with Retry-After."""
+        with patch(
+            "fastapi_app.routers.text.get_llm_provider",
+            return_value=_FakeProvider(error=CircuitOpenError("open")),
+        ):
+            response = client.post(
+                "/api/text",
+                json={"text": "Test text", "mode": "correct"},
+                headers=auth_headers,
+            )
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+    def test_improve_rate_limit_returns_429(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """A request waiting too long for the rate limit yields a 429."""
+        with (
+            patch(
+                "fastapi_app.routers.text.get_llm_provider",
+                return_value=_FakeProvider(),
+            ),
+            patch(
+                "shared.llm_cache.RATE_GOVERNOR.aacquire",
+                side_effect=RateLimitError("limit", retry_after=12.3),
+            ),
+        ):
+            response = client.post(
+                "/api/text",
+                json={"text": "Rate limited text", "mode": "correct"},
+                headers=auth_headers,
+            )
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "13"
+
+    def test_improve_deadline_returns_504(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """A request without response before its deadline yields a 504."""
+        with patch(
+            "fastapi_app.routers.text.get_llm_provider",
+            return_value=_SlowProvider(),
+        ):
+            started = time.monotonic()
+            response = client.post(
+                "/api/text",
+                json={"text": "Text without timely answer", "mode": "correct"},
+                headers={**auth_headers, "X-Request-Timeout": "0.2"},
+            )
+        assert response.status_code == 504
+        assert time.monotonic() - started < 5
+
+    def test_improve_open_circuit_falls_back(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """With open circuit of the requested provider the fallback answers."""
+        providers = {"Mock": _FakeProvider(), "OpenAI": _FakeProvider()}
+        providers["Mock"].provider = "Mocked"
+
+        def breaker(name: str) -> MagicMock:
+            return MagicMock(is_open=MagicMock(return_value=name == "Mocked"))
+
+        with (
+            patch(
+                "shared.llm_routing.FALLBACK_ROUTES",
+                [Route("OpenAI", get_llm_models("OpenAI")[0])],
+            ),
+            patch("shared.llm_routing.get_circuit_breaker", side_effect=breaker),
+            patch(
+                "shared.llm_routing.get_llm_provider",
+                side_effect=providers.__getitem__,
+            ),
+            patch(
+                "fastapi_app.routers.text.get_llm_provider",
+                side_effect=providers.__getitem__,
+            ),
+        ):
+            response = client.post(
+                "/api/text",
+                json={"text": "Test text", "mode": "correct", "provider": "Mock"},
+                headers=auth_headers,
+            )
+        assert response.status_code == 200
+        assert response.json()["provider"] == "OpenAI"
+        assert response.json()["model"] == get_llm_models("OpenAI")[0]
+
+    def test_improve_provider_error_falls_back(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        """A failing provider is replaced by the next route of the chain."""
+        providers = {
+            "Mock": _FakeProvider(error=ConnectionError("down")),
+            "OpenAI": _FakeProvider(response=("fallback text", 7)),
+        }
+        with (
+            patch("shared.llm_routing.FALLBACK_ROUTES", [Route("OpenAI", "gpt")]),
+            patch(
+                "shared.llm_routing.get_llm_provider",
+                side_effect=providers.__getitem__,
+            ),
+            patch(
+                "fastapi_app.routers.text.get_llm_provider",
+                side_effect=providers.__getitem__,
+            ),
+            patch("fastapi_app.routers.text.db_insert_usage") as mock_usage,
+        ):
+            response = client.post(
+                "/api/text",
+                json={"text": "Test text", "mode": "correct", "provider": "Mock"},
+                headers=auth_headers,
+            )
+        data = response.json()
+        assert (data["text_ai"], data["provider"], data["model"]) == (
+            "fallback text",
+            "OpenAI",
+            "gpt",
+        )
+        mock_usage.assert_called_once_with(user_id=1, tokens=7, requests=1)
+
     def test_improve_usage_logging_failure_still_returns_200(
         self, client: TestClient, auth_headers: dict[str, str]
     ) -> None:
@@ -419,3 +665,468 @@ class TestErrorHandling:
         assert response.status_code == 200
         data = response.json()
         assert data["text_ai"] == "Mocked Test text response"
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    """Parse Server-Sent Events into (event, data) tuples."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestImproveTextStream:
+    """Test /api/text/stream endpoint (Server-Sent Events)."""
+
+    def test_stream_without_authentication(self, client: TestClient) -> None:
+        response = client.post(
+            "/api/text/stream", json={"text": "Hello world", "mode": "correct"}
+        )
+        assert response.status_code == 401
+
+    def test_stream_empty_text_returns_400(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        response = client.post(
+            "/api/text/stream",
+            json={"text": "   ", "mode": "correct"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+
+    def test_stream_deltas_and_done_event(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with patch("fastapi_app.routers.text.db_insert_usage") as mock_usage:
+            response = client.post(
+                "/api/text/stream",
+                json={"text": "Hello World", "mode": "correct"},
+                headers=auth_headers,
+            )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = _parse_sse(response.text)
+        deltas = [data["text"] for event, data in events if event == "delta"]
+        assert len(deltas) > 1
+        assert "".join(deltas) == "Mocked Hello World response"
+
+        event, data = events[-1]
+        assert event == "done"
+        assert data["text_ai"] == "Mocked Hello World response"
+        assert data["tokens_used"] == 123
+        assert data["provider"] == "Mock"
+        mock_usage.assert_called_once_with(user_id=1, tokens=123, requests=1)
+
+    def test_stream_provider_error_yields_error_event(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with (
+            patch(
+                "fastapi_app.routers.text.get_llm_provider",
+                return_value=_FakeProvider(error=RuntimeError("boom")),
+            ),
+            patch("fastapi_app.routers.text.db_insert_usage") as mock_usage,
+        ):
+            response = client.post(
+                "/api/text/stream",
+                json={"text": "Test text", "mode": "correct"},
+                headers=auth_headers,
+            )
+        assert response.status_code == 200
+        events = _parse_sse(response.text)
+        assert events == [
+            ("error", {"detail": "Failed to process text. Please try again."})
+        ]
+        mock_usage.assert_not_called()
+
+
+class TestResponseCache:
+    """Test the LLM response cache in front of the text endpoints."""
+
+    def test_repeated_request_is_served_from_cache(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with (
+            patch("shared.llm_cache.LLM_CACHE", LLMResponseCache()),
+            patch("fastapi_app.routers.text.db_insert_usage") as mock_usage,
+        ):
+            first = client.post(
+                "/api/text",
+                json={"text": "Cache me", "mode": "correct"},
+                headers=auth_headers,
+            ).json()
+            second = client.post(
+                "/api/text",
+                json={"text": "Cache me", "mode": "correct"},
+                headers=auth_headers,
+            ).json()
+
+        assert first["cached"] is False
+        assert second["cached"] is True
+        assert second["text_ai"] == first["text_ai"]
+        assert second["tokens_used"] == 0
+        assert [c.kwargs["tokens"] for c in mock_usage.call_args_list] == [123, 0]
+
+    def test_mode_opt_out_is_not_cached(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with patch("shared.llm_cache.LLM_CACHE", LLMResponseCache()):
+            for _ in range(2):
+                response = client.post(
+                    "/api/text",
+                    json={"text": "- Punkt", "mode": "expand"},
+                    headers=auth_headers,
+                )
+                assert response.json()["cached"] is False
+
+    def test_stream_is_stored_and_served_from_cache(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        cache = LLMResponseCache()
+        with patch("fastapi_app.routers.text.LLM_CACHE", cache):
+            for _ in range(2):
+                response = client.post(
+                    "/api/text/stream",
+                    json={"text": "Stream me", "mode": "correct"},
+                    headers=auth_headers,
+                )
+        events = _parse_sse(response.text)
+        assert events[0] == ("delta", {"text": "Mocked Stream me response"})
+        assert events[-1][1]["cached"] is True
+        assert cache.get_stats()["stores"] == 1
+
+
+class TestChunkedProcessing:
+    """Test chunked processing of long texts."""
+
+    def test_long_text_is_processed_in_chunks(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with (
+            patch("shared.llm_chunking.LLM_CHUNK_MAX_CHARS", 10),
+            # correct mode: the chunks of the sentences not in the sentence memo
+            patch("shared.llm_sentence_memo.LLM_CHUNK_MAX_CHARS", 10),
+            patch("fastapi_app.routers.text.db_insert_usage") as mock_usage,
+        ):
+            response = client.post(
+                "/api/text",
+                json={"text": "Absatz eins\n\nAbsatz zwei", "mode": "correct"},
+                headers=auth_headers,
+            )
+
+        data = response.json()
+        assert data["text_ai"] == (
+            "Mocked Absatz eins response\n\nMocked Absatz zwei response"
+        )
+        assert data["tokens_used"] == 246
+        mock_usage.assert_called_once_with(user_id=1, tokens=246, requests=1)
+
+    def test_non_chunkable_mode_is_sent_at_once(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with patch("shared.llm_chunking.LLM_CHUNK_MAX_CHARS", 10):
+            response = client.post(
+                "/api/text",
+                json={"text": "Absatz eins\n\nAbsatz zwei", "mode": "summarize"},
+                headers=auth_headers,
+            )
+
+        assert response.json()["tokens_used"] == 123
+
+
+class TestIncrementalCorrection:
+    """Test incremental re-correction of a document."""
+
+    def test_unchanged_paragraphs_are_reused(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        def correct(text: str) -> dict:
+            return client.post(
+                "/api/text",
+                json={"text": text, "mode": "correct", "document_id": "doc-1"},
+                headers=auth_headers,
+            ).json()
+
+        first = correct("Absatz eins")
+        second = correct("Absatz eins\n\nAbsatz zwei")
+
+        assert first["paragraphs_reused"] == 0
+        assert first["tokens_used"] == 123
+        assert second["paragraphs_reused"] == 1
+        assert second["tokens_used"] == 123
+        assert second["text_ai"] == (
+            "Mocked Absatz eins response\n\nMocked Absatz zwei response"
+        )
+
+    def test_without_document_id_nothing_is_reused(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        for _ in range(2):
+            response = client.post(
+                "/api/text",
+                json={"text": "Absatz eins\n\nAbsatz zwei", "mode": "correct"},
+                headers=auth_headers,
+            )
+            assert response.json()["paragraphs_reused"] == 0
+
+
+class TestTokenBudget:
+    """Test pre-flight token estimation and budgets."""
+
+    def test_dry_run_returns_estimate(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with (
+            patch("fastapi_app.routers.text.get_llm_provider") as mock_provider,
+            patch("fastapi_app.routers.text.db_insert_usage") as mock_usage,
+        ):
+            mock_provider.return_value = MagicMock(provider="Mocked")
+            response = client.post(
+                "/api/text",
+                json={"text": "Hallo Welt", "mode": "summarize", "dry_run": True},
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["text_ai"] == ""
+        assert data["tokens_used"] == 0
+        assert data["tokens_estimated"] > 0
+        mock_provider.return_value.acall.assert_not_called()
+        mock_usage.assert_not_called()
+
+    def test_oversized_text_returns_413(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with (
+            patch("fastapi_app.routers.text.LLM_CATALOG", SMALL_MODEL),
+            patch("fastapi_app.routers.text.get_llm_provider") as mock_provider,
+        ):
+            mock_provider.return_value = MagicMock(provider="Mocked")
+            response = client.post(
+                "/api/text",
+                json={"text": "wort " * 300, "mode": "expand"},
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 413
+        mock_provider.return_value.acall.assert_not_called()
+
+    def test_oversized_text_of_chunkable_mode_is_split(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with patch("fastapi_app.routers.text.LLM_CATALOG", SMALL_MODEL):
+            response = client.post(
+                "/api/text",
+                json={"text": "Satz eins. " * 100, "mode": "correct"},
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 200
+        # several chunks of 123 tokens each
+        assert response.json()["tokens_used"] > 123
+
+    def test_oversized_text_of_map_reduce_mode_is_split(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with patch("fastapi_app.routers.text.LLM_CATALOG", SMALL_MODEL):
+            response = client.post(
+                "/api/text",
+                # distinct sections, identical ones would be coalesced
+                json={
+                    "text": "".join(f"Satz {i}. " for i in range(100)),
+                    "mode": "summarize",
+                },
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        # several sections of 123 tokens each, one reduce call
+        assert data["tokens_by_stage"]["map"] > 123
+        assert data["tokens_by_stage"]["reduce"] == 123
+        assert data["tokens_used"] == sum(data["tokens_by_stage"].values())
+
+    def test_stream_oversized_text_returns_413(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        with patch("fastapi_app.routers.text.LLM_CATALOG", SMALL_MODEL):
+            response = client.post(
+                "/api/text/stream",
+                json={"text": "Satz eins. " * 100, "mode": "correct"},
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 413
+
+
+class TestBatch:
+    """Test /api/text/batch endpoint."""
+
+    def test_results_in_order_with_item_errors(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        items = [
+            {"text": "eins", "mode": "correct"},
+            {"text": "zwei", "mode": "custom"},  # missing custom_instruction
+            {"text": "drei", "mode": "summarize"},
+        ]
+        with patch("fastapi_app.routers.text.db_insert_usage") as mock_usage:
+            response = client.post(
+                "/api/text/batch", json={"items": items}, headers=auth_headers
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["status_code"] for r in data["results"]] == [200, 400, 200]
+        assert data["results"][0]["response"]["text_ai"] == "Mocked eins response"
+        assert data["results"][1]["error"] == (
+            "custom_instruction is required for custom mode"
+        )
+        assert data["results"][2]["response"]["text_ai"] == "Mocked drei response"
+        assert data["failed"] == 1
+        assert data["tokens_used"] == 246
+        # one aggregated usage record
+        mock_usage.assert_called_once_with(user_id=1, tokens=246, requests=2)
+
+    @pytest.mark.parametrize(
+        ("batch_limit", "user_limit", "expected"), [(3, 8, 3), (3, 2, 2)]
+    )
+    def test_concurrency_is_bounded(
+        self,
+        client: TestClient,
+        auth_headers: dict[str, str],
+        batch_limit: int,
+        user_limit: int,
+        expected: int,
+    ) -> None:
+        running = 0
+        max_running = 0
+
+        class SlowProvider(_FakeProvider):
+            async def acall(
+                self, model: str, instruction: str, prompt: str
+            ) -> tuple[str, int]:
+                nonlocal running, max_running
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+                return await super().acall(model, instruction, prompt)
+
+        items = [{"text": f"Text {i}", "mode": "summarize"} for i in range(10)]
+        with (
+            patch("fastapi_app.routers.text.LLM_BATCH_CONCURRENCY", batch_limit),
+            patch("fastapi_app.routers.text.LLM_BATCH_USER_CONCURRENCY", user_limit),
+            patch(
+                "fastapi_app.routers.text._user_semaphores", weakref.WeakKeyDictionary()
+            ),
+            patch(
+                "fastapi_app.routers.text.get_llm_provider",
+                return_value=SlowProvider(),
+            ),
+            patch("fastapi_app.routers.text.db_insert_usage"),
+        ):
+            response = client.post(
+                "/api/text/batch", json={"items": items}, headers=auth_headers
+            )
+
+        assert response.status_code == 200
+        assert response.json()["failed"] == 0
+        assert max_running == expected
+
+    def test_empty_batch_returns_422(
+        self, client: TestClient, auth_headers: dict[str, str]
+    ) -> None:
+        response = client.post(
+            "/api/text/batch", json={"items": []}, headers=auth_headers
+        )
+        assert response.status_code == 422
+
+    def test_batch_without_authentication(self, client: TestClient) -> None:
+        response = client.post(
+            "/api/text/batch", json={"items": [{"text": "eins", "mode": "correct"}]}
+        )
+        assert response.status_code == 401
+
+
+class _SlowProvider(_FakeProvider):
+    """Answers after a while, streams a first part at once."""
+
+    async def acall(self, model: str, instruction: str, prompt: str) -> tuple[str, int]:
+        await asyncio.sleep(10)
+        return await super().acall(model, instruction, prompt)
+
+    async def astream(
+        self,
+        model: str,  # noqa: ARG002
+        instruction: str,  # noqa: ARG002
+        prompt: str,  # noqa: ARG002
+    ) -> AsyncIterator[tuple[str, int]]:
+        yield "Erster Teil ", 0
+        await asyncio.sleep(10)
+        yield "never", 10
+
+
+class TestClientDisconnect:
+    """Test cancellation of the LLM call when the client disconnects."""
+
+    USER = UserInfoInternal(user_id=1, user_name="Torben")
+
+    @staticmethod
+    def _http_request() -> MagicMock:
+        """HTTP request whose client disconnects after 50 ms."""
+        disconnect_at = time.monotonic() + 0.05
+
+        async def is_disconnected() -> bool:
+            return time.monotonic() > disconnect_at
+
+        return MagicMock(is_disconnected=is_disconnected)
+
+    def test_improve_is_cancelled(self) -> None:
+        request = TextRequest(text="Abgebrochener Text", mode="summarize")
+        with (
+            patch("fastapi_app.disconnect.DISCONNECT_POLL_INTERVAL", 0.01),
+            patch(
+                "fastapi_app.routers.text.get_llm_provider",
+                return_value=_SlowProvider(),
+            ),
+            patch("fastapi_app.routers.text.db_insert_usage") as mock_usage,
+            pytest.raises(HTTPException) as e,
+        ):
+            asyncio.run(
+                asyncio.wait_for(
+                    improve_text(request, self.USER, self._http_request()), 2
+                )
+            )
+        assert e.value.status_code == 499
+        mock_usage.assert_not_called()
+
+    def test_stream_is_closed_and_consumed_tokens_logged(self) -> None:
+        request = TextRequest(text="Abgebrochener Text", mode="summarize")
+
+        async def consume() -> list[str]:
+            response = await improve_text_stream(
+                request, self.USER, self._http_request()
+            )
+            return [event async for event in response.body_iterator]
+
+        aborted = get_aborted_stats()["streams"]
+        with (
+            patch("fastapi_app.disconnect.DISCONNECT_POLL_INTERVAL", 0.01),
+            patch(
+                "fastapi_app.routers.text.get_llm_provider",
+                return_value=_SlowProvider(),
+            ),
+            patch("fastapi_app.routers.text.db_insert_usage") as mock_usage,
+        ):
+            events = asyncio.run(asyncio.wait_for(consume(), 2))
+
+        assert len(events) == 1
+        assert "Erster Teil" in str(events[0])
+        assert get_aborted_stats()["streams"] == aborted + 1
+        # not reported by the provider, estimated from prompt and streamed part
+        tokens = mock_usage.call_args.kwargs["tokens"]
+        assert 0 < tokens < 200
@@ -2,6 +2,7 @@
 
 import datetime as dt
 import sqlite3
+import time
 from unittest.mock import MagicMock, patch
 
 import mysql.connector
@@ -142,7 +143,8 @@ class TestUsageTracking:
         assert "ON CONFLICT" in query
         assert params[0] == dt.date.today().isoformat()  # noqa: DTZ011
         assert params[1] == 1
-        assert params[2] == 100
+        assert params[2] == 1  # requests
+        assert params[3] == 100
 
     @patch("shared.helper_db.ENV", "PROD")
     @patch("shared.helper_db.db_connection")
@@ -166,7 +168,8 @@ class TestUsageTracking:
         assert "ON DUPLICATE KEY UPDATE" in query
         assert params[0] == dt.date.today()  # noqa: DTZ011
         assert params[1] == 1
-        assert params[2] == 100
+        assert params[2] == 1  # requests
+        assert params[3] == 100
 
 
 class TestUsageStats:
@@ -304,6 +307,45 @@ class TestSQLiteDatabase:
         assert daily.iloc[0]["date"] == dt.date.today().isoformat()  # noqa: DTZ011
         assert daily.iloc[0]["cnt_requests"] == 2
 
+    def test_insert_aggregated_usage_real_db(
+        self, tmp_path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """A batch of requests is recorded in one write."""
+        monkeypatch.setattr(helper_db, "SQLITE_DB_PATH", tmp_path / "db.sqlite")
+        monkeypatch.setattr(helper_db, "LLM_PROVIDER_DEFAULT", "Mistral")
+
+        helper_db.db_insert_usage(user_id=1, tokens=100)
+        helper_db.db_insert_usage(user_id=1, tokens=500, requests=5)
+
+        total = db_select_usage_stats_total(user_id=1)
+        assert total.iloc[0]["cnt_requests"] == 6
+        assert total.iloc[0]["cnt_tokens"] == 600
+
+    def test_job_queue_real_db(self, tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Jobs are claimed once, taken over after the lease expired."""
+        monkeypatch.setattr(helper_db, "SQLITE_DB_PATH", tmp_path / "db.sqlite")
+        helper_db.db_insert_job("job1", user_id=1, user_name="Torben", request="{}")
+
+        job = helper_db.db_claim_job(lease_seconds=60)
+        assert job is not None
+        assert job["status"] == "running"
+        assert helper_db.db_claim_job(lease_seconds=60) is None
+        assert helper_db.db_select_job("job1", user_id=2) is None
+
+        helper_db.db_insert_job_chunk("job1", item=0, chunk=1, result="r")
+        helper_db.db_update_job_progress("job1", -1, chunks_total=2, chunks_done=1)
+        # lease expired: the job of a dead worker is taken over
+        job = helper_db.db_claim_job(lease_seconds=60)
+        assert job is not None
+        assert (job["chunks_total"], job["chunks_done"]) == (2, 1)
+        assert helper_db.db_select_job_chunks("job1") == {(0, 1): "r"}
+
+        helper_db.db_update_job_status("job1", "done", result="{}")
+        assert helper_db.db_select_job("job1")["status"] == "done"  # type: ignore[index]
+        helper_db.db_delete_jobs_before(time.time() + 1)
+        assert helper_db.db_select_job("job1") is None
+        assert helper_db.db_select_job_chunks("job1") == {}
+
     def test_sqlite_connection_error_reraises(
         self, tmp_path, monkeypatch: pytest.MonkeyPatch
     ) -> None:
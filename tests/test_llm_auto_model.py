@@ -0,0 +1,109 @@
+"""Tests for shared/llm_auto_model.py latency-aware model selection."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from shared.config import LLM_CHUNK_CONCURRENCY, LLM_CHUNK_MAX_CHARS
+from shared.llm_auto_model import (
+    ModelStats,
+    expected_tokens,
+    get_decisions,
+    select_model,
+)
+from shared.llm_tokens import TokenEstimator
+
+MODELS = ["small", "medium", "large"]
+
+
+@pytest.fixture(autouse=True)
+def _estimator() -> None:
+    """Uncalibrated token estimator."""
+    with patch("shared.llm_auto_model.TOKEN_ESTIMATOR", TokenEstimator()):
+        yield
+
+
+@pytest.fixture
+def stats() -> ModelStats:
+    """Fresh model stats, patched into the module."""
+    model_stats = ModelStats(alpha=0.5)
+    with patch("shared.llm_auto_model.MODEL_STATS", model_stats):
+        yield model_stats
+
+
+@pytest.fixture
+def provider() -> MagicMock:
+    """Provider stub with models ordered from fast to strong."""
+    return MagicMock(provider="Fake", get_models=MagicMock(return_value=MODELS))
+
+
+def test_record_ewma() -> None:
+    model_stats = ModelStats(alpha=0.5)
+    assert model_stats.expected_seconds("Fake", "small", 100) is None
+    model_stats.record("Fake", "small", 1.0, 100)
+    model_stats.record("Fake", "small", 1.0, 300)
+    assert model_stats.expected_seconds("Fake", "small", 200) == pytest.approx(1.0)
+    assert model_stats.get_stats()["Fake/small"]["count"] == 2
+
+
+def test_expected_tokens_counts_chunk_rounds() -> None:
+    short = expected_tokens("Fake", "correct", "x" * 400)
+    assert short == 200
+    long_text = "x" * LLM_CHUNK_MAX_CHARS * LLM_CHUNK_CONCURRENCY * 2
+    # chunks are processed concurrently, only two sequential rounds count:
+    # 2 * max chars / 4 chars per token, doubled for the response
+    assert expected_tokens("Fake", "correct", long_text) == LLM_CHUNK_MAX_CHARS
+    # summaries are shorter than the text
+    assert expected_tokens("Fake", "summarize", "x" * 400) < short
+
+
+def test_select_without_observations(stats: ModelStats, provider: MagicMock) -> None:  # noqa: ARG001
+    assert select_model(provider, "correct", "text") == "small"
+    assert select_model(provider, "improve", "text") == "large"
+    assert get_decisions()[-1]["model"] == "large"
+
+
+def test_select_skips_models_missing_the_slo(
+    stats: ModelStats, provider: MagicMock
+) -> None:
+    stats.record("Fake", "small", 1.0, 1000)
+    stats.record("Fake", "medium", 1.0, 500)
+    stats.record("Fake", "large", 1.0, 10)
+    text = "x" * 8000
+    # improve prefers the strongest model meeting its SLO
+    assert select_model(provider, "improve", text) == "medium"
+    # correct takes the fastest
+    assert select_model(provider, "correct", text) == "small"
+
+
+def test_select_fastest_if_none_meets_the_slo(
+    stats: ModelStats, provider: MagicMock
+) -> None:
+    for model in MODELS:
+        stats.record("Fake", model, 1.0, 1)
+    stats.record("Fake", "medium", 1.0, 2)
+    assert select_model(provider, "improve", "x" * 8000) == "medium"
+
+
+def test_record_fits_the_latency_offset() -> None:
+    model_stats = ModelStats(alpha=0.5)
+    # 0.5 seconds to the first token, then 100 tokens per second
+    for tokens in (100, 1000, 100, 1000):
+        model_stats.record("Fake", "small", 0.5 + tokens / 100, tokens)
+    stats = model_stats.get_stats()["Fake/small"]
+    assert stats["offset"] == pytest.approx(0.5)
+    assert stats["seconds_per_token"] == pytest.approx(0.01)
+    # a short request is dominated by the offset
+    assert model_stats.expected_seconds("Fake", "small", 10) == pytest.approx(0.6)
+
+
+def test_select_explores_unobserved_models(
+    stats: ModelStats, provider: MagicMock
+) -> None:
+    stats.record("Fake", "small", 1.0, 1000)
+    assert select_model(provider, "correct", "text") == "medium"
+    stats.record("Fake", "medium", 1.0, 10)
+    assert select_model(provider, "correct", "text") == "large"
+    stats.record("Fake", "large", 1.0, 10)
+    # all observed: the fastest
+    assert select_model(provider, "correct", "text") == "small"
@@ -0,0 +1,173 @@
+"""Tests for shared/llm_cache.py LLM response cache."""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+from shared.llm_cache import (
+    EVICTION_INTERVAL,
+    LLMResponseCache,
+    acall_cached,
+    cache_key,
+    call_cached,
+)
+from shared.llm_provider import MockProvider
+from shared.llm_tokens import TokenEstimator, record_reasoning_tokens
+
+
+def test_cache_key_normalizes_text_but_not_instruction() -> None:
+    key = cache_key("P", "m", "instr", "Hallo Welt")
+    assert key == cache_key("P", "m", "instr", "  Hallo Welt\r\n")
+    assert key != cache_key("P", "m", "other instr", "Hallo Welt")
+    assert key != cache_key("P", "other model", "instr", "Hallo Welt")
+    assert key != cache_key("P", "m", "instr", "Hallo\nWelt")
+
+
+def test_memory_tier_hit_and_miss() -> None:
+    cache = LLMResponseCache()
+    assert cache.get("k") is None
+    cache.put("k", "text", 42)
+    assert cache.get("k") == ("text", 42)
+    stats = cache.get_stats()
+    assert stats["misses"] == 1
+    assert stats["hits_memory"] == 1
+    assert stats["stores"] == 1
+
+
+def test_lru_eviction() -> None:
+    cache = LLMResponseCache(max_entries=2)
+    cache.put("a", "A", 1)
+    cache.put("b", "B", 1)
+    cache.get("a")  # a is now most recently used
+    cache.put("c", "C", 1)
+    assert cache.get("b") is None
+    assert cache.get("a") == ("A", 1)
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_ttl_expiry() -> None:
+    cache = LLMResponseCache(ttl=10)
+    with patch("shared.llm_cache.time.time", return_value=1000.0):
+        cache.put("k", "text", 1)
+    with patch("shared.llm_cache.time.time", return_value=1011.0):
+        assert cache.get("k") is None
+
+
+def test_empty_response_and_disabled_cache_store_nothing() -> None:
+    cache = LLMResponseCache()
+    cache.put("k", "", 1)
+    assert cache.get("k") is None
+
+    disabled = LLMResponseCache(enabled=False)
+    disabled.put("k", "text", 1)
+    assert disabled.get("k") is None
+
+
+def test_sqlite_tier_is_shared_between_instances(tmp_path) -> None:
+    db_path = tmp_path / "cache.sqlite"
+    worker_1 = LLMResponseCache(db_path=db_path)
+    worker_2 = LLMResponseCache(db_path=db_path)
+
+    worker_1.put("k", "text", 7)
+
+    assert worker_2.get("k") == ("text", 7)
+    assert worker_2.get_stats()["hits_sqlite"] == 1
+    # promoted to the memory tier
+    assert worker_2.get("k") == ("text", 7)
+    assert worker_2.get_stats()["hits_memory"] == 1
+
+
+def test_sqlite_tier_evicts_periodically(tmp_path) -> None:
+    cache = LLMResponseCache(db_path=tmp_path / "cache.sqlite", db_max_entries=2)
+    with patch("shared.llm_cache.time.time", return_value=1000.0):
+        cache.put("a", "A", 1)
+    with patch("shared.llm_cache.time.time", return_value=1001.0):
+        cache.put("b", "B", 1)
+    with patch("shared.llm_cache.time.time", return_value=1002.0):
+        cache.put("c", "C", 1)
+    # evicted on the next store after the interval, the oldest entry first
+    with patch("shared.llm_cache.time.time", return_value=1000.0 + EVICTION_INTERVAL):
+        cache.put("d", "D", 1)
+    with cache._sqlite_connection() as con:  # noqa: SLF001
+        keys = [row[0] for row in con.execute("SELECT key FROM llm_cache")]
+        plan = con.execute(
+            "EXPLAIN QUERY PLAN SELECT key FROM llm_cache ORDER BY created"
+        ).fetchall()
+    assert sorted(keys) == ["c", "d"]
+    assert "llm_cache_created" in str(plan)
+
+
+def test_async_sqlite_tier(tmp_path) -> None:
+    db_path = tmp_path / "cache.sqlite"
+
+    async def put_and_get() -> tuple[str, int] | None:
+        await LLMResponseCache(db_path=db_path).aput("k", "text", 7)
+        return await LLMResponseCache(db_path=db_path).aget("k")
+
+    assert asyncio.run(put_and_get()) == ("text", 7)
+
+
+def test_call_cached_hit_consumes_no_tokens() -> None:
+    provider = MockProvider()
+    with patch("shared.llm_cache.LLM_CACHE", LLMResponseCache()):
+        first = call_cached(provider, "random", "instr", "Hi")
+        second = call_cached(provider, "random", "instr", "Hi")
+    assert first == ("Mocked Hi response", 123, False)
+    assert second == ("Mocked Hi response", 0, True)
+
+
+def test_call_cached_opt_out() -> None:
+    provider = MagicMock()
+    provider.provider = "P"
+    provider.call.return_value = ("text", 5)
+    with patch("shared.llm_cache.LLM_CACHE", LLMResponseCache()):
+        call_cached(provider, "m", "instr", "Hi", use_cache=False)
+        result = call_cached(provider, "m", "instr", "Hi", use_cache=False)
+    assert result == ("text", 5, False)
+    assert provider.call.call_count == 2
+
+
+def test_acall_cached_hit() -> None:
+    provider = MockProvider()
+
+    async def call_twice() -> list[tuple[str, int, bool]]:
+        return [await acall_cached(provider, "random", "instr", "Hi") for _ in "ab"]
+
+    with patch("shared.llm_cache.LLM_CACHE", LLMResponseCache()):
+        results = asyncio.run(call_twice())
+    assert [r[2] for r in results] == [False, True]
+
+
+def test_acall_cached_coalesces_concurrent_calls() -> None:
+    provider = MagicMock()
+    provider.provider = "P"
+
+    async def slow_acall(**_kwargs: str) -> tuple[str, int]:
+        await asyncio.sleep(0.01)
+        return "text", 5
+
+    provider.acall.side_effect = slow_acall
+
+    async def call_concurrently() -> list[tuple[str, int, bool]]:
+        return await asyncio.gather(
+            *(acall_cached(provider, "m", "instr", "Hi", use_cache=False) for _ in "ab")
+        )
+
+    results = asyncio.run(call_concurrently())
+    assert results == [("text", 5, False), ("text", 0, True)]
+    assert provider.acall.call_count == 1
+
+
+def test_reasoning_tokens_are_not_calibrated() -> None:
+    provider = MagicMock()
+    provider.provider = "Reasoning"
+
+    async def reasoning_acall(**_kwargs: str) -> tuple[str, int]:
+        record_reasoning_tokens(95)
+        return "eins zwei", 100
+
+    provider.acall.side_effect = reasoning_acall
+    estimator = TokenEstimator(alpha=1)
+    with patch("shared.llm_cache.TOKEN_ESTIMATOR", estimator):
+        asyncio.run(acall_cached(provider, "m", "", "eins zwei", use_cache=False))
+    # 5 tokens of prompt and response for 4 word pieces
+    assert estimator.factor("Reasoning") == 1.25
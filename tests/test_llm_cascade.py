@@ -0,0 +1,136 @@
+"""Tests for shared/llm_cascade.py cheap-first model cascade."""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from shared.llm_cascade import (
+    CASCADE_STATS,
+    MAX_SIMILARITY_CHARS,
+    CallResult,
+    acall_cascade,
+    cheap_route,
+    failed_check,
+)
+from shared.llm_catalog import get_llm_models
+from shared.llm_deadline import DeadlineExceededError, request_deadline
+from shared.llm_routing import Route
+from shared.mode_configs import MODE_CONFIGS, CascadeCheck
+
+CHECK = CascadeCheck(min_similarity=0.8, max_length_change=0.2, keep_lines=True)
+TEXT = "Hallo Welt,\ndas ist ein Tset mit Fehlern."
+CORRECTED = "Hallo Welt,\ndas ist ein Test mit Fehlern."
+
+CHEAP = Route("OpenAI", "nano")
+STRONG = Route("OpenAI", "strong")
+
+
+def _call(answers: dict[str, str | Exception]):
+    """Return the call of the routes, answering by model with 10 tokens."""
+    calls: list[Route] = []
+
+    async def call(route: Route) -> CallResult:
+        calls.append(route)
+        answer = answers[route.model]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer, 10, False, {}
+
+    return call, calls
+
+
+def _cascade(call, check: CascadeCheck | None = CHECK):
+    with patch("shared.llm_cascade.CASCADE_ROUTES", [CHEAP]):
+        return asyncio.run(acall_cascade([STRONG], call, text=TEXT, check=check))
+
+
+def test_failed_check() -> None:
+    assert failed_check(TEXT, CORRECTED, CHECK) is None
+    assert failed_check(TEXT, " ", CHECK) == "empty"
+    assert failed_check(TEXT, CORRECTED * 2, CHECK) == "length"
+    assert failed_check(TEXT, CORRECTED.replace("\n", " "), CHECK) == "structure"
+    assert failed_check(
+        TEXT, "Servus Leute,\nganz anderer Satz ohne Fehler.", CHECK
+    ) == ("similarity")
+    # improve: the paragraphs are kept, the lines may change
+    improve = MODE_CONFIGS["improve"].cascade
+    assert improve is not None
+    assert failed_check(TEXT, CORRECTED.replace("\n", " "), improve) is None
+
+
+def test_similarity_is_compared_per_line() -> None:
+    # a changed line weighs by its length
+    text = "Kurz.\n" + "Eine lange Zeile ohne jeden Fehler, die gleich bleibt. " * 3
+    answer = "Anders.\n" + "Eine lange Zeile ohne jeden Fehler, die gleich bleibt. " * 3
+    assert failed_check(text, answer, CHECK) is None
+
+
+def test_similarity_is_skipped_for_long_texts() -> None:
+    line = "ein Satz mit Fehler "
+    text = "\n".join([line * 10] * (MAX_SIMILARITY_CHARS // 200 + 1))
+    other = "\n".join([line[::-1] * 10] * (MAX_SIMILARITY_CHARS // 200 + 1))
+    assert len(text) > MAX_SIMILARITY_CHARS
+    assert failed_check(text, other, CHECK) is None
+    assert failed_check(text[:1000], other[:1000], CHECK) == "similarity"
+
+
+def test_cheap_route() -> None:
+    cheapest = get_llm_models("OpenAI")[0]
+    assert cheap_route(STRONG) == Route("OpenAI", cheapest)
+    assert cheap_route(Route("OpenAI", cheapest)) is None
+    with patch("shared.llm_cascade.CASCADE_ROUTES", [CHEAP]):
+        assert cheap_route(Route("Google", "pro")) == CHEAP
+
+
+def test_cheap_answer_passing_the_checks_is_used() -> None:
+    call, calls = _call({"nano": CORRECTED, "strong": CORRECTED})
+    before = CASCADE_STATS.get_stats()
+    result, route, tier = _cascade(call)
+    assert (result[0], result[1], route, tier) == (CORRECTED, 10, CHEAP, "cheap")
+    assert calls == [CHEAP]
+    assert CASCADE_STATS.get_stats()["cheap"] == before["cheap"] + 1
+
+
+def test_failed_check_escalates() -> None:
+    call, calls = _call({"nano": "Hallo", "strong": CORRECTED})
+    before = CASCADE_STATS.get_stats()
+    result, route, tier = _cascade(call)
+    # the tokens of both tiers are accounted
+    assert (result[0], result[1], route, tier) == (CORRECTED, 20, STRONG, "escalated")
+    assert calls == [CHEAP, STRONG]
+    stats = CASCADE_STATS.get_stats()
+    assert stats["escalated"] == before["escalated"] + 1
+    assert stats["reason_length"] == before.get("reason_length", 0) + 1
+    assert 0 < stats["escalation_rate"] <= 1
+
+
+def test_error_of_the_cheap_tier_escalates() -> None:
+    call, calls = _call({"nano": ValueError("boom"), "strong": CORRECTED})
+    result, route, tier = _cascade(call)
+    assert (result[1], route, tier) == (10, STRONG, "escalated")
+    assert calls == [CHEAP, STRONG]
+
+
+def test_modes_without_check_are_not_cascaded() -> None:
+    call, calls = _call({"nano": CORRECTED, "strong": CORRECTED})
+    _, route, tier = _cascade(call, check=None)
+    assert (route, tier) == (STRONG, None)
+    assert calls == [STRONG]
+
+
+def test_no_escalation_after_the_deadline() -> None:
+    async def slow(_route: Route) -> CallResult:
+        await asyncio.sleep(1)
+        return CORRECTED, 10, False, {}
+
+    async def cascade() -> None:
+        with request_deadline(1.5):
+            await acall_cascade([STRONG], slow, text=TEXT, check=CHECK)
+
+    # the cheap tier ends after half of the time, too late for the strong one
+    with (
+        patch("shared.llm_cascade.CASCADE_ROUTES", [CHEAP]),
+        pytest.raises(DeadlineExceededError),
+    ):
+        asyncio.run(cascade())
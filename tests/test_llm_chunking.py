@@ -0,0 +1,223 @@
+"""Tests for shared/llm_chunking.py chunked processing of long texts."""
+
+import asyncio
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from shared.llm_chunking import (
+    DocumentMemory,
+    acall_chunked,
+    acall_incremental,
+    call_chunked,
+    call_incremental,
+    split_known,
+    split_sentences,
+    split_text,
+)
+
+TEXT = "Erster Absatz. Noch ein Satz.\n\nZweiter Absatz.\n\n\nDritter Absatz.\n"
+
+
+def _upper_provider() -> MagicMock:
+    """Provider answering with the upper-cased, stripped prompt."""
+    provider = MagicMock()
+    provider.provider = "Upper"
+    provider.call.side_effect = lambda model, instruction, prompt: (  # noqa: ARG005
+        f" {prompt.upper()}\n",
+        10,
+    )
+    return provider
+
+
+class TestSplitText:
+    """Test splitting at paragraph and sentence boundaries."""
+
+    def test_chunks_concatenate_to_original(self) -> None:
+        for max_chars in (5, 20, 40, 1000):
+            assert "".join(split_text(TEXT, max_chars)) == TEXT
+
+    def test_short_text_is_one_chunk(self) -> None:
+        assert split_text(TEXT, 1000) == [TEXT]
+
+    def test_split_known_keeps_the_text(self) -> None:
+        text = "Hallo. Bekannt.\n\nNeu."
+        parts = split_known(
+            split_sentences(text), {"Bekannt.\n\n": "BEKANNT."}.get, 1000
+        )
+        assert "".join(part for part, _ in parts) == text
+        assert [result for _, result in parts] == [None, "BEKANNT.", None]
+
+    def test_splits_at_paragraphs(self) -> None:
+        assert split_text(TEXT, 32) == [
+            "Erster Absatz. Noch ein Satz.\n\n",
+            "Zweiter Absatz.\n\n\n",
+            "Dritter Absatz.\n",
+        ]
+
+    def test_long_paragraph_is_split_at_sentences(self) -> None:
+        assert split_text("Eins. Zwei! Drei?", 8) == ["Eins. ", "Zwei! ", "Drei?"]
+
+    def test_long_paragraph_is_split_at_lines(self) -> None:
+        assert split_text("- eins\n- zwei", 8) == ["- eins\n", "- zwei"]
+
+
+class TestCallChunked:
+    """Test chunked LLM calls."""
+
+    def test_stitches_results_keeping_line_breaks(self) -> None:
+        provider = _upper_provider()
+        text, tokens, cached = call_chunked(
+            provider, "m", "instr", TEXT, use_cache=False, max_chars=32
+        )
+        assert text == TEXT.upper()
+        assert tokens == 30
+        assert cached is False
+        assert provider.call.call_count == 3
+
+    def test_short_text_is_sent_unchanged(self) -> None:
+        provider = _upper_provider()
+        call_chunked(provider, "m", "instr", TEXT, use_cache=False, max_chars=1000)
+        provider.call.assert_called_once_with(
+            model="m", instruction="instr", prompt=TEXT
+        )
+
+    def test_empty_chunk_response_raises(self) -> None:
+        provider = MagicMock()
+        provider.provider = "Empty"
+        provider.call.return_value = ("", 0)
+        with pytest.raises(ValueError, match="empty response"):
+            call_chunked(provider, "m", "instr", TEXT, use_cache=False, max_chars=32)
+
+
+class TestAcallChunked:
+    """Test chunked async LLM calls."""
+
+    def test_stitches_results_with_bounded_concurrency(self) -> None:
+        provider = _upper_provider()
+        running = {"now": 0, "max": 0}
+
+        async def acall(model: str, instruction: str, prompt: str) -> tuple[str, int]:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            return provider.call(model, instruction, prompt)
+
+        provider.acall.side_effect = acall
+        text, tokens, _ = asyncio.run(
+            acall_chunked(
+                provider,
+                "m",
+                "instr",
+                TEXT,
+                use_cache=False,
+                max_chars=32,
+                concurrency=2,
+            )
+        )
+        assert text == TEXT.upper()
+        assert tokens == 30
+        assert running["max"] == 2
+
+
+class TestIncremental:
+    """Test incremental processing of re-submitted documents."""
+
+    def test_only_changed_paragraphs_are_sent(self) -> None:
+        provider = _upper_provider()
+        memory: dict[str, str] = {}
+
+        text, tokens, cached, reused = call_incremental(
+            provider, "m", "instr", TEXT, memory=memory, use_cache=False
+        )
+        # the new paragraphs are sent together
+        assert (text, tokens, cached, reused) == (TEXT.upper(), 10, False, 0)
+        assert len(memory) == 3
+
+        edited = TEXT.replace("Zweiter", "Geänderter")
+        text, tokens, cached, reused = call_incremental(
+            provider, "m", "instr", edited, memory=memory, use_cache=False
+        )
+        assert text == edited.upper()
+        assert (tokens, cached, reused) == (10, False, 2)
+        assert provider.call.call_count == 2
+        assert provider.call.call_args.kwargs["prompt"] == "Geänderter Absatz."
+
+    def test_changed_paragraphs_are_chunked(self) -> None:
+        provider = _upper_provider()
+        memory: dict[str, str] = {}
+        _, tokens, _, _ = call_incremental(
+            provider, "m", "instr", TEXT, memory=memory, use_cache=False, max_chars=40
+        )
+        assert (tokens, provider.call.call_count) == (20, 2)
+        assert len(memory) == 3
+
+    def test_misaligned_response_is_not_remembered(self) -> None:
+        provider = _upper_provider()
+        provider.call.side_effect = lambda model, instruction, prompt: ("EIN", 10)  # noqa: ARG005
+        memory: dict[str, str] = {}
+        call_incremental(provider, "m", "instr", TEXT, memory=memory, use_cache=False)
+        assert memory == {}
+
+    def test_memory_only_keeps_current_paragraphs(self) -> None:
+        provider = _upper_provider()
+        memory: dict[str, str] = {}
+        call_incremental(provider, "m", "instr", TEXT, memory=memory, use_cache=False)
+        call_incremental(provider, "m", "instr", "Neu.", memory=memory, use_cache=False)
+        assert list(memory.values()) == ["NEU."]
+
+    def test_async_variant(self) -> None:
+        provider = _upper_provider()
+        provider.acall.side_effect = lambda model, instruction, prompt: asyncio.sleep(
+            0, provider.call(model, instruction, prompt)
+        )
+        memory: dict[str, str] = {}
+
+        async def submit_twice() -> tuple[str, int, bool, int]:
+            await acall_incremental(
+                provider, "m", "instr", TEXT, memory=memory, use_cache=False
+            )
+            return await acall_incremental(
+                provider, "m", "instr", TEXT, memory=memory, use_cache=False
+            )
+
+        assert asyncio.run(submit_twice()) == (TEXT.upper(), 0, True, 3)
+
+
+@pytest.fixture(params=["worker", "sqlite"])
+def db_path(request: pytest.FixtureRequest, tmp_path: Path) -> Path | None:
+    """Document memory per worker, or in SQLite."""
+    return tmp_path / "document_memory.sqlite" if request.param == "sqlite" else None
+
+
+def test_document_memory_is_lru_per_user_and_document(db_path: Path | None) -> None:
+    memory = DocumentMemory(max_documents=2, db_path=db_path)
+    memory.put(1, "a", {"k": "v"})
+    assert memory.get(1, "a") == {"k": "v"}
+    assert memory.get(2, "a") == {}
+    memory.put(2, "a", {})
+    memory.put(1, "b", {})
+    assert memory.get(2, "a") == {}
+    assert memory.get(1, "a") == {}  # evicted
+
+
+def test_document_memory_returns_copies(db_path: Path | None) -> None:
+    memory = DocumentMemory(max_documents=2, db_path=db_path)
+    snapshot = memory.get(1, "a")
+    snapshot["k"] = "v"
+    # changed only by put(), as a whole
+    assert memory.get(1, "a") == {}
+
+
+def test_document_memory_is_shared_by_the_workers(tmp_path: Path) -> None:
+    db_path = tmp_path / "document_memory.sqlite"
+    worker1 = DocumentMemory(max_documents=2, db_path=db_path)
+    worker2 = DocumentMemory(max_documents=2, db_path=db_path)
+
+    async def resubmit() -> dict[str, str]:
+        await worker1.aput(1, "a", {"k": "v"})
+        return await worker2.aget(1, "a")
+
+    assert asyncio.run(resubmit()) == {"k": "v"}
@@ -0,0 +1,68 @@
+"""Tests for shared/llm_clients.py pooled client registry."""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import httpx
+
+from shared import llm_clients
+from shared.llm_clients import (
+    aclose_clients,
+    close_clients,
+    get_async_client,
+    get_client,
+    get_client_stats,
+    http_client_kwargs,
+)
+
+
+def test_get_client_builds_once_and_counts_hits() -> None:
+    factory = MagicMock(return_value=MagicMock())
+    stats_before = get_client_stats()
+
+    first = get_client("test_once", factory)
+    second = get_client("test_once", factory)
+
+    assert first is second
+    factory.assert_called_once()
+    stats = get_client_stats()
+    assert stats["misses"] == stats_before["misses"] + 1
+    assert stats["hits"] == stats_before["hits"] + 1
+    close_clients()
+
+
+def test_close_clients_closes_and_forgets() -> None:
+    client = MagicMock()
+    get_client("test_close", lambda: client)
+
+    close_clients()
+
+    client.close.assert_called_once()
+    assert get_client_stats()["clients"] == 0
+
+
+def test_async_clients_are_per_event_loop() -> None:
+    created = []
+
+    def factory() -> httpx.AsyncClient:
+        client = httpx.AsyncClient()
+        created.append(client)
+        return client
+
+    async def use_twice() -> None:
+        assert get_async_client("test_async", factory) is get_async_client(
+            "test_async", factory
+        )
+        await aclose_clients()
+
+    asyncio.run(use_twice())
+    asyncio.run(use_twice())
+
+    assert len(created) == 2
+    assert all(client.is_closed for client in created)
+
+
+def test_http2_falls_back_without_h2(monkeypatch) -> None:
+    monkeypatch.setattr(llm_clients, "LLM_HTTP2", True)
+    monkeypatch.setattr(llm_clients, "find_spec", lambda _: None)
+    assert http_client_kwargs()["http2"] is False
@@ -0,0 +1,66 @@
+"""Tests for shared/llm_deadline.py request deadlines."""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from shared.llm_deadline import (
+    DeadlineExceededError,
+    attempt_timeout,
+    await_with_deadline,
+    remaining,
+    request_deadline,
+)
+
+
+def test_no_deadline() -> None:
+    assert remaining() == float("inf")
+    assert attempt_timeout() == 120
+
+
+def test_deadline_is_capped_and_nested() -> None:
+    with patch("shared.llm_deadline.LLM_DEADLINE_MAX", 30):
+        with request_deadline(100) as seconds:
+            assert 29 < seconds <= 30
+            # an inner deadline does not extend the outer one
+            with request_deadline(60):
+                assert remaining() <= 30
+            with request_deadline(5):
+                assert 4 < attempt_timeout() <= 5
+            assert remaining() > 5
+        assert remaining() == float("inf")
+
+
+def test_attempt_timeout_raises_without_time_left() -> None:
+    with request_deadline(0.5), pytest.raises(DeadlineExceededError):
+        attempt_timeout()
+
+
+def test_await_with_deadline_cancels_slow_call() -> None:
+    cancelled = asyncio.Event()
+
+    async def slow() -> str:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "late"
+
+    async def run() -> None:
+        with request_deadline(0.05), pytest.raises(DeadlineExceededError):
+            await await_with_deadline(slow())
+        assert cancelled.is_set()
+        # without deadline the result is returned
+        assert await await_with_deadline(asyncio.sleep(0, result="ok")) == "ok"
+
+    asyncio.run(run())
+
+
+def test_deadline_reaches_tasks() -> None:
+    async def run() -> float:
+        with request_deadline(5):
+            return await asyncio.ensure_future(asyncio.to_thread(remaining))
+
+    assert 4 < asyncio.run(run()) <= 5
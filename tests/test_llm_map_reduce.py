@@ -0,0 +1,118 @@
+"""Tests for shared/llm_map_reduce.py map-reduce processing of long texts."""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from shared.llm_map_reduce import (
+    MAP_REDUCE_STATS,
+    acall_map_reduce,
+    call_map_reduce,
+    reduce_prompt,
+    split_sections,
+)
+
+TEXT = "Erster Absatz. Noch ein Satz.\n\nZweiter Absatz.\n\n\nDritter Absatz.\n"
+
+
+def _provider() -> MagicMock:
+    """Provider answering with model and prompt, fast model: "fast"."""
+    provider = MagicMock()
+    provider.provider = "MapReduce"
+    provider.get_models.return_value = ["fast", "strong"]
+    provider.call.side_effect = lambda model, instruction, prompt: (  # noqa: ARG005
+        f"{model}: {prompt}",
+        10 if model == "fast" else 20,
+    )
+    provider.acall.side_effect = lambda model, instruction, prompt: asyncio.sleep(
+        0, provider.call(model, instruction, prompt)
+    )
+    return provider
+
+
+@pytest.fixture(autouse=True)
+def _small_sections():
+    with (
+        patch("shared.llm_map_reduce.LLM_MAP_REDUCE_MIN_CHARS", 50),
+        patch("shared.llm_map_reduce.LLM_MAP_REDUCE_SECTION_CHARS", 32),
+    ):
+        yield
+
+
+def test_split_sections() -> None:
+    assert split_sections("Kurzer Text.") == ["Kurzer Text."]
+    # texts exceeding the model are split, however short
+    assert split_sections("Kurz. Text.", max_chars=6) == ["Kurz. ", "Text."]
+    sections = split_sections(TEXT)
+    assert len(sections) == 3
+    assert "".join(sections) == TEXT
+    # the section size of the budget does not exceed the configured one
+    assert split_sections(TEXT, max_chars=1000) == sections
+
+
+def test_reduce_prompt_keeps_order() -> None:
+    assert reduce_prompt([" eins\n", "zwei"]) == (
+        "Abschnitt 1/2:\neins\n\nAbschnitt 2/2:\nzwei"
+    )
+
+
+def test_short_text_is_a_single_call() -> None:
+    provider = _provider()
+    result = call_map_reduce(
+        provider, "strong", "reduce", "Kurzer Text.", map_instruction="map"
+    )
+    assert result == ("strong: Kurzer Text.", 20, False, {})
+    provider.call.assert_called_once()
+
+
+def test_sections_are_mapped_by_the_fast_model_and_reduced() -> None:
+    provider = _provider()
+    before = MAP_REDUCE_STATS.get_stats()
+    text, tokens, cached, stage_tokens = call_map_reduce(
+        provider, "strong", "reduce", TEXT, map_instruction="map", use_cache=False
+    )
+    assert stage_tokens == {"map": 30, "reduce": 20}
+    assert tokens == 50
+    assert cached is False
+    assert text.startswith("strong: Abschnitt 1/3:\nfast: Erster Absatz.")
+    map_calls = [c.kwargs for c in provider.call.call_args_list[:3]]
+    assert {(c["model"], c["instruction"]) for c in map_calls} == {("fast", "map")}
+    assert provider.call.call_args.kwargs["instruction"] == "reduce"
+    stats = MAP_REDUCE_STATS.get_stats()
+    assert stats["calls"] == before["calls"] + 1
+    assert stats["sections"] == before["sections"] + 3
+    assert stats["map_tokens"] == before["map_tokens"] + 30
+
+
+def test_empty_section_response_raises() -> None:
+    provider = _provider()
+    provider.call.side_effect = None
+    provider.call.return_value = ("", 0)
+    with pytest.raises(ValueError, match="empty response"):
+        call_map_reduce(
+            provider, "strong", "reduce", TEXT, map_instruction="map", use_cache=False
+        )
+
+
+def test_async_variant() -> None:
+    provider = _provider()
+    text, tokens, _, stage_tokens = asyncio.run(
+        acall_map_reduce(
+            provider,
+            "strong",
+            "reduce",
+            TEXT,
+            map_instruction="map",
+            use_cache=False,
+            concurrency=2,
+        )
+    )
+    assert stage_tokens == {"map": 30, "reduce": 20}
+    assert tokens == 50
+    assert provider.acall.call_count == 4
+    assert text == (
+        "strong: Abschnitt 1/3:\nfast: Erster Absatz. Noch ein Satz."
+        "\n\nAbschnitt 2/3:\nfast: Zweiter Absatz."
+        "\n\nAbschnitt 3/3:\nfast: Dritter Absatz."
+    )
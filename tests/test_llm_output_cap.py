@@ -0,0 +1,165 @@
+"""Tests for shared/llm_output_cap.py output caps of the LLM calls."""
+
+import asyncio
+from collections.abc import AsyncIterator
+from unittest.mock import MagicMock, patch
+
+import pytest
+from openai.types.chat.chat_completion import ChatCompletion
+
+from shared.llm_cache import LLMResponseCache, acall_cached, astream_upstream
+from shared.llm_output_cap import (
+    OutputLimitError,
+    get_output_cap_stats,
+    max_output_tokens,
+    output_cap,
+    output_guard,
+    record_truncation,
+    truncations,
+)
+from shared.llm_provider_openai import OpenAIProvider
+from shared.llm_tokens import TOKEN_ESTIMATOR
+
+PROVIDER = "CapTest"
+TEXT = "Das ist ein kurzer Text mit ein paar Wörtern."
+
+
+def test_no_cap_without_guard() -> None:
+    assert output_cap(PROVIDER, TEXT) is None
+    assert max_output_tokens(PROVIDER, TEXT, 1000) is None
+
+
+def test_cap_scales_with_the_input() -> None:
+    tokens = TOKEN_ESTIMATOR.estimate(PROVIDER, TEXT)
+    with (
+        patch("shared.llm_output_cap.LLM_OUTPUT_CAP_FACTOR", 2),
+        patch("shared.llm_output_cap.LLM_OUTPUT_CAP_MIN_TOKENS", 100),
+    ):
+        with output_guard(1.0):
+            assert output_cap(PROVIDER, TEXT) == tokens * 2 + 100
+            assert output_cap(PROVIDER, TEXT * 2) == tokens * 4 + 100
+            # nested guards are restored on exit
+            with output_guard(0.5):
+                assert output_cap(PROVIDER, TEXT) == tokens + 100
+            assert output_cap(PROVIDER, TEXT) == tokens * 2 + 100
+        assert output_cap(PROVIDER, TEXT) is None
+
+
+def test_max_output_tokens_within_the_model_limit() -> None:
+    before = get_output_cap_stats()["capped_calls"]
+    with output_guard(1.0):
+        assert max_output_tokens(PROVIDER, TEXT * 1000, 500) == 500
+    assert get_output_cap_stats()["capped_calls"] == before + 1
+
+
+def test_disabled_caps() -> None:
+    with patch("shared.llm_output_cap.LLM_OUTPUT_CAP_FACTOR", 0), output_guard(1.0):
+        assert output_cap(PROVIDER, TEXT) is None
+
+
+def test_truncations_are_counted_per_request() -> None:
+    before = get_output_cap_stats()["truncated"]
+    with output_guard(1.0) as guard:
+        record_truncation(PROVIDER, "m")
+        assert truncations() == guard.truncated == 1
+    assert truncations() == 0
+    assert get_output_cap_stats()["truncated"] == before + 1
+
+
+def test_truncated_response_is_not_cached() -> None:
+    provider = MagicMock()
+    provider.provider = PROVIDER
+
+    async def truncated_acall(**_kwargs: str) -> tuple[str, int]:
+        record_truncation(PROVIDER, "m")
+        return "cut off", 5
+
+    provider.acall.side_effect = truncated_acall
+    cache = LLMResponseCache()
+
+    async def call() -> tuple[str, int, bool]:
+        with output_guard(1.0):
+            return await acall_cached(provider, "m", "instr", TEXT)
+
+    with patch("shared.llm_cache.LLM_CACHE", cache):
+        assert asyncio.run(call()) == ("cut off", 5, False)
+    assert cache.get_stats()["stores"] == 0
+
+
+def test_runaway_stream_is_aborted() -> None:
+    provider = MagicMock()
+    provider.provider = PROVIDER
+
+    async def runaway(**_kwargs: str) -> AsyncIterator[tuple[str, int]]:
+        while True:
+            yield "immer weiter ", 0
+
+    provider.astream.side_effect = runaway
+
+    async def stream() -> list[str]:
+        with output_guard(1.0):
+            return [
+                delta
+                async for delta, _ in astream_upstream(provider, "m", "instr", TEXT)
+            ]
+
+    before = get_output_cap_stats()["aborted"]
+    with (
+        patch("shared.llm_output_cap.LLM_OUTPUT_CAP_MIN_TOKENS", 10),
+        pytest.raises(OutputLimitError),
+    ):
+        asyncio.run(stream())
+    assert get_output_cap_stats()["aborted"] == before + 1
+
+
+def test_reasoning_allowance() -> None:
+    with (
+        patch("shared.llm_output_cap.LLM_OUTPUT_CAP_REASONING_TOKENS", 4000),
+        output_guard(1.0),
+    ):
+        cap = output_cap(PROVIDER, TEXT)
+        assert cap is not None
+        assert max_output_tokens(PROVIDER, TEXT, 100000, reasoning=True) == cap + 4000
+        assert max_output_tokens(PROVIDER, TEXT, 2000, reasoning=True) == 2000
+
+
+def test_reasoning_model_answer_is_not_starved() -> None:
+    cap = 100
+    response = ChatCompletion.model_validate(
+        {
+            "id": "r",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-5",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "Kurze Antwort."},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 20,
+                "completion_tokens": 95,
+                "total_tokens": 115,
+                # most of the visible cap went into reasoning
+                "completion_tokens_details": {"reasoning_tokens": 90},
+            },
+        }
+    )
+    client = MagicMock()
+    client.chat.completions.create.return_value = response
+    with (
+        patch("shared.llm_output_cap.output_cap", return_value=cap),
+        patch("shared.llm_output_cap.LLM_OUTPUT_CAP_REASONING_TOKENS", 4000),
+        patch("shared.llm_provider_openai.get_openai_client", return_value=client),
+        output_guard(1.0),
+    ):
+        provider = OpenAIProvider()
+        result = provider.call(provider.models[0], "instr", TEXT)
+        assert truncations() == 0
+    assert result == ("Kurze Antwort.", 115)
+    max_tokens = client.chat.completions.create.call_args.kwargs[
+        "max_completion_tokens"
+    ]
+    assert max_tokens >= cap + 90
@@ -0,0 +1,76 @@
+"""Tests for shared/llm_prompt_cache.py prompt prefix caching helpers."""
+
+from unittest.mock import patch
+
+from openai.types.chat.chat_completion import ChatCompletion
+
+from shared.llm_prompt_cache import (
+    PromptCacheStats,
+    chat_messages,
+    instruction_key,
+    parse_chat_completion,
+)
+from shared.llm_tokens import count_reasoning_tokens
+from shared.mode_configs import MODE_CONFIGS
+
+
+def test_chat_messages_have_stable_prefix() -> None:
+    instruction = MODE_CONFIGS["correct"].instruction
+    first = chat_messages(instruction, "Text one")
+    second = chat_messages(instruction, "Another text")
+    assert first[0] == second[0] == {"role": "system", "content": instruction}
+    assert instruction_key(instruction) == instruction_key(instruction)
+    assert len(instruction_key(instruction)) == 16
+
+
+def test_stats_record_cached_share() -> None:
+    stats = PromptCacheStats()
+    stats.record("OpenAI", "gpt-5", prompt_tokens=1200, cached_tokens=0)
+    stats.record("OpenAI", "gpt-5", prompt_tokens=1200, cached_tokens=1024)
+    stats.record("OpenAI", "gpt-5", prompt_tokens=0, cached_tokens=0)  # not reported
+
+    assert stats.get_stats() == {
+        "OpenAI/gpt-5": {
+            "calls": 2,
+            "calls_cached": 1,
+            "prompt_tokens": 2400,
+            "cached_tokens": 1024,
+            "cached_ratio": 0.427,
+        }
+    }
+
+
+def test_parse_chat_completion_records_usage() -> None:
+    response = ChatCompletion.model_validate(
+        {
+            "id": "c",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-5",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "Antwort"},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 1200,
+                "completion_tokens": 50,
+                "total_tokens": 1250,
+                "prompt_tokens_details": {"cached_tokens": 1024},
+                "completion_tokens_details": {"reasoning_tokens": 40},
+            },
+        }
+    )
+    stats = PromptCacheStats()
+    with (
+        patch("shared.llm_prompt_cache.PROMPT_CACHE_STATS", stats),
+        count_reasoning_tokens() as reasoning,
+    ):
+        assert parse_chat_completion("AzureOpenAI", response, "gpt-5") == (
+            "Antwort",
+            1250,
+        )
+    assert stats.get_stats()["AzureOpenAI/gpt-5"]["cached_tokens"] == 1024
+    assert reasoning.tokens == 40
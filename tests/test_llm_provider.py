@@ -1,74 +1,132 @@
-"""Tests for shared/llm_provider.py retry and provider logic."""
+"""Tests for shared/llm_provider.py provider logic."""
 
-from unittest.mock import patch
+import asyncio
+import sys
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from shared.llm_catalog import get_llm_models
 from shared.llm_provider import (
     LLMProvider,
     MockProvider,
+    SingleFlight,
+    awarm_up_providers,
     get_llm_provider,
-    retry_with_exponential_backoff,
+    get_llm_provider_instances,
 )
 
 
-def test_retry_succeeds_after_transient_failure() -> None:
-    """Function failing once succeeds on retry with backoff."""
-    calls = {"count": 0}
-
-    def flaky() -> str:
-        calls["count"] += 1
-        if calls["count"] == 1:
+class TestSingleFlight:
+    """Test coalescing of concurrent identical calls."""
+
+    def test_threads_share_one_call(self) -> None:
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = {"count": 0}
+
+        def slow_call() -> str:
+            calls["count"] += 1
+            started.set()
+            release.wait(timeout=5)
+            return "result"
+
+        results: list[tuple[str, bool]] = []
+        leader = threading.Thread(
+            target=lambda: results.append(single_flight.do("k", slow_call))
+        )
+        leader.start()
+        started.wait(timeout=5)
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(single_flight.do("k", slow_call))
+            )
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        while single_flight.get_stats()["coalesced"] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in (leader, *followers):
+            thread.join(timeout=5)
+
+        assert calls["count"] == 1
+        assert sorted(results) == [("result", False)] * 3 + [("result", True)]
+        assert single_flight.get_stats() == {"calls": 1, "coalesced": 3, "in_flight": 0}
+
+    def test_sequential_calls_are_not_coalesced(self) -> None:
+        single_flight = SingleFlight()
+        assert single_flight.do("k", lambda: 1) == (1, True)
+        assert single_flight.do("k", lambda: 2) == (2, True)
+
+    def test_async_tasks_share_one_call(self) -> None:
+        single_flight = SingleFlight()
+        calls = {"count": 0}
+
+        async def slow_call() -> str:
+            calls["count"] += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run() -> list[tuple[str, bool]]:
+            return await asyncio.gather(
+                *(single_flight.ado("k", slow_call) for _ in range(3))
+            )
+
+        assert asyncio.run(run()) == [
+            ("result", True),
+            ("result", False),
+            ("result", False),
+        ]
+        assert calls["count"] == 1
+        assert single_flight.get_stats()["in_flight"] == 0
+
+    def test_async_exception_is_shared(self) -> None:
+        single_flight = SingleFlight()
+
+        async def failing_call() -> None:
+            await asyncio.sleep(0.01)
             msg = "boom"
             raise ConnectionError(msg)
-        return "ok"
-
-    with patch("shared.llm_provider.time.sleep") as mock_sleep:
-        result = retry_with_exponential_backoff(flaky)()
-
-    assert result == "ok"
-    assert calls["count"] == 2
-    mock_sleep.assert_called_once_with(1)
-
-
-def test_retry_exhausts_attempts_and_raises() -> None:
-    """Function failing always raises after max_retries attempts."""
-    attempts = {"count": 0}
-
-    def always_fails() -> None:
-        attempts["count"] += 1
-        msg = "always"
-        raise ConnectionError(msg)
-
-    with (
-        patch("shared.llm_provider.time.sleep") as mock_sleep,
-        pytest.raises(ConnectionError, match="always"),
-    ):
-        retry_with_exponential_backoff(always_fails, max_retries=3)()
-
-    assert attempts["count"] == 3
-    # backoff sleeps: 1s then 2s (2^0, 2^1)
-    assert [call.args[0] for call in mock_sleep.call_args_list] == [1, 2]
 
-
-def test_retry_no_sleep_on_first_success() -> None:
-    """Successful first attempt does not sleep."""
-    with patch("shared.llm_provider.time.sleep") as mock_sleep:
-        result = retry_with_exponential_backoff(lambda: "ok")()
-
-    assert result == "ok"
-    mock_sleep.assert_not_called()
-
-
-def test_retry_zero_max_retries_raises_runtime_error() -> None:
-    """max_retries=0 falls through to the guard RuntimeError."""
-
-    def func() -> None:
-        msg = "never called"
-        raise AssertionError(msg)
-
-    with pytest.raises(RuntimeError, match="retry logic failed unexpectedly"):
-        retry_with_exponential_backoff(func, max_retries=0)()
+        async def run() -> list[object]:
+            return await asyncio.gather(
+                *(single_flight.ado("k", failing_call) for _ in range(2)),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ConnectionError) for r in results)
+
+    def test_async_call_is_cancelled_with_last_waiter(self) -> None:
+        single_flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def slow_call() -> str:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "result"
+
+        async def run() -> None:
+            waiters = [
+                asyncio.ensure_future(single_flight.ado("k", slow_call))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            waiters[0].cancel()
+            await asyncio.sleep(0.01)
+            assert not cancelled.is_set()
+            waiters[1].cancel()
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        asyncio.run(run())
 
 
 class TestLLMProvider:
@@ -92,6 +150,27 @@ class TestLLMProvider:
         with pytest.raises(NotImplementedError):
             provider.call("a", "instr", "prompt")
 
+    def test_acall_falls_back_to_call_in_thread(self) -> None:
+        class SyncOnlyProvider(LLMProvider):
+            def call(self, model: str, instruction: str, prompt: str):  # noqa: ARG002
+                return threading.current_thread().name, 1
+
+        provider = SyncOnlyProvider(provider="Test", models=["a"])
+        thread_name, tokens = asyncio.run(provider.acall("a", "instr", "prompt"))
+        assert thread_name != threading.current_thread().name
+        assert tokens == 1
+
+    def test_astream_falls_back_to_single_chunk(self) -> None:
+        class SyncOnlyProvider(LLMProvider):
+            def call(self, model: str, instruction: str, prompt: str):  # noqa: ARG002
+                return "full response", 7
+
+        async def collect() -> list[tuple[str, int]]:
+            provider = SyncOnlyProvider(provider="Test", models=["a"])
+            return [chunk async for chunk in provider.astream("a", "i", "p")]
+
+        assert asyncio.run(collect()) == [("full response", 7)]
+
 
 class TestMockProvider:
     """Test the MockProvider."""
@@ -101,6 +180,12 @@ class TestMockProvider:
         assert provider.provider == "Mocked"
         assert provider.get_models() == ["random"]
 
+    def test_mock_provider_acall(self) -> None:
+        provider = MockProvider()
+        response, tokens = asyncio.run(provider.acall("random", "instr", "Hi"))
+        assert response == "Mocked Hi response"
+        assert tokens == 123
+
 
 class TestGetLLMProvider:
     """Test the provider factory."""
@@ -108,3 +193,39 @@ class TestGetLLMProvider:
     def test_unknown_provider_raises(self) -> None:
         with pytest.raises(ValueError, match="Unknown LLM provider"):
             get_llm_provider("NotAProvider")
+
+    def test_provider_is_created_once(self) -> None:
+        provider = get_llm_provider("Mock")
+        assert get_llm_provider("Mock") is provider
+        assert get_llm_provider_instances()["Mock"] is provider
+
+    def test_warm_up_only_providers_requiring_it(self) -> None:
+        provider = MagicMock(awarm_up=AsyncMock())
+        with patch(
+            "shared.llm_provider.get_llm_provider", return_value=provider
+        ) as mock_get:
+            asyncio.run(awarm_up_providers(["Mock", "Ollama", "Unknown"]))
+        mock_get.assert_called_once_with("Ollama")
+        provider.awarm_up.assert_awaited_once()
+
+    def test_failed_warm_up_is_logged(self) -> None:
+        provider = MagicMock(awarm_up=AsyncMock(side_effect=ConnectionError("down")))
+        with patch("shared.llm_provider.get_llm_provider", return_value=provider):
+            asyncio.run(awarm_up_providers(["Ollama"]))  # does not raise
+
+
+class TestLLMCatalog:
+    """Test the static provider/model catalog."""
+
+    def test_models_from_catalog(self) -> None:
+        assert get_llm_models("Google")[0] == "gemini-2.5-flash-lite"
+
+    def test_catalog_does_not_import_provider_sdk(self) -> None:
+        with patch.dict(sys.modules):
+            sys.modules.pop("shared.llm_provider_mistral", None)
+            get_llm_models("Mistral")
+            assert "shared.llm_provider_mistral" not in sys.modules
+
+    def test_unknown_provider_raises(self) -> None:
+        with pytest.raises(ValueError, match="Unknown LLM provider"):
+            get_llm_models("NotAProvider")
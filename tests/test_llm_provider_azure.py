@@ -0,0 +1,73 @@
+"""Tests for shared/llm_provider_azure.py Azure AD token cache."""
+
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+from azure.core.credentials import AccessToken
+
+from shared.llm_provider_azure import AzureTokenCache, _async_token_provider
+
+
+def _mock_credential(lifetime: float = 3600) -> MagicMock:
+    credential = MagicMock()
+    credential.get_token.side_effect = lambda _scope: AccessToken(
+        "token", int(time.time() + lifetime)
+    )
+    return credential
+
+
+def test_token_is_fetched_once_and_cached() -> None:
+    credential = _mock_credential()
+    with patch(
+        "shared.llm_provider_azure.DefaultAzureCredential", return_value=credential
+    ):
+        cache = AzureTokenCache("scope")
+        assert cache.get_token() == "token"
+        assert cache.get_token() == "token"
+        cache.close()
+
+    credential.get_token.assert_called_once_with("scope")
+    stats = cache.get_stats()
+    assert stats["fetches"] == 1
+    assert stats["expires_in_s"] > 3000
+    assert stats["cache_age_s"] >= 0
+
+
+def test_token_is_refreshed_in_background_before_expiry() -> None:
+    # lifetime within the refresh margin -> background thread refreshes at once
+    credential = _mock_credential(lifetime=200)
+    with patch(
+        "shared.llm_provider_azure.DefaultAzureCredential", return_value=credential
+    ):
+        cache = AzureTokenCache("scope")
+        cache.get_token()
+        for _ in range(100):
+            if credential.get_token.call_count >= 2:
+                break
+            time.sleep(0.01)
+        cache.close()
+
+    assert credential.get_token.call_count >= 2
+
+
+def test_expired_token_is_fetched_synchronously() -> None:
+    credential = _mock_credential(lifetime=0)
+    with patch(
+        "shared.llm_provider_azure.DefaultAzureCredential", return_value=credential
+    ):
+        cache = AzureTokenCache("scope")
+        cache._stop.set()  # noqa: SLF001 # no background refresh
+        cache.get_token()
+        cache.get_token()
+
+    assert credential.get_token.call_count == 2
+    assert not cache.is_valid()
+
+
+def test_async_token_provider_uses_valid_cached_token() -> None:
+    cache = MagicMock()
+    cache.is_valid.return_value = True
+    cache.get_token.return_value = "cached"
+    with patch("shared.llm_provider_azure.get_token_cache", return_value=cache):
+        assert asyncio.run(_async_token_provider()) == "cached"
@@ -0,0 +1,41 @@
+"""Tests for shared/llm_provider_gemini.py implicit prompt caching."""
+
+from unittest.mock import MagicMock, patch
+
+from google.genai import types as genai_types
+
+from shared.llm_prompt_cache import PromptCacheStats
+from shared.llm_provider_gemini import GeminiProvider
+from shared.mode_configs import MODE_CONFIGS
+
+INSTRUCTION = MODE_CONFIGS["correct"].instruction
+MODEL = "gemini-2.5-flash"
+
+
+def test_call_sends_instruction_and_records_cached_tokens() -> None:
+    stats = PromptCacheStats()
+    client = MagicMock()
+    client.models.generate_content.return_value = genai_types.GenerateContentResponse(
+        candidates=[
+            genai_types.Candidate(
+                content=genai_types.Content(
+                    role="model", parts=[genai_types.Part(text="Korrigiert")]
+                )
+            )
+        ],
+        usage_metadata=genai_types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=1500,
+            cached_content_token_count=1400,
+            total_token_count=1600,
+        ),
+    )
+    with (
+        patch("shared.llm_provider_gemini.PROMPT_CACHE_STATS", stats),
+        patch("shared.llm_provider_gemini.get_gemini_client", return_value=client),
+    ):
+        assert GeminiProvider().call(MODEL, INSTRUCTION, "Text") == ("Korrigiert", 1600)
+
+    config = client.models.generate_content.call_args.kwargs["config"]
+    assert config.system_instruction == INSTRUCTION
+    assert config.cached_content is None
+    assert stats.get_stats()[f"Google/{MODEL}"]["cached_tokens"] == 1400
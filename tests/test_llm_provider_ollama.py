@@ -0,0 +1,143 @@
+"""Tests for shared/llm_provider_ollama.py model loading and concurrency."""
+
+import asyncio
+from collections.abc import AsyncIterator
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from ollama import ChatResponse, Message
+
+from shared.llm_deadline import DeadlineExceededError, request_deadline
+from shared.llm_provider_ollama import OllamaProvider
+
+
+def _response(content: str = "Antwort", load_duration: int = 0) -> ChatResponse:
+    return ChatResponse(
+        model="mistral",
+        done=True,
+        message=Message(role="assistant", content=content),
+        prompt_eval_count=30,
+        eval_count=12,
+        load_duration=load_duration,
+        prompt_eval_duration=100_000_000,
+        eval_duration=600_000_000,
+    )
+
+
+def test_call_reports_tokens_and_durations() -> None:
+    client = MagicMock()
+    client.chat.return_value = _response(load_duration=3_000_000_000)
+    provider = OllamaProvider()
+    with patch("shared.llm_provider_ollama.get_ollama_client", return_value=client):
+        assert provider.call("mistral", "Instruction", "Text") == ("Antwort", 42)
+
+    assert client.chat.call_args.kwargs["keep_alive"] == "30m"
+    stats = provider.get_stats()
+    assert stats["calls"] == 1
+    assert stats["cold_starts"] == 1
+    assert stats["eval_tokens_per_second"] == 20.0
+
+
+def test_concurrent_calls_are_limited_per_model() -> None:
+    provider = OllamaProvider()
+    provider.num_parallel = 2
+    running = 0
+    max_running = 0
+
+    async def chat(**_: object) -> ChatResponse:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return _response()
+
+    client = MagicMock()
+    client.chat = chat
+
+    async def call_concurrently() -> None:
+        await asyncio.gather(
+            *(provider.acall("mistral", "Instruction", "Text") for _ in range(5))
+        )
+
+    with patch(
+        "shared.llm_provider_ollama.get_async_ollama_client", return_value=client
+    ):
+        asyncio.run(call_concurrently())
+    assert max_running == 2
+    assert provider.get_stats()["calls"] == 5
+
+
+def test_warm_up_loads_preload_models() -> None:
+    client = MagicMock()
+    client.chat = AsyncMock(return_value=_response(content=""))
+    with (
+        patch(
+            "shared.llm_provider_ollama.get_async_ollama_client", return_value=client
+        ),
+        patch("shared.llm_provider_ollama.LLM_OLLAMA_PRELOAD", "llama3.2:1b, mistral"),
+    ):
+        asyncio.run(OllamaProvider().awarm_up())
+
+    assert [c.kwargs["model"] for c in client.chat.await_args_list] == [
+        "llama3.2:1b",
+        "mistral",
+    ]
+    assert client.chat.await_args.kwargs["messages"] == []
+    assert client.chat.await_args.kwargs["keep_alive"] == "30m"
+
+
+async def _hanging_chat(**_: object) -> ChatResponse:
+    await asyncio.sleep(10)
+    return _response()
+
+
+def test_call_is_cancelled_at_the_deadline() -> None:
+    provider = OllamaProvider()
+    provider.num_parallel = 1
+    client = MagicMock()
+    client.chat = _hanging_chat
+
+    async def call() -> None:
+        with request_deadline(1.2):
+            await provider.acall("mistral", "Instruction", "Text")
+
+    with (
+        patch(
+            "shared.llm_provider_ollama.get_async_ollama_client", return_value=client
+        ),
+        pytest.raises(DeadlineExceededError),
+    ):
+        asyncio.run(call())
+
+
+def test_stream_is_cancelled_at_the_deadline() -> None:
+    provider = OllamaProvider()
+    provider.num_parallel = 1
+
+    async def hanging_stream() -> AsyncIterator[ChatResponse]:
+        yield _response(content="Anfang")
+        await asyncio.sleep(10)
+
+    client = MagicMock()
+    client.chat = AsyncMock(return_value=hanging_stream())
+    deltas = []
+
+    async def stream() -> None:
+        semaphore = provider._async_semaphore("mistral")  # noqa: SLF001
+        try:
+            with request_deadline(1.2):
+                async for delta, _ in provider.astream("mistral", "Instr", "Text"):
+                    deltas.append(delta)
+        finally:
+            # the slot is free again
+            assert not semaphore.locked()
+
+    with (
+        patch(
+            "shared.llm_provider_ollama.get_async_ollama_client", return_value=client
+        ),
+        pytest.raises(DeadlineExceededError),
+    ):
+        asyncio.run(stream())
+    assert deltas == ["Anfang"]
@@ -0,0 +1,124 @@
+"""Tests for shared/llm_rate_limit.py upstream rate governor."""
+
+import asyncio
+import itertools
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from shared.llm_deadline import request_deadline
+from shared.llm_rate_limit import (
+    RateGovernor,
+    RateLimit,
+    RateLimitError,
+    parse_limits,
+)
+
+
+def _governor(tmp_path: Path, max_wait: float = 10) -> RateGovernor:
+    limits = {"OpenAI": RateLimit(2, 1000), "OpenAI/gpt-5": RateLimit(0, 100)}
+    return RateGovernor(limits, db_path=tmp_path / "rate.sqlite", max_wait=max_wait)
+
+
+def test_parse_limits() -> None:
+    assert parse_limits("OpenAI=500:200000, Ollama/llama3.2:1b=60:0") == {
+        "OpenAI": RateLimit(500, 200000),
+        "Ollama/llama3.2:1b": RateLimit(60, 0),
+    }
+    assert parse_limits("") == {}
+
+
+def test_get_limit_model_before_provider(tmp_path: Path) -> None:
+    governor = _governor(tmp_path)
+    assert governor.get_limit("OpenAI", "gpt-5") == RateLimit(0, 100)
+    assert governor.get_limit("OpenAI", "gpt-5-nano") == RateLimit(2, 1000)
+    assert governor.get_limit("Google", "gemini") is None
+
+
+def test_requests_wait_for_refill(tmp_path: Path) -> None:
+    governor = _governor(tmp_path)
+    with patch("shared.llm_rate_limit.time.sleep") as mock_sleep:
+        governor.acquire("OpenAI", "gpt-5-nano", 10)
+        governor.acquire("OpenAI", "gpt-5-nano", 10)
+        mock_sleep.assert_not_called()
+        # bucket of 2 requests per minute is empty: about 30 seconds to wait
+        with pytest.raises(RateLimitError) as e:
+            governor.acquire("OpenAI", "gpt-5-nano", 10)
+    assert 29 < e.value.retry_after <= 30
+    assert governor.get_stats()["OpenAI/gpt-5-nano"]["rejected"] == 1
+
+
+def test_tokens_wait_briefly(tmp_path: Path) -> None:
+    governor = _governor(tmp_path)
+
+    async def acquire() -> None:
+        with (
+            patch(
+                "shared.llm_rate_limit.time.time",
+                side_effect=itertools.chain([1000, 1000], itertools.repeat(1010)),
+            ),
+            patch("shared.llm_rate_limit.asyncio.sleep") as mock_sleep,
+        ):
+            await governor.aacquire("OpenAI", "gpt-5", 95)
+            # 100 tokens per minute: 5 more tokens refill in 3 seconds
+            await governor.aacquire("OpenAI", "gpt-5", 10)
+        mock_sleep.assert_called_once()
+        assert mock_sleep.call_args.args[0] == pytest.approx(3)
+
+    asyncio.run(acquire())
+    stats = governor.get_stats()["OpenAI/gpt-5"]
+    assert stats["requests"] == 2
+    assert stats["waited"] == 1
+    assert stats["max_wait_seconds"] == pytest.approx(3)
+
+
+def test_buckets_are_shared_by_workers(tmp_path: Path) -> None:
+    worker1 = _governor(tmp_path, max_wait=0)
+    worker2 = _governor(tmp_path, max_wait=0)
+    worker1.acquire("OpenAI", "gpt-5", 60)
+    # the tokens actually consumed are accounted
+    worker1.record_usage("OpenAI", "gpt-5", estimated=60, tokens=90)
+
+    with pytest.raises(RateLimitError):
+        worker2.acquire("OpenAI", "gpt-5", 20)
+    assert worker2.get_stats()["OpenAI/gpt-5"]["level_tokens"] < 20
+
+
+def test_no_wait_past_the_deadline(tmp_path: Path) -> None:
+    governor = _governor(tmp_path, max_wait=60)
+    governor.acquire("OpenAI", "gpt-5-nano", 10)
+    governor.acquire("OpenAI", "gpt-5-nano", 10)
+    # the next request fits after 30 seconds, within max_wait but not the deadline
+    with (
+        patch("shared.llm_rate_limit.time.sleep") as mock_sleep,
+        request_deadline(20),
+        pytest.raises(RateLimitError),
+    ):
+        governor.acquire("OpenAI", "gpt-5-nano", 10)
+    mock_sleep.assert_not_called()
+
+
+def test_async_buckets_are_updated_off_the_event_loop(tmp_path: Path) -> None:
+    governor = _governor(tmp_path, max_wait=60)
+    threads = []
+    try_acquire = governor._try_acquire  # noqa: SLF001
+
+    def recording(*args: object) -> float:
+        threads.append(threading.current_thread())
+        return try_acquire(*args)  # type: ignore[arg-type]
+
+    async def acquire() -> None:
+        await governor.aacquire("OpenAI", "gpt-5-nano", 10)
+        await governor.arecord_usage("OpenAI", "gpt-5-nano", estimated=10, tokens=20)
+        await governor.aacquire("OpenAI", "gpt-5-nano", 10)
+        # the deadline of the request applies in the thread
+        with request_deadline(20), pytest.raises(RateLimitError):
+            await governor.aacquire("OpenAI", "gpt-5-nano", 10)
+
+    with patch.object(governor, "_try_acquire", side_effect=recording):
+        asyncio.run(acquire())
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+    assert governor.get_stats()["OpenAI/gpt-5-nano"]["level_tokens"] < 975
@@ -0,0 +1,268 @@
+"""Tests for shared/llm_resilience.py retry logic and circuit breaker."""
+
+import asyncio
+import itertools
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from shared.llm_deadline import DeadlineExceededError, request_deadline
+from shared.llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    async_retry_with_backoff,
+    get_circuit_breaker,
+    get_retry_after,
+    is_retryable,
+    retry_with_backoff,
+)
+
+_names = itertools.count()
+
+
+def _provider_name() -> str:
+    """Return a new provider name, so each test has its own circuit breaker."""
+    return f"Test{next(_names)}"
+
+
+class StatusError(Exception):
+    """SDK error with HTTP status code and response headers."""
+
+    def __init__(self, status_code: int, headers: dict[str, str] | None = None) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = httpx.Response(status_code, headers=headers or {})
+
+
+class TestClassification:
+    """Test retryable/non-retryable classification of errors."""
+
+    @pytest.mark.parametrize(
+        ("error", "expected"),
+        [
+            (StatusError(429), True),
+            (StatusError(503), True),
+            (StatusError(400), False),
+            (StatusError(401), False),
+            (ConnectionError("down"), True),
+            (httpx.ConnectTimeout("slow"), True),
+            (ValueError("invalid model"), False),
+        ],
+    )
+    def test_is_retryable(self, error: Exception, expected: bool) -> None:  # noqa: FBT001
+        assert is_retryable(error) is expected
+
+    def test_gemini_style_code_attribute(self) -> None:
+        error = RuntimeError("RESOURCE_EXHAUSTED")
+        error.code = 429  # type: ignore[attr-defined]
+        assert is_retryable(error)
+
+    def test_sdk_specific_retryable_error(self) -> None:
+        class NoResponseError(Exception):
+            pass
+
+        assert not is_retryable(NoResponseError())
+        assert is_retryable(NoResponseError(), (NoResponseError,))
+
+    def test_retry_after_headers(self) -> None:
+        assert get_retry_after(StatusError(429, {"retry-after": "7"})) == 7
+        assert get_retry_after(StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+        assert get_retry_after(StatusError(429)) is None
+        assert get_retry_after(ValueError()) is None
+
+
+class TestRetryWithBackoff:
+    """Test the retry decorator."""
+
+    def test_succeeds_after_transient_failure_with_jitter(self) -> None:
+        calls = {"count": 0}
+
+        def flaky() -> str:
+            calls["count"] += 1
+            if calls["count"] == 1:
+                msg = "boom"
+                raise ConnectionError(msg)
+            return "ok"
+
+        with patch("shared.llm_resilience.time.sleep") as mock_sleep:
+            result = retry_with_backoff(flaky, provider_name=_provider_name())()
+
+        assert result == "ok"
+        assert calls["count"] == 2
+        mock_sleep.assert_called_once()
+        assert 0 <= mock_sleep.call_args.args[0] <= 1
+
+    def test_non_retryable_error_is_raised_immediately(self) -> None:
+        calls = {"count": 0}
+
+        def bad_request() -> None:
+            calls["count"] += 1
+            raise StatusError(400)
+
+        with (
+            patch("shared.llm_resilience.time.sleep") as mock_sleep,
+            pytest.raises(StatusError),
+        ):
+            retry_with_backoff(bad_request, provider_name=_provider_name())()
+
+        assert calls["count"] == 1
+        mock_sleep.assert_not_called()
+
+    def test_exhausts_attempts_and_raises(self) -> None:
+        def always_fails() -> None:
+            msg = "always"
+            raise ConnectionError(msg)
+
+        with (
+            patch("shared.llm_resilience.time.sleep") as mock_sleep,
+            pytest.raises(ConnectionError, match="always"),
+        ):
+            retry_with_backoff(
+                always_fails, provider_name=_provider_name(), max_retries=3
+            )()
+
+        assert mock_sleep.call_count == 2
+
+    def test_honours_retry_after(self) -> None:
+        responses = iter([StatusError(429, {"retry-after": "2"}), None])
+
+        def rate_limited() -> str:
+            if error := next(responses):
+                raise error
+            return "ok"
+
+        with patch("shared.llm_resilience.time.sleep") as mock_sleep:
+            retry_with_backoff(rate_limited, provider_name=_provider_name())()
+
+        mock_sleep.assert_called_once_with(2.0)
+
+    def test_too_long_retry_after_is_not_waited_for(self) -> None:
+        def rate_limited() -> None:
+            raise StatusError(429, {"retry-after": "3600"})
+
+        with (
+            patch("shared.llm_resilience.time.sleep") as mock_sleep,
+            pytest.raises(StatusError),
+        ):
+            retry_with_backoff(rate_limited, provider_name=_provider_name())()
+
+        mock_sleep.assert_not_called()
+
+    def test_zero_max_retries_raises_runtime_error(self) -> None:
+        with pytest.raises(RuntimeError, match="retry logic failed unexpectedly"):
+            retry_with_backoff(
+                lambda: None, provider_name=_provider_name(), max_retries=0
+            )()
+
+    def test_async_retry_sleeps_via_asyncio(self) -> None:
+        calls = {"count": 0}
+
+        async def flaky() -> str:
+            calls["count"] += 1
+            if calls["count"] == 1:
+                raise StatusError(503)
+            return "ok"
+
+        with patch(
+            "shared.llm_resilience.asyncio.sleep", new=AsyncMock()
+        ) as mock_sleep:
+            result = asyncio.run(
+                async_retry_with_backoff(flaky, provider_name=_provider_name())()
+            )
+
+        assert result == "ok"
+        mock_sleep.assert_awaited_once()
+
+    def test_no_retry_past_the_deadline(self) -> None:
+        name = _provider_name()
+        calls = {"count": 0}
+
+        def fails() -> None:
+            calls["count"] += 1
+            raise StatusError(503)
+
+        with (
+            patch("shared.llm_resilience.backoff_wait", return_value=5.0),
+            patch("shared.llm_resilience.time.sleep") as mock_sleep,
+            request_deadline(3),
+            pytest.raises(DeadlineExceededError),
+        ):
+            retry_with_backoff(fails, provider_name=name)()
+
+        assert calls["count"] == 1
+        mock_sleep.assert_not_called()
+        # running out of time is no failure of the provider
+        assert get_circuit_breaker(name).get_stats()["failures"] == 0
+
+    def test_open_circuit_fails_fast(self) -> None:
+        name = _provider_name()
+        calls = {"count": 0}
+
+        def always_fails() -> None:
+            calls["count"] += 1
+            raise StatusError(503)
+
+        with patch("shared.llm_resilience.time.sleep"):
+            for _ in range(5):
+                with pytest.raises(StatusError):
+                    retry_with_backoff(always_fails, provider_name=name)()
+            with pytest.raises(CircuitOpenError):
+                retry_with_backoff(always_fails, provider_name=name)()
+
+        assert calls["count"] == 15
+        stats = get_circuit_breaker(name).get_stats()
+        assert stats["state"] == "open"
+        assert stats["rejected"] == 1
+        assert stats["retries"] == 10
+
+
+class TestCircuitBreaker:
+    """Test the circuit breaker state machine."""
+
+    def _open_breaker(self) -> CircuitBreaker:
+        breaker = CircuitBreaker("Test", failure_threshold=2, reset_timeout=30)
+        with patch("shared.llm_resilience.time.monotonic", return_value=100):
+            for _ in range(2):
+                breaker.before_call()
+                breaker.record_failure()
+        return breaker
+
+    def test_opens_after_consecutive_failures(self) -> None:
+        breaker = self._open_breaker()
+        with patch("shared.llm_resilience.time.monotonic", return_value=110):
+            assert breaker.is_open()
+            with pytest.raises(CircuitOpenError):
+                breaker.before_call()
+
+    def test_success_resets_failure_count(self) -> None:
+        breaker = CircuitBreaker("Test", failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+
+    def test_half_open_allows_single_probe(self) -> None:
+        breaker = self._open_breaker()
+        with patch("shared.llm_resilience.time.monotonic", return_value=131):
+            breaker.before_call()  # the probe
+            assert breaker.state == "half_open"
+            with pytest.raises(CircuitOpenError):
+                breaker.before_call()
+
+    def test_successful_probe_closes(self) -> None:
+        breaker = self._open_breaker()
+        with patch("shared.llm_resilience.time.monotonic", return_value=131):
+            breaker.before_call()
+            breaker.record_success()
+            assert breaker.state == "closed"
+            breaker.before_call()
+
+    def test_failed_probe_reopens(self) -> None:
+        breaker = self._open_breaker()
+        with patch("shared.llm_resilience.time.monotonic", return_value=131):
+            breaker.before_call()
+            breaker.record_failure()
+        with patch("shared.llm_resilience.time.monotonic", return_value=150):
+            assert breaker.is_open()
+        assert breaker.get_stats()["opened"] == 2
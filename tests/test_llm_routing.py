@@ -0,0 +1,139 @@
+"""Tests for shared/llm_routing.py hedging and fallback chains."""
+
+import asyncio
+from collections.abc import AsyncIterator
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from shared.llm_catalog import get_llm_models
+from shared.llm_routing import (
+    LatencyTracker,
+    Route,
+    acall_routed,
+    astream_routed,
+    get_routes,
+    parse_chain,
+)
+
+PRIMARY = Route("Google", "slow")
+SECONDARY = Route("OpenAI", "fast")
+
+
+def test_parse_chain() -> None:
+    assert parse_chain("OpenAI/gpt-x, Mistral") == [
+        Route("OpenAI", "gpt-x"),
+        Route("Mistral", get_llm_models("Mistral")[0]),
+    ]
+    assert parse_chain("") == []
+
+
+def test_get_routes_skips_open_circuits() -> None:
+    def breaker(name: str) -> MagicMock:
+        return MagicMock(is_open=MagicMock(return_value=name == "Google"))
+
+    with (
+        patch("shared.llm_routing.FALLBACK_ROUTES", [SECONDARY]),
+        patch(
+            "shared.llm_routing.get_llm_provider",
+            side_effect=lambda name: MagicMock(provider=name),
+        ),
+        patch("shared.llm_routing.get_circuit_breaker", side_effect=breaker),
+    ):
+        assert get_routes("Google", "slow") == [SECONDARY]
+        assert get_routes("OpenAI", "fast") == [SECONDARY]
+
+
+def test_latency_percentile_needs_samples() -> None:
+    tracker = LatencyTracker()
+    tracker.record(PRIMARY, 1.0)
+    assert tracker.percentile(PRIMARY, 95) is None
+    for i in range(100):
+        tracker.record(PRIMARY, float(i))
+    assert 90 < tracker.percentile(PRIMARY, 95) < 99  # type: ignore[operator]
+    assert tracker.get_stats()[str(PRIMARY)]["count"] == 101
+
+
+class TestAcallRouted:
+    """Test fallback and hedging of awaited calls."""
+
+    def test_first_route_answers(self) -> None:
+        async def call(route: Route) -> str:
+            return f"answer of {route}"
+
+        result = asyncio.run(acall_routed([PRIMARY, SECONDARY], call))
+        assert result == ("answer of Google/slow", PRIMARY)
+
+    def test_falls_back_on_error(self) -> None:
+        async def call(route: Route) -> str:
+            if route == PRIMARY:
+                msg = "down"
+                raise ConnectionError(msg)
+            return "fallback"
+
+        result = asyncio.run(acall_routed([PRIMARY, SECONDARY], call))
+        assert result == ("fallback", SECONDARY)
+
+    def test_raises_if_all_routes_fail(self) -> None:
+        async def call(route: Route) -> str:
+            raise ConnectionError(str(route))
+
+        with pytest.raises(ConnectionError, match="OpenAI/fast"):
+            asyncio.run(acall_routed([PRIMARY, SECONDARY], call))
+
+    def test_hedge_wins_and_slow_call_is_cancelled(self) -> None:
+        cancelled = []
+
+        async def call(route: Route) -> str:
+            if route == PRIMARY:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(route)
+                    raise
+            return str(route)
+
+        with patch("shared.llm_routing.hedge_delay", return_value=0.01):
+            result = asyncio.run(acall_routed([PRIMARY, SECONDARY], call))
+
+        assert result == ("OpenAI/fast", SECONDARY)
+        assert cancelled == [PRIMARY]
+
+    def test_no_hedging_if_disabled(self) -> None:
+        async def call(route: Route) -> str:
+            await asyncio.sleep(0.05 if route == PRIMARY else 0)
+            return str(route)
+
+        with patch("shared.llm_routing.LLM_HEDGE_PERCENTILE", 0):
+            result = asyncio.run(acall_routed([PRIMARY, SECONDARY], call))
+        assert result[1] == PRIMARY
+
+
+class TestAstreamRouted:
+    """Test fallback of streamed calls."""
+
+    @staticmethod
+    def _collect(
+        failing_after: int | None,
+    ) -> list[tuple[Route, str, int]]:
+        async def stream(route: Route) -> AsyncIterator[tuple[str, int]]:
+            for i, word in enumerate(["a", "b"]):
+                if route == PRIMARY and i == failing_after:
+                    msg = "down"
+                    raise ConnectionError(msg)
+                yield word, 0
+
+        async def collect() -> list[tuple[Route, str, int]]:
+            return [c async for c in astream_routed([PRIMARY, SECONDARY], stream)]
+
+        return asyncio.run(collect())
+
+    def test_falls_back_before_first_delta(self) -> None:
+        assert self._collect(failing_after=0) == [
+            (SECONDARY, "a", 0),
+            (SECONDARY, "b", 0),
+        ]
+
+    def test_no_fallback_after_first_delta(self) -> None:
+        with pytest.raises(ConnectionError):
+            self._collect(failing_after=1)
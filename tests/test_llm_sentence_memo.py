@@ -0,0 +1,107 @@
+"""Tests for shared/llm_sentence_memo.py sentence memo of the correct mode."""
+
+import asyncio
+from functools import partial
+from unittest.mock import MagicMock
+
+import pytest
+
+from shared.llm_sentence_memo import (
+    SentenceMemo,
+    acall_sentence_memo,
+    aligned_sentences,
+    sentence_key,
+)
+
+FOOTER = "Mit freundlichen Grüßen. Max Muster GmbH."
+
+
+def test_sentence_key_is_whitespace_normalized() -> None:
+    assert sentence_key("p", "m", "i", "Ein  Satz.\n") == sentence_key(
+        "p", "m", "i", "Ein Satz."
+    )
+    assert sentence_key("p", "m", "i", "Ein Satz.") != sentence_key(
+        "p", "other", "i", "Ein Satz."
+    )
+
+
+def test_aligned_sentences() -> None:
+    assert aligned_sentences("Eins. Zwei.", "EINS. ZWEI.") == [
+        ("Eins. ", "EINS."),
+        ("Zwei.", "ZWEI."),
+    ]
+    # merged sentences can not be aligned
+    assert aligned_sentences("Eins. Zwei.", "Eins und zwei.") == []
+
+
+def test_shifted_sentences_are_left_out() -> None:
+    # one sentence merged, another split: same count, but shifted
+    text = "Guten Tag. Wir schreiben Ihnen heute. Danke."
+    response = "Guten Tag, wir schreiben. Ihnen heute. Danke."
+    assert aligned_sentences(text, response) == [("Danke.", "Danke.")]
+
+
+def test_known_sentences_are_not_sent_upstream(upper_provider: MagicMock) -> None:
+    memo = SentenceMemo(max_entries=100)
+    correct = partial(
+        acall_sentence_memo, upper_provider, "model", "correct", memo=memo
+    )
+
+    text, tokens, cached, reused = asyncio.run(correct(f"Erster Brief. {FOOTER}"))
+    assert text == f"ERSTER BRIEF. {FOOTER.upper()}"
+    assert (tokens, cached, reused) == (5, False, 0)
+
+    text, tokens, cached, reused = asyncio.run(correct(f"Zweiter Brief.\n\n{FOOTER}"))
+    assert text == f"ZWEITER BRIEF.\n\n{FOOTER.upper()}"
+    assert (tokens, cached, reused) == (5, False, 2)
+    assert upper_provider.acall.call_args.kwargs["prompt"] == "Zweiter Brief."
+
+    text, tokens, cached, reused = asyncio.run(correct(FOOTER))
+    assert (text, tokens, cached, reused) == (FOOTER.upper(), 0, True, 2)
+    assert upper_provider.acall.call_count == 2
+    stats = memo.get_stats()
+    assert stats["hits"] == 4
+    assert stats["sentences"] == 4
+    assert stats["hit_ratio"] == round(4 / (4 + stats["misses"]), 3)
+
+
+def test_misaligned_response_is_not_remembered(upper_provider: MagicMock) -> None:
+    upper_provider.acall.side_effect = lambda **_: ("Alles in einem Satz", 5)
+    memo = SentenceMemo(max_entries=100)
+    text, *_ = asyncio.run(
+        acall_sentence_memo(
+            upper_provider, "model", "correct", "Eins. Zwei.", memo=memo
+        )
+    )
+    assert text == "Alles in einem Satz"
+    assert memo.get_stats()["stores"] == 0
+
+
+def test_memo_is_not_written_without_cache(upper_provider: MagicMock) -> None:
+    memo = SentenceMemo(max_entries=100)
+    asyncio.run(
+        acall_sentence_memo(
+            upper_provider, "model", "correct", FOOTER, memo=memo, use_cache=False
+        )
+    )
+    assert memo.get_stats()["stores"] == 0
+
+
+def test_lru_eviction() -> None:
+    memo = SentenceMemo(max_entries=2)
+    memo.put("a", "A")
+    memo.put("b", "B")
+    assert memo.get("a") == "A"
+    memo.put("c", "C")
+    assert memo.get("b") is None
+    assert memo.get("a") == "A"
+    assert memo.get_stats()["evictions"] == 1
+
+
+def test_empty_response_raises(upper_provider: MagicMock) -> None:
+    upper_provider.acall.side_effect = lambda **_: ("", 0)
+    memo = SentenceMemo(max_entries=10)
+    with pytest.raises(ValueError, match="empty response"):
+        asyncio.run(
+            acall_sentence_memo(upper_provider, "model", "correct", "Eins.", memo=memo)
+        )
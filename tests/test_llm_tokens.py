@@ -0,0 +1,63 @@
+"""Tests for shared/llm_tokens.py token estimation and budgets."""
+
+from unittest.mock import patch
+
+import pytest
+
+from shared.llm_catalog import ProviderSpec
+from shared.llm_tokens import (
+    MAX_FACTOR,
+    TokenBudgetError,
+    TokenEstimator,
+    check_budget,
+    count_pieces,
+)
+from shared.mode_configs import MODE_CONFIGS
+
+SPEC = ProviderSpec(
+    module="m", class_name="C", models=("m",), context_tokens=1000, output_tokens=300
+)
+
+
+@pytest.fixture(autouse=True)
+def _estimator() -> None:
+    """Uncalibrated token estimator."""
+    with patch("shared.llm_tokens.TOKEN_ESTIMATOR", TokenEstimator()):
+        yield
+
+
+def test_count_pieces() -> None:
+    assert count_pieces("") == 0
+    # long words count as several tokens, punctuation on its own
+    assert count_pieces("Hallo, Rechtschreibprüfung!") == 2 + 1 + 5 + 1
+
+
+def test_calibration() -> None:
+    estimator = TokenEstimator(alpha=0.5)
+    assert estimator.estimate("Fake", "eins zwei") == 2
+    estimator.calibrate("Fake", pieces=100, tokens=150)
+    assert estimator.factor("Fake") == pytest.approx(1.25)
+    # no tokens reported: ignored, outliers are bounded
+    estimator.calibrate("Fake", pieces=100, tokens=0)
+    estimator.calibrate("Fake", pieces=1, tokens=1000)
+    assert estimator.factor("Fake") == pytest.approx((1.25 + MAX_FACTOR) / 2)
+    assert estimator.get_stats()["Fake"]["samples"] == 2
+
+
+def test_budget_fits() -> None:
+    budget = check_budget(
+        "Fake", SPEC, "abcd", "eins zwei", mode_config=MODE_CONFIGS["summarize"]
+    )
+    assert budget.input_tokens == 3
+    assert budget.max_chars is None
+
+
+def test_budget_exceeded() -> None:
+    text = "wort " * 400
+    with pytest.raises(TokenBudgetError):
+        check_budget("Fake", SPEC, "", text, mode_config=MODE_CONFIGS["expand"])
+    # chunkable modes get a chunk size fitting the output budget
+    budget = check_budget("Fake", SPEC, "", text, mode_config=MODE_CONFIGS["correct"])
+    assert budget.total_tokens == 800
+    assert budget.max_chars is not None
+    assert count_pieces(text[: budget.max_chars]) <= SPEC.output_tokens
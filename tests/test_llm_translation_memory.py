@@ -0,0 +1,160 @@
+"""Tests for shared/llm_translation_memory.py translation memory."""
+
+import asyncio
+import sqlite3
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from shared.llm_translation_memory import (
+    LSH_BANDS,
+    TranslationMemory,
+    acall_translation_memory,
+    aligned_segments,
+    band_hashes,
+    reference_instruction,
+    shingles,
+    similarity,
+)
+
+SPEC = (
+    "Das Gerät wird mit 230 Volt betrieben und ist für Innenräume geeignet."
+    "\n\nDie Garantie beträgt zwei Jahre ab Kaufdatum und gilt für alle Teile."
+)
+
+
+USER = 1
+
+
+@pytest.fixture
+def memory(tmp_path: Path) -> TranslationMemory:
+    return TranslationMemory(tmp_path / "tm.sqlite", max_segments=100)
+
+
+@pytest.fixture
+def translate(
+    upper_provider: MagicMock, memory: TranslationMemory
+) -> Callable[..., tuple]:
+    """Return the translation of a prompt via the memory, by default of USER."""
+
+    def call(prompt: str, user_id: int = USER) -> tuple:
+        return asyncio.run(
+            acall_translation_memory(
+                upper_provider,
+                "model",
+                "translate",
+                prompt,
+                user_id=user_id,
+                memory=memory,
+            )
+        )
+
+    return call
+
+
+def test_similar_segments_share_bands() -> None:
+    a = shingles("Die Garantie beträgt zwei Jahre ab Kaufdatum.")
+    b = shingles("Die Garantie beträgt drei Jahre ab Kaufdatum.")
+    assert 0.4 < similarity(a, b) < 1.0
+    assert set(band_hashes("s", a)) & set(band_hashes("s", b))
+    # the bands are scoped by instruction
+    assert not set(band_hashes("s", a)) & set(band_hashes("other", a))
+
+
+def test_aligned_segments() -> None:
+    assert aligned_segments("Eins.\n\nZwei.", "One.\n\nTwo.\n") == [
+        ("Eins.", "One."),
+        ("Zwei.", "Two."),
+    ]
+    assert aligned_segments("Eins.\n\nZwei.", "One. Two.") == []
+
+
+def test_without_references_the_instruction_is_unchanged() -> None:
+    assert reference_instruction("translate", []) == "translate"
+
+
+def test_disabled_memory() -> None:
+    memory = TranslationMemory(None)
+    memory.store(USER, "translate", [("Text", "Text")])
+    assert memory.lookup(USER, "translate", ["Text"]) == {}
+
+
+def test_exact_matches_are_reused(
+    translate: Callable[..., tuple],
+    upper_provider: MagicMock,
+    memory: TranslationMemory,
+) -> None:
+    text, tokens, cached, reused = translate(SPEC)
+    assert text == SPEC.upper()
+    assert (tokens, cached, reused) == (5, False, 0)
+
+    text, tokens, cached, reused = translate(SPEC + "\n\nNeu.")
+    assert text == SPEC.upper() + "\n\nNEU."
+    assert (tokens, cached, reused) == (5, False, 2)
+    assert upper_provider.acall.call_args.kwargs["prompt"] == "Neu."
+    assert memory.get_stats()["exact"] == 2
+
+
+def test_segments_of_other_users_are_not_used(
+    translate: Callable[..., tuple], upper_provider: MagicMock
+) -> None:
+    translate(SPEC)
+    _, _, _, reused = translate(SPEC.replace("zwei Jahre", "drei Jahre"), user_id=2)
+    assert reused == 0
+    # neither exact matches nor references of the first user
+    kwargs = upper_provider.acall.call_args.kwargs
+    assert (kwargs["prompt"], kwargs["instruction"]) == (
+        SPEC.replace("zwei Jahre", "drei Jahre"),
+        "translate",
+    )
+
+
+def test_similar_segments_are_sent_as_references(
+    translate: Callable[..., tuple],
+    upper_provider: MagicMock,
+    memory: TranslationMemory,
+) -> None:
+    translate(SPEC)
+    changed = SPEC.replace("zwei Jahre", "drei Jahre")
+    text, tokens, _, reused = translate(changed)
+    assert text == changed.upper()
+    assert (tokens, reused) == (5, 1)
+    kwargs = upper_provider.acall.call_args.kwargs
+    assert kwargs["prompt"] == SPEC.split("\n\n")[1].replace("zwei", "drei")
+    assert kwargs["instruction"].startswith("translate")
+    assert "ZWEI JAHRE" in kwargs["instruction"]
+    stats = memory.get_stats()
+    assert (stats["exact"], stats["fuzzy"]) == (1, 1)
+    assert stats["lookup_us"] > 0
+
+
+def test_misaligned_response_is_not_stored(
+    translate: Callable[..., tuple],
+    upper_provider: MagicMock,
+    memory: TranslationMemory,
+) -> None:
+    upper_provider.acall.side_effect = lambda **_: ("Alles in einem Absatz", 5)
+    assert translate(SPEC)[0] == "Alles in einem Absatz"
+    assert memory.get_stats()["stores"] == 0
+
+
+def test_oldest_segments_are_dropped(tmp_path: Path) -> None:
+    memory = TranslationMemory(tmp_path / "tm.sqlite", max_segments=2)
+    memory.store(USER, "translate", [("Eins.", "One."), ("Zwei.", "Two.")])
+    memory.store(USER, "translate", [("Drei.", "Three.")])
+    found = memory.lookup(USER, "translate", ["Eins.", "Zwei.", "Drei."])
+    assert {text: match.target for text, match in found.items()} == {
+        "Zwei.": "Two.",
+        "Drei.": "Three.",
+    }
+
+
+def test_replaced_segments_leave_no_bands(memory: TranslationMemory) -> None:
+    memory.store(USER, "translate", [("Eins.", "One.")])
+    memory.store(USER, "translate", [("Eins.", "One!")])
+    assert memory.lookup(USER, "translate", ["Eins."])["Eins."].target == "One!"
+    assert memory.db_path is not None
+    with sqlite3.connect(memory.db_path) as con:
+        assert con.execute("SELECT COUNT(*) FROM tm_bands").fetchone()[0] == LSH_BANDS